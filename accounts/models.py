@@ -30,6 +30,8 @@ class User(AbstractUser):
     qr_code_data = models.CharField(max_length=255, blank=True)
     is_librarian = models.BooleanField(default=False)
     is_staff_member = models.BooleanField(default=False)
+    # Bumped to revoke every calendar feed link issued so far.
+    calendar_feed_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
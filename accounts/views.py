@@ -7,6 +7,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from .models import User, Profile
 from circulation.models import Loan, Reservation, Fine
 from catalog.models import Book
+from circulation.recommendations import recommended_books
+from analytics import recently_viewed
 
 
 class RegisterView(CreateView):
@@ -60,8 +62,11 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context['pending_fines'] = Fine.objects.filter(user=user, status='pending')
         context['total_fines'] = sum(fine.amount for fine in context['pending_fines'])
         
-        # Recently viewed (can be implemented with session/cache)
-        context['recent_books'] = Book.objects.filter(is_featured=True)[:5]
+        # Co-borrowing suggestions (see build_recommendations)
+        context['recommended_books'] = recommended_books(user)
+        
+        # Recently viewed: one cache read plus one in_bulk fetch
+        context['recent_books'] = recently_viewed.recent_objects(user, 'book', Book.objects.filter(is_active=True))
         
         return context
 
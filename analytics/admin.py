@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Metric, Report, UserActivity, SearchQuery
+from django.db.models import Q
+from . import reports
+from .models import Metric, Report, UserActivity, SearchQuery, RelatedItems
 
 
 @admin.register(Metric)
@@ -12,12 +15,48 @@ class MetricAdmin(admin.ModelAdmin):
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ['title', 'report_type', 'generated_by', 'generated_date', 'is_archived']
-    list_filter = ['report_type', 'is_archived', 'generated_date']
+    list_display = ['title', 'report_type', 'format', 'status', 'progress', 'generated_by', 'generated_date', 'is_archived']
+    list_filter = ['report_type', 'status', 'is_archived', 'generated_date']
     search_fields = ['title', 'description']
     raw_id_fields = ['generated_by']
-    readonly_fields = ['generated_date']
+    readonly_fields = [
+        'generated_date', 'status', 'progress', 'rows_processed', 'started_at', 'heartbeat_at', 'attempts',
+        'finished_at', 'error', 'file', 'data', 'generated_by', 'cancel_requested',
+    ]
     date_hierarchy = 'generated_date'
+    actions = ['generate_reports', 'cancel_reports']
+    
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.generated_by = request.user
+        super().save_model(request, obj, form, change)
+        if not change:
+            reports.enqueue(obj)
+            self.message_user(request, self._queued_message(1))
+    
+    def formfield_for_choice_field(self, db_field, request, **kwargs):
+        if db_field.name == 'format' and reports.openpyxl is None:
+            kwargs['choices'] = [choice for choice in db_field.choices if choice[0] != 'xlsx']
+        return super().formfield_for_choice_field(db_field, request, **kwargs)
+    
+    @admin.action(description='Generate (or regenerate) selected reports')
+    def generate_reports(self, request, queryset):
+        # Running reports are left alone unless their worker died.
+        queryset = queryset.exclude(Q(status='running') & ~Q(pk__in=reports.stale()))
+        for report in queryset:
+            reports.enqueue(report)
+        self.message_user(request, self._queued_message(len(queryset)))
+    
+    @admin.action(description='Cancel selected reports')
+    def cancel_reports(self, request, queryset):
+        for report in queryset.filter(status__in=['queued', 'running']):
+            reports.cancel(report)
+        self.message_user(request, 'Cancellation requested.')
+    
+    def _queued_message(self, count):
+        if settings.CELERY_BROKER_URL:
+            return f'{count} report(s) queued for generation.'
+        return f'{count} report(s) queued; run_reports will generate them.'
 
 
 @admin.register(UserActivity)
@@ -38,3 +77,11 @@ class SearchQueryAdmin(admin.ModelAdmin):
     raw_id_fields = ['user']
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
+
+
+@admin.register(RelatedItems)
+class RelatedItemsAdmin(admin.ModelAdmin):
+    list_display = ['item_type', 'item_id', 'computed_at']
+    list_filter = ['item_type', 'computed_at']
+    search_fields = ['item_id']
+    readonly_fields = ['item_type', 'item_id', 'neighbor_ids', 'scores', 'computed_at']
@@ -0,0 +1,22 @@
+"""
+URL configuration used by the benchmark_asgi command.
+
+Mounts the sync and async variants of the read-heavy pages side by side,
+on top of the regular project URLs so templates can reverse every name.
+"""
+from django.urls import path, include
+from catalog import views as catalog_views
+from repository import views as repository_views
+from unimaid_library import views
+
+urlpatterns = [
+    path('sync/', views.HomeView.as_view()),
+    path('sync/catalog/', catalog_views.BookListView.as_view()),
+    path('sync/catalog/search/', catalog_views.BookSearchView.as_view()),
+    path('sync/repository/search/', repository_views.DocumentSearchView.as_view()),
+    path('async/', views.AsyncHomeView.as_view()),
+    path('async/catalog/', catalog_views.AsyncBookListView.as_view()),
+    path('async/catalog/search/', catalog_views.AsyncBookSearchView.as_view()),
+    path('async/repository/search/', repository_views.AsyncDocumentSearchView.as_view()),
+    path('', include('unimaid_library.urls')),
+]
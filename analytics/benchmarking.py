@@ -0,0 +1,241 @@
+"""
+Shared helpers for the benchmark management commands.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+import math
+import os
+import random
+import tempfile
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+# Every seeded user shares this password; "bench0" is a staff member.
+BENCHMARK_PASSWORD = 'benchmark'
+
+WORDS = (
+    'library history science nigeria africa theory data systems health law '
+    'education engineering agriculture economics literature culture water '
+    'energy policy development computing medicine language climate sahel'
+).split()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Summarize a list of latencies (seconds) collected over ``elapsed`` seconds"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _phrase(rng, words=4):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed_dataset(scale=1, seed=42):
+    """Populate the current database with a scaled, realistic data set.
+
+    Uses ``bulk_create`` throughout, so model ``save()`` side effects (QR code
+    generation, available-copy recounts) are skipped and the denormalized
+    fields are filled in directly. Returns the number of rows per model.
+    """
+    from accounts.models import User, Profile, StaffMember
+    from blog.models import Category, Tag, Post, Comment
+    from catalog.models import Genre, Publisher, Author, Book, Copy
+    from circulation.models import Loan, Reservation, Fine
+    from events.models import Event, EventRegistration
+    from repository.models import Collection, Document
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    n_users = 200 * scale
+    n_books = 1000 * scale
+    password = make_password(BENCHMARK_PASSWORD)
+
+    users = User.objects.bulk_create([
+        User(
+            username=f'bench{i}', email=f'bench{i}@unimaid.edu.ng', password=password,
+            first_name=rng.choice(WORDS).title(), last_name=rng.choice(WORDS).title(),
+            membership_type=rng.choice(['student', 'student', 'faculty', 'staff', 'public']),
+            qr_code_data=f'bench-{seed}-{i}', is_staff=(i == 0),
+        )
+        for i in range(n_users)
+    ])
+    Profile.objects.bulk_create([Profile(user=user, department='Library') for user in users])
+    StaffMember.objects.bulk_create([
+        StaffMember(user=user, position='Librarian', department='Cataloguing', display_order=i)
+        for i, user in enumerate(users[:6])
+    ])
+
+    genres = Genre.objects.bulk_create([
+        Genre(name=f'Genre {i}', slug=f'genre-{i}') for i in range(12)
+    ])
+    publishers = Publisher.objects.bulk_create([
+        Publisher(name=f'Publisher {i}', slug=f'publisher-{i}') for i in range(20)
+    ])
+    authors = Author.objects.bulk_create([
+        Author(first_name=rng.choice(WORDS).title(), last_name=f'{rng.choice(WORDS).title()}{i}')
+        for i in range(300 * scale)
+    ])
+
+    books = Book.objects.bulk_create([
+        Book(
+            title=_phrase(rng, rng.randint(2, 6)), isbn=f'978{seed:03d}{i:07d}',
+            genre=rng.choice(genres), publisher=rng.choice(publishers),
+            language=rng.choice(['English', 'English', 'English', 'Hausa', 'French', 'Arabic']),
+            publication_date=(now - timedelta(days=rng.randint(365, 365 * 40))).date(),
+            description=_phrase(rng, 25), subject_heading=_phrase(rng, 3),
+            keywords=', '.join(rng.sample(WORDS, 4)), is_featured=(i % 50 == 0),
+        )
+        for i in range(n_books)
+    ])
+    Book.authors.through.objects.bulk_create([
+        Book.authors.through(book=book, author=author)
+        for book in books
+        for author in rng.sample(authors, rng.randint(1, 3))
+    ])
+
+    copies = []
+    for book in books:
+        for i in range(rng.randint(1, 4)):
+            copies.append(Copy(book=book, barcode=f'B{book.pk}-{i + 1}', location='Main Library'))
+    copies = Copy.objects.bulk_create(copies)
+
+    loans = []
+    on_loan = rng.sample(copies, len(copies) // 4)
+    for copy in on_loan:
+        copy.status = 'on_loan'
+        checkout = now - timedelta(days=rng.randint(0, 30))
+        loans.append(Loan(
+            user=rng.choice(users), copy=copy, book_id=copy.book_id,
+            due_date=checkout + timedelta(days=14),
+            status='overdue' if checkout + timedelta(days=14) < now else 'active',
+        ))
+    # Returned loans make up most of the circulation history.
+    for _ in range(len(copies)):
+        copy = rng.choice(copies)
+        loans.append(Loan(
+            user=rng.choice(users), copy=copy, book_id=copy.book_id,
+            due_date=now - timedelta(days=rng.randint(30, 700)),
+            return_date=now - timedelta(days=rng.randint(1, 29)), status='returned',
+        ))
+    Copy.objects.bulk_update(on_loan, ['status'])
+    loans = Loan.objects.bulk_create(loans)
+    available = {}
+    for copy in copies:
+        counts = available.setdefault(copy.book_id, [0, 0])
+        counts[0] += 1
+        counts[1] += copy.status == 'available'
+    for book in books:
+        book.total_copies, book.available_copies = available.get(book.pk, (0, 0))
+    Book.objects.bulk_update(books, ['total_copies', 'available_copies'])
+    Reservation.objects.bulk_create([
+        Reservation(user=user, book=rng.choice(books), queue_position=1)
+        for user in rng.sample(users, len(users) // 5)
+    ])
+    Fine.objects.bulk_create([
+        Fine(loan=loan, user_id=loan.user_id, amount=rng.choice([100, 250, 500]),
+             due_date=(now + timedelta(days=14)).date())
+        for loan in loans if loan.status == 'overdue'
+    ])
+
+    collections = Collection.objects.bulk_create([
+        Collection(name=f'Collection {i}', slug=f'collection-{i}', display_order=i)
+        for i in range(8)
+    ])
+    departments = [f'Department of {word.title()}' for word in WORDS[:12]]
+    documents = Document.objects.bulk_create([
+        Document(
+            title=_phrase(rng, rng.randint(4, 10)),
+            document_type=rng.choice([choice[0] for choice in Document.DOCUMENT_TYPES]),
+            collection=rng.choice(collections), author=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}',
+            department=rng.choice(departments), year=rng.randint(1990, now.year),
+            file='repository/documents/benchmark.pdf', file_size=rng.randint(10 ** 5, 10 ** 7),
+            access_level=rng.choice(['open', 'open', 'open', 'restricted', 'embargoed', 'private']),
+            embargo_date=(now + timedelta(days=rng.randint(-365, 365))).date(),
+            abstract=_phrase(rng, 60), keywords=', '.join(rng.sample(WORDS, 4)),
+            subject=_phrase(rng, 3), submitted_by=rng.choice(users), is_approved=True,
+        )
+        for _ in range(500 * scale)
+    ])
+
+    categories = Category.objects.bulk_create([
+        Category(name=f'Category {i}', slug=f'category-{i}') for i in range(6)
+    ])
+    tags = Tag.objects.bulk_create([Tag(name=word, slug=word) for word in WORDS])
+    posts = Post.objects.bulk_create([
+        Post(
+            title=_phrase(rng, 6), slug=f'bench-post-{i}', author=users[0],
+            category=rng.choice(categories), content=_phrase(rng, 200), excerpt=_phrase(rng, 20),
+            is_published=True, is_featured=(i % 10 == 0),
+            published_date=now - timedelta(days=rng.randint(0, 700)),
+        )
+        for i in range(100 * scale)
+    ])
+    Post.tags.through.objects.bulk_create([
+        Post.tags.through(post=post, tag=tag) for post in posts for tag in rng.sample(tags, 3)
+    ])
+    comments = Comment.objects.bulk_create([
+        Comment(post=post, author=rng.choice(users), content=_phrase(rng, 30), is_approved=True)
+        for post in posts for _ in range(rng.randint(0, 8))
+    ])
+
+    events = []
+    for i in range(50 * scale):
+        start = now + timedelta(days=rng.randint(-60, 120))
+        events.append(Event(
+            title=_phrase(rng, 4), slug=f'bench-event-{i}', description=_phrase(rng, 80),
+            event_type=rng.choice([choice[0] for choice in Event.EVENT_TYPES]),
+            start_date=start, end_date=start + timedelta(hours=2),
+            location='Main Library', capacity=rng.choice([None, 30, 100]),
+            requires_registration=True, is_published=True,
+        ))
+    events = Event.objects.bulk_create(events)
+    registrations = EventRegistration.objects.bulk_create([
+        EventRegistration(event=event, user=user, is_confirmed=True)
+        for event in events for user in rng.sample(users, min(len(users), rng.randint(0, 30)))
+    ])
+    by_pk = {event.pk: event for event in events}
+    for registration in registrations:
+        by_pk[registration.event_id].registration_count += 1
+    Event.objects.bulk_update(events, ['registration_count'])
+
+    return {
+        'users': len(users), 'books': len(books), 'copies': len(copies), 'loans': len(loans),
+        'documents': len(documents), 'posts': len(posts), 'comments': len(comments),
+        'events': len(events), 'registrations': len(registrations),
+    }
+
+
+@contextmanager
+def benchmark_database(**settings_overrides):
+    """Run the block against a throwaway copy of the schema.
+
+    SQLite test databases are placed in a temporary file rather than in
+    memory, so worker threads get real independent connections.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'benchmark.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**settings_overrides):
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
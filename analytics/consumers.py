@@ -0,0 +1,32 @@
+from collections import Counter
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.outbox import Consumer, register
+from .models import Metric
+
+
+@register
+class DailyCheckoutsConsumer(Consumer):
+    """Keeps a daily "Checkouts" metric up to date from new loans.
+
+    The counts are updated in the batch's transaction, together with the
+    checkpoint, so each loan is counted exactly once.
+    """
+    name = 'analytics.daily_checkouts'
+    resources = ('loans',)
+
+    def handle(self, changes):
+        days = Counter(
+            timezone.localdate(parse_datetime(change.payload['checkout_date']))
+            for change in changes
+            if change.action == 'created' and change.payload
+        )
+        for day, count in days.items():
+            metric, _ = Metric.objects.get_or_create(
+                name='Checkouts', metric_type='circulation', date=day,
+                defaults={'value': 0, 'unit': 'loans'},
+            )
+            Metric.objects.filter(pk=metric.pk).update(value=F('value') + count)
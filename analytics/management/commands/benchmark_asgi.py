@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from analytics.benchmarking import benchmark_database, seed_dataset, summarize
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import tempfile
+import time
+
+
+PAGES = [
+    '',
+    'catalog/',
+    'catalog/?page=3',
+    'catalog/search/?q=history',
+    'repository/search/?q=data',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare sync (WSGI) and async (ASGI) views of the read-heavy pages under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Size multiplier of the seeded data set')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per page and mode')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        overrides = {
+            'ROOT_URLCONF': 'analytics.benchmark_urls',
+            'ALLOWED_HOSTS': ['testserver'],
+            'DEBUG': False,
+        }
+        with tempfile.TemporaryDirectory() as media, benchmark_database(MEDIA_ROOT=media, **overrides):
+            seed_dataset(options['scale'])
+            results = {}
+            for page in PAGES:
+                results[page or '/'] = {
+                    'wsgi': self._run_sync(f'/sync/{page}', options),
+                    'asgi': asyncio.run(self._run_async(f'/async/{page}', options)),
+                }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for page, modes in results.items():
+            self.stdout.write(self.style.SUCCESS(page))
+            for mode, stats in modes.items():
+                self.stdout.write(
+                    f"  {mode}  {stats['throughput']:>8.1f} req/s  p50 {stats['p50_ms']:>7.2f}ms  "
+                    f"p95 {stats['p95_ms']:>7.2f}ms  p99 {stats['p99_ms']:>7.2f}ms  errors {stats['errors']}"
+                )
+
+    def _run_sync(self, url, options):
+        def fetch(_):
+            started = time.perf_counter()
+            response = Client().get(url)
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(fetch, range(options['requests'])))
+        return self._summarize(outcomes, time.perf_counter() - started)
+
+    async def _run_async(self, url, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        client = AsyncClient()
+
+        async def fetch():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(fetch() for _ in range(options['requests'])))
+        return self._summarize(outcomes, time.perf_counter() - started)
+
+    def _summarize(self, outcomes, elapsed):
+        latencies = [latency for latency, status in outcomes if status == 200]
+        return summarize(latencies, elapsed, errors=len(outcomes) - len(latencies))
@@ -0,0 +1,276 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.urls import get_resolver, reverse, URLPattern, URLResolver
+from analytics.benchmarking import BENCHMARK_PASSWORD, summarize
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+import json
+import platform
+import threading
+import time
+
+
+# Routes that change data when fetched, or that only make sense for admins.
+SKIPPED_NAMESPACES = {'admin'}
+SKIPPED_ROUTES = {
+    'accounts:logout',
+    'circulation:reserve_book',
+    'circulation:renew_loan',
+    'events:event_cancel_registration',
+    'rest_framework:logout',
+    # Upload sessions are created and consumed by clients
+    'upload-list',
+    'upload-detail',
+    'upload-chunk',
+    'upload-complete',
+    # Whole-table exports are measured with export_data instead
+    'book-export',
+    'document-export',
+    'loan-export',
+    'user-export',
+}
+
+# Extra query strings driven in addition to the bare route.
+QUERY_VARIANTS = {
+    'catalog:book_list': ['?q=history', '?page=3'],
+    'catalog:book_search': ['?q=history'],
+    'repository:document_list': ['?type=thesis'],
+    'repository:document_search': ['?q=data'],
+    'repository:oai': ['?verb=ListRecords&metadataPrefix=oai_dc', '?verb=ListIdentifiers&metadataPrefix=oai_dc'],
+    'events:event_list': ['?status=upcoming'],
+    'sync': ['?since=0'],
+}
+
+
+def _first(queryset, field='pk'):
+    return queryset.values_list(field, flat=True).first()
+
+
+def _sample_kwargs():
+    """URL kwargs for every route that needs an object, keyed by route name"""
+    from accounts.models import User
+    from blog.models import Category, Post, Tag
+    from catalog.models import Author, Book, Genre
+    from circulation.models import Loan
+    from events.ical import feed_token
+    from events.models import Event
+    from repository.models import Collection, Document
+
+    book = _first(Book.objects.filter(is_active=True))
+    document = _first(Document.objects.filter(is_active=True, is_approved=True, access_level='open'))
+    event = _first(Event.objects.filter(is_published=True, is_cancelled=False), 'slug')
+    user = User.objects.filter(is_active=True, event_registrations__is_confirmed=True).first()
+    samples = {
+        'catalog:book_detail': {'pk': book},
+        'catalog:genre_detail': {'slug': _first(Genre.objects.all(), 'slug')},
+        'catalog:author_detail': {'pk': _first(Author.objects.all())},
+        'repository:document_detail': {'pk': document},
+        'repository:collection_detail': {'slug': _first(Collection.objects.filter(is_active=True), 'slug')},
+        'blog:post_detail': {'slug': _first(Post.objects.filter(is_published=True), 'slug')},
+        'blog:category_detail': {'slug': _first(Category.objects.all(), 'slug')},
+        'blog:tag_detail': {'slug': _first(Tag.objects.all(), 'slug')},
+        'events:event_detail': {'slug': event},
+        'events:event_register': {'slug': event},
+        'events:calendar_feed_type': {'event_type': Event.EVENT_TYPES[0][0]},
+        'events:calendar_feed_user': {'token': feed_token(user) if user else None},
+        'book-detail': {'pk': book},
+        'loan-detail': {'pk': _first(Loan.objects.all())},
+        'user-detail': {'pk': _first(User.objects.filter(is_active=True))},
+        'document-detail': {'pk': document},
+        'event-detail': {'pk': _first(Event.objects.filter(is_published=True, is_cancelled=False))},
+        'sync': {'resource': 'books'},
+    }
+    return {
+        name: kwargs for name, kwargs in samples.items()
+        if all(value is not None for value in kwargs.values())
+    }
+
+
+def _walk(patterns, namespace=None, params=()):
+    for entry in patterns:
+        groups = params + tuple(entry.pattern.regex.groupindex)
+        if isinstance(entry, URLResolver):
+            child = namespace
+            if entry.namespace:
+                child = f'{namespace}:{entry.namespace}' if namespace else entry.namespace
+            yield from _walk(entry.url_patterns, child, groups)
+        elif isinstance(entry, URLPattern) and entry.name:
+            name = f'{namespace}:{entry.name}' if namespace else entry.name
+            yield name, frozenset(groups)
+
+
+class Command(BaseCommand):
+    help = 'Load-test every URL pattern of a running local server and compare against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per URL')
+        parser.add_argument('--username', default='bench0', help='Blank to run anonymously')
+        parser.add_argument('--password', default=BENCHMARK_PASSWORD)
+        parser.add_argument(
+            '--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'http_baseline.json')
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Write results as the new baseline')
+        parser.add_argument('--output', help='Also write this run\'s results to a JSON file')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed relative slowdown of p95 latency and throughput before failing'
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=5.0,
+            help='Ignore p95 slowdowns smaller than this many milliseconds'
+        )
+
+    def handle(self, *args, **options):
+        base = urlsplit(options['base_url'])
+        cookie = self._login(options) if options['username'] else ''
+        urls = self._collect_urls()
+
+        results = {}
+        for name, url in urls:
+            results[url] = dict(name=name, **self._drive(base, url, cookie, options))
+            stats = results[url]
+            self.stdout.write(
+                f"{url:<45} {stats['status']:>3}  {stats['throughput']:>8.1f} req/s  "
+                f"p50 {stats['p50_ms']:>7.2f}  p95 {stats['p95_ms']:>7.2f}  p99 {stats['p99_ms']:>7.2f}ms  "
+                f"queries {stats['queries'] if stats['queries'] is not None else '-'}"
+            )
+
+        run = {
+            'meta': {
+                'base_url': options['base_url'],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'authenticated': bool(cookie),
+                'python': platform.python_version(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'routes': results,
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(run, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(run, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(
+                f'No baseline at {baseline_path}; rerun with --save-baseline to create one.'
+            ))
+            return
+
+        regressions = self._compare(json.loads(baseline_path.read_text())['routes'], results, options)
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(f'{len(regressions)} regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def _collect_urls(self):
+        samples = _sample_kwargs()
+        urls = []
+        seen = set()
+        for name, params in _walk(get_resolver().url_patterns):
+            if name.split(':')[0] in SKIPPED_NAMESPACES or name in SKIPPED_ROUTES:
+                continue
+            if 'format' in params:
+                # DRF's format-suffix duplicates of every API route.
+                continue
+            kwargs = samples.get(name, {}) if params else {}
+            if not params.issubset(kwargs):
+                self.stdout.write(self.style.WARNING(f'No sample arguments for {name}; skipped'))
+                continue
+            url = reverse(name, kwargs={key: kwargs[key] for key in params} or None)
+            for variant in [''] + QUERY_VARIANTS.get(name, []):
+                if url + variant not in seen:
+                    seen.add(url + variant)
+                    urls.append((name, url + variant))
+        return urls
+
+    def _login(self, options):
+        jar = CookieJar()
+        opener = build_opener(HTTPCookieProcessor(jar))
+        login_url = options['base_url'].rstrip('/') + reverse('accounts:login')
+        opener.open(login_url).read()
+        token = next((c.value for c in jar if c.name == settings.CSRF_COOKIE_NAME), '')
+        data = urlencode({
+            'username': options['username'],
+            'password': options['password'],
+            'csrfmiddlewaretoken': token,
+        }).encode()
+        opener.open(Request(login_url, data=data, headers={'Referer': login_url})).read()
+        cookies = {c.name: c.value for c in jar}
+        if settings.SESSION_COOKIE_NAME not in cookies:
+            raise CommandError(f'Could not log in as {options["username"]}; run seed_benchmark_data first.')
+        return '; '.join(f'{name}={value}' for name, value in cookies.items())
+
+    def _drive(self, base, url, cookie, options):
+        local = threading.local()
+        headers = {'Cookie': cookie} if cookie else {}
+
+        def fetch(_):
+            # One keep-alive connection per worker thread.
+            if getattr(local, 'conn', None) is None:
+                local.conn = HTTPConnection(base.hostname, base.port or 80, timeout=60)
+            started = time.perf_counter()
+            try:
+                local.conn.request('GET', url, headers=headers)
+                response = local.conn.getresponse()
+                response.read()
+            except (OSError, ConnectionError):
+                local.conn.close()
+                local.conn = None
+                return time.perf_counter() - started, 0, None
+            if response.will_close:
+                local.conn.close()
+                local.conn = None
+            queries = response.getheader('X-DB-Queries')
+            return (
+                time.perf_counter() - started, response.status,
+                int(queries) if queries is not None else None
+            )
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        ok = [outcome for outcome in outcomes if 200 <= outcome[1] < 400]
+        stats = summarize([outcome[0] for outcome in ok], elapsed, errors=len(outcomes) - len(ok))
+        query_counts = [outcome[2] for outcome in ok if outcome[2] is not None]
+        stats['status'] = ok[0][1] if ok else (outcomes[0][1] if outcomes else 0)
+        stats['queries'] = max(query_counts) if query_counts else None
+        return stats
+
+    def _compare(self, baseline, results, options):
+        tolerance = options['tolerance']
+        regressions = []
+        for url, current in results.items():
+            before = baseline.get(url)
+            if before is None:
+                continue
+            if current['errors'] > before['errors']:
+                regressions.append(f"{url}: errors {before['errors']} -> {current['errors']}")
+            if (
+                current['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+                and current['p95_ms'] - before['p95_ms'] > options['min_delta_ms']
+            ):
+                regressions.append(f"{url}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current['throughput'] < before['throughput'] * (1 - tolerance):
+                regressions.append(
+                    f"{url}: throughput {before['throughput']} -> {current['throughput']} req/s"
+                )
+            if (
+                current['queries'] is not None and before['queries'] is not None
+                and current['queries'] > before['queries']
+            ):
+                regressions.append(f"{url}: queries {before['queries']} -> {current['queries']}")
+        return regressions
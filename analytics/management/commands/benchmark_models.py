@@ -0,0 +1,202 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from analytics.benchmarking import benchmark_database, seed_dataset
+from functools import partial
+from itertools import cycle
+from pathlib import Path
+import gc
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+
+# Each benchmark is a generator yielding zero-argument callables. Only the
+# call itself is timed, so per-call setup can happen before each yield.
+
+def _copy_save():
+    """Copy.save -> Book.update_available_copies"""
+    from catalog.models import Copy
+    for copy in cycle(Copy.objects.select_related('book')[:200]):
+        yield copy.save
+
+
+def _reservation_fulfill():
+    """Reservation.fulfill with a queue of 20 pending reservations"""
+    from accounts.models import User
+    from catalog.models import Book
+    from circulation.models import Reservation
+    users = list(User.objects.all()[:21])
+    for book in Book.objects.order_by('pk')[100:]:
+        Reservation.objects.filter(book=book).delete()
+        reservations = Reservation.objects.bulk_create([
+            Reservation(user=user, book=book, queue_position=position)
+            for position, user in enumerate(users, 1)
+        ])
+        yield reservations[0].fulfill
+
+
+def _save_active(loan):
+    loan.status = 'active'
+    loan.save()
+
+
+def _loan_save():
+    """Loan.save including the overdue status check"""
+    from circulation.models import Loan
+    loans = Loan.objects.filter(status__in=['active', 'overdue']).select_related('user')[:200]
+    for loan in cycle(loans):
+        yield partial(_save_active, loan)
+
+
+def _capacity(event):
+    return event.registration_count, event.available_spots, event.is_full
+
+
+def _event_capacity():
+    """Event.registration_count, available_spots and is_full on one event"""
+    from events.models import Event
+    for event in cycle(Event.objects.filter(capacity__isnull=False)[:50]):
+        yield partial(_capacity, event)
+
+
+def _document_is_accessible():
+    """Document.is_accessible across access levels for a patron"""
+    from accounts.models import User
+    from repository.models import Document
+    user = User.objects.filter(is_staff=False).first()
+    for document in cycle(Document.objects.all()[:200]):
+        yield partial(document.is_accessible, user)
+
+
+def _user_generate_qr_code():
+    """User.generate_qr_code (image render + storage write)"""
+    from accounts.models import User
+    for user in cycle(User.objects.all()[:100]):
+        yield user.generate_qr_code
+
+
+BENCHMARKS = {
+    'copy_save': _copy_save,
+    'reservation_fulfill': _reservation_fulfill,
+    'loan_save': _loan_save,
+    'event_capacity': _event_capacity,
+    'document_is_accessible': _document_is_accessible,
+    'user_generate_qr_code': _user_generate_qr_code,
+}
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark model hot paths: ops/sec, queries and allocations per call'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f'Subset of: {", ".join(BENCHMARKS)}')
+        parser.add_argument('--scale', type=int, default=1, help='Size multiplier of the seeded data set')
+        parser.add_argument('--rounds', type=int, default=200, help='Timed calls per benchmark')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--history', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'model_history.jsonl'),
+            help='JSON-lines file each run is appended to and compared against'
+        )
+        parser.add_argument('--no-save', action='store_true', help='Do not append this run to the history')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmark(s): {", ".join(sorted(unknown))}')
+
+        results = {}
+        with tempfile.TemporaryDirectory() as media, benchmark_database(MEDIA_ROOT=media):
+            seed_dataset(options['scale'])
+            for name in names:
+                results[name] = self._measure(BENCHMARKS[name], options)
+
+        history = Path(options['history'])
+        previous = self._last_run(history)
+        for name, stats in results.items():
+            line = (
+                f"{name:<24} {stats['ops_per_sec']:>10.1f} ops/s  mean {stats['mean_us']:>9.1f}us  "
+                f"stddev {stats['stddev_us']:>8.1f}us  queries {stats['queries_per_op']:>5.1f}  "
+                f"alloc {stats['alloc_blocks_per_op']:>7.1f} blocks / {stats['peak_kib']:>8.1f}KiB peak"
+            )
+            before = previous.get(name) if previous else None
+            if before:
+                change = (stats['ops_per_sec'] - before['ops_per_sec']) / before['ops_per_sec'] * 100
+                line += f'  ({change:+.1f}% vs last run)'
+            self.stdout.write(line)
+
+        if not options['no_save']:
+            history.parent.mkdir(parents=True, exist_ok=True)
+            with history.open('a') as fh:
+                fh.write(json.dumps({
+                    'created': timezone.now().isoformat(),
+                    'commit': self._commit(),
+                    'scale': options['scale'],
+                    'results': results,
+                }) + '\n')
+
+    def _measure(self, benchmark, options):
+        calls = benchmark()
+        for _ in range(options['warmup']):
+            next(calls)()
+
+        timings = []
+        queries = 0
+        for _ in range(options['rounds']):
+            call = next(calls)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                call()
+                timings.append(time.perf_counter() - started)
+            queries += len(captured)
+
+        # Allocation pass, separate from timing so tracing overhead is excluded.
+        traced = [next(calls) for _ in range(min(options['rounds'], 50))]
+        gc.collect()
+        tracemalloc.start()
+        try:
+            start_snapshot = tracemalloc.take_snapshot()
+            for call in traced:
+                call()
+            end_snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        blocks = sum(
+            stat.count_diff for stat in end_snapshot.compare_to(start_snapshot, 'filename')
+            if stat.count_diff > 0
+        )
+
+        mean = statistics.fmean(timings)
+        return {
+            'rounds': len(timings),
+            'ops_per_sec': round(1 / mean, 1) if mean else 0.0,
+            'min_us': round(min(timings) * 1e6, 1),
+            'mean_us': round(mean * 1e6, 1),
+            'median_us': round(statistics.median(timings) * 1e6, 1),
+            'stddev_us': round(statistics.pstdev(timings) * 1e6, 1),
+            'queries_per_op': round(queries / len(timings), 2),
+            'alloc_blocks_per_op': round(blocks / len(traced), 1),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def _last_run(self, history):
+        if not history.exists():
+            return None
+        lines = history.read_text().strip().splitlines()
+        return json.loads(lines[-1])['results'] if lines else None
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ''
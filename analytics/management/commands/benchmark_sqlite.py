@@ -0,0 +1,177 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from analytics.benchmarking import summarize
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+SCHEMA = [
+    'CREATE TABLE book (id INTEGER PRIMARY KEY, title TEXT, available_copies INTEGER)',
+    'CREATE TABLE copy (id INTEGER PRIMARY KEY, book_id INTEGER, status TEXT)',
+    'CREATE INDEX copy_book_status ON copy (book_id, status)',
+    'CREATE TABLE activity (id INTEGER PRIMARY KEY, user_id INTEGER, action_type TEXT, '
+    'description TEXT, created_at REAL)',
+    'CREATE INDEX activity_user ON activity (user_id, created_at)',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent read/write throughput of the default and tuned SQLite profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        profiles = {
+            # What Django does without OPTIONS: rollback journal, FULL sync,
+            # 5 second timeout and deferred transactions.
+            'default': {'pragmas': {}, 'begin': 'BEGIN', 'timeout': 5.0},
+            'tuned': {
+                # Measured with WAL whether or not SQLITE_WAL is set here.
+                'pragmas': {'journal_mode': 'WAL', **settings.SQLITE_PRAGMAS},
+                'begin': 'BEGIN IMMEDIATE',
+                'timeout': settings.SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            },
+        }
+
+        results = {}
+        for name, profile in profiles.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self._seed(path, options)
+                results[name] = self._run(path, profile, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name, result in results.items():
+            self.stdout.write(self.style.SUCCESS(f'{name} profile'))
+            for kind in ('writes', 'reads'):
+                stats = result[kind]
+                self.stdout.write(
+                    f"  {kind:<6} {stats['throughput']:>9.1f} ops/s  "
+                    f"p50 {stats['p50_ms']:>7.2f}ms  p95 {stats['p95_ms']:>7.2f}ms  "
+                    f"p99 {stats['p99_ms']:>7.2f}ms  locked errors {stats['errors']}"
+                )
+        for kind in ('writes', 'reads'):
+            before = results['default'][kind]['throughput']
+            after = results['tuned'][kind]['throughput']
+            if before:
+                self.stdout.write(f'{kind} speedup: {after / before:.2f}x')
+
+    def _seed(self, path, options):
+        conn = sqlite3.connect(path, isolation_level=None)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute('BEGIN')
+        per_book = options['copies_per_book']
+        conn.executemany(
+            'INSERT INTO book (id, title, available_copies) VALUES (?, ?, ?)',
+            ((i, f'Book {i}', per_book) for i in range(1, options['books'] + 1))
+        )
+        conn.executemany(
+            'INSERT INTO copy (book_id, status) VALUES (?, ?)',
+            ((i, 'available') for i in range(1, options['books'] + 1) for _ in range(per_book))
+        )
+        conn.execute('COMMIT')
+        conn.close()
+
+    def _connect(self, path, profile):
+        conn = sqlite3.connect(
+            path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False
+        )
+        for name, value in profile['pragmas'].items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def _run(self, path, profile, options):
+        books = options['books']
+        deadline = time.perf_counter() + options['duration']
+        latencies = {'writes': [], 'reads': []}
+        errors = {'writes': 0, 'reads': 0}
+        lock = threading.Lock()
+
+        def checkout(conn, rng):
+            # Mirrors a circulation write: flip a copy, recount the book's
+            # available copies and log a UserActivity row in one transaction.
+            book_id = rng.randint(1, books)
+            conn.execute(profile['begin'])
+            try:
+                row = conn.execute(
+                    'SELECT id, status FROM copy WHERE book_id = ? LIMIT 1', (book_id,)
+                ).fetchone()
+                status = 'on_loan' if row[1] == 'available' else 'available'
+                conn.execute('UPDATE copy SET status = ? WHERE id = ?', (status, row[0]))
+                conn.execute(
+                    'UPDATE book SET available_copies = (SELECT COUNT(*) FROM copy '
+                    "WHERE book_id = ? AND status = 'available') WHERE id = ?",
+                    (book_id, book_id)
+                )
+                conn.execute(
+                    'INSERT INTO activity (user_id, action_type, description, created_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (rng.randint(1, 500), 'borrow', f'Borrowed book {book_id}', time.time())
+                )
+                conn.execute('COMMIT')
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+
+        def browse(conn, rng):
+            offset = rng.randint(0, max(0, books - 20))
+            conn.execute(
+                'SELECT id, title, available_copies FROM book ORDER BY id LIMIT 20 OFFSET ?',
+                (offset,)
+            ).fetchall()
+            conn.execute(
+                'SELECT COUNT(*) FROM activity WHERE user_id = ?', (rng.randint(1, 500),)
+            ).fetchone()
+
+        def worker(kind, operation, seed):
+            rng = random.Random(seed)
+            conn = self._connect(path, profile)
+            local_latencies = []
+            local_errors = 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    operation(conn, rng)
+                except sqlite3.OperationalError:
+                    local_errors += 1
+                    continue
+                local_latencies.append(time.perf_counter() - started)
+            conn.close()
+            with lock:
+                latencies[kind].extend(local_latencies)
+                errors[kind] += local_errors
+
+        threads = [
+            threading.Thread(target=worker, args=('writes', checkout, i))
+            for i in range(options['writers'])
+        ] + [
+            threading.Thread(target=worker, args=('reads', browse, 1000 + i))
+            for i in range(options['readers'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            kind: summarize(latencies[kind], elapsed, errors[kind])
+            for kind in ('writes', 'reads')
+        }
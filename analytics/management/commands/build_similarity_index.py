@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics.similarity import SOURCES, TOP_K, build_index
+import time
+
+
+class Command(BaseCommand):
+    help = 'Build the related-items index for books, documents and blog posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('types', nargs='*', help=f'Subset of: {", ".join(SOURCES)} (default: all)')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only recompute items changed since the last run (for nightly jobs)'
+        )
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbours stored per item')
+
+    def handle(self, *args, **options):
+        unknown = set(options['types']) - set(SOURCES)
+        if unknown:
+            raise CommandError(f'Unknown item type(s): {", ".join(sorted(unknown))}')
+        if options['top_k'] < 1:
+            raise CommandError('--top-k must be at least 1')
+
+        for item_type in options['types'] or list(SOURCES):
+            started = time.perf_counter()
+            result = build_index(item_type, incremental=options['incremental'], top_k=options['top_k'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{item_type}: {result['items']} items, {result['written']} rows written, "
+                f"{result['deleted']} removed in {time.perf_counter() - started:.2f}s"
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics import recently_viewed
+
+
+class Command(BaseCommand):
+    help = 'Write document views buffered in the cache to the activity log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Views written per INSERT')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        written = recently_viewed.flush(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} view(s) to the activity log.'))
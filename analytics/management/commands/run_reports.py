@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from analytics import reports
+from analytics.models import Report
+
+
+class Command(BaseCommand):
+    help = 'Generate queued reports (when no Celery worker is configured, run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', type=int, action='append', help='Only generate these report ids')
+        parser.add_argument(
+            '--recover-only', action='store_true',
+            help='Only re-queue reports whose worker stopped (with Celery, run this from cron)',
+        )
+
+    def handle(self, *args, **options):
+        recovered = reports.recover_stale()
+        if recovered:
+            self.stdout.write(self.style.WARNING(f'Recovered {recovered} stalled report(s).'))
+        if options['recover_only']:
+            return
+
+        queued = Report.objects.filter(status='queued').order_by('generated_date')
+        if options['report']:
+            queued = queued.filter(pk__in=options['report'])
+        for report_id in queued.values_list('pk', flat=True):
+            status = reports.generate(report_id)
+            if status is None:
+                continue
+            style = self.style.SUCCESS if status == 'complete' else self.style.WARNING
+            self.stdout.write(style(f'Report {report_id}: {status}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from accounts.models import User
+from analytics.benchmarking import BENCHMARK_PASSWORD, seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Seed the configured database with a scaled data set for benchmark_http'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Size multiplier (1 = 1,000 books)')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username='bench0').exists():
+            raise CommandError('Benchmark data is already present in this database.')
+
+        with transaction.atomic():
+            counts = seed_dataset(options['scale'])
+
+        for model, count in counts.items():
+            self.stdout.write(f'Created {count} {model}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmark data seeded. Log in as bench0 / {BENCHMARK_PASSWORD} (staff).'
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedItems',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('book', 'Book'), ('document', 'Document'), ('post', 'Blog Post')], max_length=20)),
+                ('item_id', models.PositiveIntegerField()),
+                ('neighbor_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Related Items',
+                'verbose_name_plural': 'Related Items',
+                'indexes': [models.Index(fields=['item_type', '-computed_at'], name='analytics_r_item_ty_17b9cd_idx')],
+                'unique_together': {('item_type', 'item_id')},
+            },
+        ),
+    ]
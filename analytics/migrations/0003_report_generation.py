@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_existing_complete(apps, schema_editor):
+    # Reports created before generation existed are not queued for it.
+    Report = apps.get_model('analytics', 'Report')
+    Report.objects.update(status='complete', progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_relateditems'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')], default='csv', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='rows_processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status', 'generated_date'], name='analytics_r_status_14a5e6_idx'),
+        ),
+        migrations.RunPython(mark_existing_complete, migrations.RunPython.noop),
+    ]
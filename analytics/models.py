@@ -50,6 +50,19 @@ class Report(models.Model):
         ('custom', 'Custom Report'),
     ]
     
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ]
+    
     report_type = models.CharField(max_length=50, choices=REPORT_TYPES)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -67,16 +80,33 @@ class Report(models.Model):
     date_range_end = models.DateField(null=True, blank=True)
     is_archived = models.BooleanField(default=False)
     
+    # Generation (see analytics.reports)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # Percent
+    rows_processed = models.PositiveIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Last progress update of the worker
+    attempts = models.PositiveSmallIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
     class Meta:
         verbose_name = "Report"
         verbose_name_plural = "Reports"
         ordering = ['-generated_date']
         indexes = [
             models.Index(fields=['report_type', '-generated_date']),
+            models.Index(fields=['status', 'generated_date']),
         ]
     
     def __str__(self):
         return f"{self.title} ({self.get_report_type_display()})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('complete', 'failed', 'cancelled')
 
 
 class UserActivity(models.Model):
@@ -158,3 +188,40 @@ class SearchQuery(models.Model):
     
     def __str__(self):
         return f"{self.query} ({self.result_count} results)"
+
+
+class RelatedItems(models.Model):
+    """Precomputed most similar items for a book, document or blog post"""
+    ITEM_TYPES = [
+        ('book', 'Book'),
+        ('document', 'Document'),
+        ('post', 'Blog Post'),
+    ]
+    
+    item_type = models.CharField(max_length=20, choices=ITEM_TYPES)
+    item_id = models.PositiveIntegerField()
+    neighbor_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    computed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = "Related Items"
+        verbose_name_plural = "Related Items"
+        unique_together = [['item_type', 'item_id']]
+        indexes = [
+            models.Index(fields=['item_type', '-computed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_item_type_display()} {self.item_id}: {len(self.neighbor_ids)} related"
+    
+    @classmethod
+    def related_to(cls, item_type, item_id, queryset, limit=5):
+        """Most similar objects from ``queryset``, or None if the item is not indexed"""
+        neighbor_ids = cls.objects.filter(
+            item_type=item_type, item_id=item_id
+        ).values_list('neighbor_ids', flat=True).first()
+        if neighbor_ids is None:
+            return None
+        objects = queryset.in_bulk(neighbor_ids)
+        return [objects[pk] for pk in neighbor_ids if pk in objects][:limit]
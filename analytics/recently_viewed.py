@@ -0,0 +1,157 @@
+"""
+Per-user "recently viewed" lists kept in the cache.
+
+Each signed-in user has a single cache entry holding a deduplicated,
+capped list of the items they viewed (newest first). Document views are
+also appended to a shared buffer in the cache, one entry per view under a
+sequence number taken with ``cache.incr``, so concurrent requests never
+overwrite each other. ``flush()`` writes the buffer to UserActivity with
+``bulk_create``; it runs in the background at most once every
+``RECENTLY_VIEWED_FLUSH_INTERVAL`` seconds and from the
+``flush_recent_views`` command, so a page view only touches the cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User
+from unimaid_library.concurrency import fire_and_forget
+
+from .models import UserActivity
+
+# Views of these kinds are written to the activity log.
+ACTIONS = {
+    'document': 'view_document',
+}
+
+_SEQUENCE_KEY = 'recently-viewed:pending:seq'
+_FLUSHED_KEY = 'recently-viewed:pending:flushed'
+_FLUSH_LOCK_KEY = 'recently-viewed:pending:lock'
+_FLUSHING_KEY = 'recently-viewed:pending:flushing'
+
+
+def _key(user_id):
+    return f'recently-viewed:v2:{user_id}'
+
+
+def _pending_key(seq):
+    return f'recently-viewed:pending:{seq}'
+
+
+def record_view(request, kind, obj):
+    """Remember that the current user viewed ``obj`` (a book or document)"""
+    if not request.user.is_authenticated:
+        return
+    key = _key(request.user.pk)
+    entry = [kind, obj.pk]
+    items = [entry] + [item for item in (cache.get(key) or []) if item != entry]
+    cache.set(key, items[:settings.RECENTLY_VIEWED_LIMIT], settings.RECENTLY_VIEWED_TIMEOUT)
+
+    if kind in ACTIONS:
+        _buffer({
+            'user_id': request.user.pk,
+            'kind': kind,
+            'pk': obj.pk,
+            'title': str(obj)[:200],
+            'viewed_at': timezone.now().isoformat(),
+            'ip_address': request.META.get('REMOTE_ADDR'),
+            'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+        })
+
+
+def recent_ids(user, kind):
+    """Primary keys of the ``kind`` items ``user`` viewed, newest first"""
+    items = cache.get(_key(user.pk)) or []
+    return [pk for item_kind, pk in items if item_kind == kind]
+
+
+def recent_objects(user, kind, queryset, limit=5):
+    """Recently viewed objects from ``queryset``, newest first"""
+    ids = recent_ids(user, kind)[:limit]
+    if not ids:
+        return []
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def _buffer(view):
+    try:
+        seq = cache.incr(_SEQUENCE_KEY)
+    except ValueError:
+        cache.add(_SEQUENCE_KEY, 0, None)
+        seq = cache.incr(_SEQUENCE_KEY)
+    cache.set(_pending_key(seq), view, settings.RECENTLY_VIEWED_TIMEOUT)
+    # Whichever request first finds the lock expired starts the next flush.
+    if cache.add(_FLUSH_LOCK_KEY, True, settings.RECENTLY_VIEWED_FLUSH_INTERVAL):
+        fire_and_forget(flush)
+
+
+def flush(batch_size=500):
+    """Write the buffered views to UserActivity and return how many were written.
+
+    Entries are taken in sequence order. A missing entry is normally a view
+    whose request has taken its number but not stored it yet, so the flush
+    stops there; if the same entry is still missing on the next flush it
+    was evicted from the cache and is skipped. Returns 0 straight away
+    while another flush is running.
+    """
+    if not cache.add(_FLUSHING_KEY, True, 300):
+        return 0
+    try:
+        return _flush(batch_size)
+    finally:
+        cache.delete(_FLUSHING_KEY)
+
+
+def _flush(batch_size):
+    last = cache.get(_SEQUENCE_KEY) or 0
+    flushed, hole = cache.get(_FLUSHED_KEY) or (0, None)
+    written = 0
+    while flushed < last:
+        seqs = list(range(flushed + 1, min(flushed + batch_size, last) + 1))
+        found = cache.get_many([_pending_key(seq) for seq in seqs])
+        views = []
+        for seq in seqs:
+            view = found.get(_pending_key(seq))
+            if view is None and seq != hole:
+                hole = seq
+                break
+            if view is not None:
+                views.append(view)
+            flushed = seq
+        written += _write_activity(views)
+        cache.delete_many([_pending_key(seq) for seq in seqs if seq <= flushed])
+        cache.set(_FLUSHED_KEY, (flushed, hole), None)
+        if flushed != seqs[-1]:
+            break
+    return written
+
+
+def _write_activity(views):
+    if not views:
+        return 0
+    # Views by accounts deleted since are dropped.
+    user_ids = set(User.objects.filter(
+        pk__in={view['user_id'] for view in views},
+    ).values_list('pk', flat=True))
+    activities = UserActivity.objects.bulk_create([
+        UserActivity(
+            user_id=view['user_id'],
+            action_type=ACTIONS[view['kind']],
+            description=f"Viewed {view['kind']}: {view['title']}",
+            ip_address=view['ip_address'],
+            user_agent=view['user_agent'],
+            metadata={'object_id': view['pk'], 'viewed_at': view['viewed_at']},
+        )
+        for view in views
+        if view['user_id'] in user_ids
+    ])
+    # created_at is set to the flush time on insert; restore the view times
+    # where the backend returned primary keys.
+    saved = [activity for activity in activities if activity.pk]
+    for activity in saved:
+        activity.created_at = parse_datetime(activity.metadata['viewed_at'])
+    if saved:
+        UserActivity.objects.bulk_update(saved, ['created_at'])
+    return len(activities)
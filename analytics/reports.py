@@ -0,0 +1,384 @@
+"""
+Report generation for ``analytics.Report``.
+
+Each report type reads its source rows in primary-key ordered chunks,
+writes them to a CSV or XLSX file as it goes and folds them into running
+counts and sums, so memory does not grow with the date range. Progress is
+saved, and the cancel flag checked, once per chunk. Reports never run in
+a web request: ``enqueue()`` hands them to a Celery worker when
+``CELERY_BROKER_URL`` is set, otherwise the ``run_reports`` command picks
+up queued reports. Each progress update is also a heartbeat;
+``recover_stale()`` re-queues reports whose worker stopped sending them.
+"""
+import csv
+import logging
+import os
+import tempfile
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book
+from circulation.models import Fine, Loan
+from repository.models import Document
+from unimaid_library.db_routers import replica_reads
+from .models import Report
+
+try:
+    import openpyxl
+except ImportError:  # XLSX output is optional
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+class ReportType:
+    """Source rows and aggregates of one report type.
+
+    ``columns`` are (header, lookup) pairs written to the file. Every
+    ``group_by`` header gets a count (and a total of each ``sum_fields``
+    header) per value, ``top`` keeps the most frequent values of a header.
+    """
+    model = None
+    date_field = None
+    columns = []
+    group_by = []
+    sum_fields = []
+    top = {}
+
+    def queryset(self):
+        return self.model.objects.all()
+
+    def rows(self, report):
+        queryset = self.queryset()
+        if self.date_field:
+            queryset = queryset.filter(**_date_range(self.model, self.date_field, report))
+        return queryset.order_by('pk').values_list('pk', *(lookup for _, lookup in self.columns))
+
+    def groups(self, row):
+        """Group values of ``row`` (a dict keyed by header)"""
+        return {header: row[header] for header in self.group_by}
+
+
+class CirculationReport(ReportType):
+    model = Loan
+    date_field = 'checkout_date'
+    columns = [
+        ('loan', 'id'), ('checkout_date', 'checkout_date'), ('due_date', 'due_date'),
+        ('return_date', 'return_date'), ('status', 'status'), ('user', 'user__username'),
+        ('membership_type', 'user__membership_type'), ('book', 'book__title'),
+        ('call_number', 'book__call_number'), ('renewed_count', 'renewed_count'),
+    ]
+    group_by = ['status', 'membership_type', 'month']
+    sum_fields = ['renewed_count']
+    top = {'book': 20}
+
+    def groups(self, row):
+        groups = {header: row[header] for header in ('status', 'membership_type')}
+        groups['month'] = timezone.localtime(row['checkout_date']).strftime('%Y-%m')
+        return groups
+
+
+class FinesReport(ReportType):
+    model = Fine
+    date_field = 'due_date'
+    columns = [
+        ('fine', 'id'), ('user', 'user__username'), ('loan', 'loan_id'), ('book', 'loan__book__title'),
+        ('amount', 'amount'), ('status', 'status'), ('due_date', 'due_date'),
+        ('paid_date', 'paid_date'), ('payment_method', 'payment_method'),
+    ]
+    group_by = ['status', 'payment_method']
+    sum_fields = ['amount']
+    top = {'user': 20}
+
+
+class CatalogReport(ReportType):
+    model = Book
+    date_field = 'created_at'
+    columns = [
+        ('book', 'id'), ('title', 'title'), ('isbn', 'isbn'), ('genre', 'genre__name'),
+        ('publisher', 'publisher__name'), ('language', 'language'), ('total_copies', 'total_copies'),
+        ('available_copies', 'available_copies'), ('location', 'location'), ('created_at', 'created_at'),
+    ]
+    group_by = ['genre', 'language']
+    sum_fields = ['total_copies', 'available_copies']
+
+    def queryset(self):
+        return Book.objects.filter(is_active=True)
+
+
+class RepositoryReport(ReportType):
+    model = Document
+    date_field = 'submission_date'
+    columns = [
+        ('document', 'id'), ('title', 'title'), ('document_type', 'document_type'),
+        ('collection', 'collection__name'), ('department', 'department'), ('year', 'year'),
+        ('access_level', 'access_level'), ('downloads', 'download_count'), ('views', 'view_count'),
+        ('submission_date', 'submission_date'),
+    ]
+    group_by = ['document_type', 'access_level', 'department']
+    sum_fields = ['downloads', 'views']
+
+    def queryset(self):
+        return Document.objects.filter(is_active=True)
+
+
+class UsersReport(ReportType):
+    model = User
+    date_field = 'date_joined'
+    columns = [
+        ('user', 'id'), ('username', 'username'), ('email', 'email'),
+        ('membership_type', 'membership_type'), ('is_active', 'is_active'),
+        ('date_joined', 'date_joined'), ('last_login', 'last_login'),
+    ]
+    group_by = ['membership_type', 'is_active']
+
+
+REPORT_TYPES = {
+    'circulation': CirculationReport,
+    'fines': FinesReport,
+    'catalog': CatalogReport,
+    'repository': RepositoryReport,
+    'users': UsersReport,
+}
+
+
+def _date_range(model, field, report):
+    """Filter kwargs for ``report``'s date range on ``field`` (both ends inclusive)"""
+    start, end = report.date_range_start, report.date_range_end
+    if model._meta.get_field(field).get_internal_type() == 'DateTimeField':
+        # Bounds on the column itself rather than __date, so indexes apply.
+        start = start and timezone.make_aware(datetime.combine(start, time.min))
+        end = end and timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        lookups = {f'{field}__gte': start, f'{field}__lt': end}
+    else:
+        lookups = {f'{field}__gte': start, f'{field}__lte': end}
+    return {lookup: value for lookup, value in lookups.items() if value is not None}
+
+
+class Tally:
+    """Running aggregates of a report's rows"""
+
+    def __init__(self, report_type):
+        self.report_type = report_type
+        self.rows = 0
+        self.totals = defaultdict(Decimal)
+        self.counts = defaultdict(Counter)
+        self.sums = defaultdict(lambda: defaultdict(lambda: defaultdict(Decimal)))
+        self.top = defaultdict(Counter)
+
+    def add(self, row):
+        self.rows += 1
+        amounts = {header: Decimal(row[header] or 0) for header in self.report_type.sum_fields}
+        for header, amount in amounts.items():
+            self.totals[header] += amount
+        for header, value in self.report_type.groups(row).items():
+            key = '' if value is None else str(value)
+            self.counts[header][key] += 1
+            for field, amount in amounts.items():
+                self.sums[header][key][field] += amount
+        for header in self.report_type.top:
+            if row[header] is not None:
+                self.top[header][row[header]] += 1
+
+    def summary(self):
+        groups = {}
+        for header, counts in self.counts.items():
+            groups[header] = [
+                dict({'value': value, 'count': count}, **{
+                    field: _number(amount) for field, amount in self.sums[header][value].items()
+                })
+                for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            ]
+        return {
+            'rows': self.rows,
+            'totals': {header: _number(amount) for header, amount in self.totals.items()},
+            'groups': groups,
+            'top': {
+                header: [[value, count] for value, count in self.top[header].most_common(limit)]
+                for header, limit in self.report_type.top.items()
+            },
+        }
+
+
+def _number(value):
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+class CSVWriter:
+    extension = 'csv'
+
+    def __init__(self, path, headers):
+        self.handle = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.handle)
+        self.writer.writerow(headers)
+
+    def write(self, values):
+        self.writer.writerow(values)
+
+    def close(self):
+        self.handle.close()
+
+
+class XLSXWriter:
+    extension = 'xlsx'
+
+    def __init__(self, path, headers):
+        if openpyxl is None:
+            raise RuntimeError('XLSX reports need openpyxl (pip install openpyxl).')
+        self.path = path
+        # Write-only workbooks stream rows to disk instead of keeping cells.
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet('Report')
+        self.sheet.append(headers)
+
+    def write(self, values):
+        # Excel has no time zones; write local times.
+        self.sheet.append([
+            timezone.localtime(value).replace(tzinfo=None) if isinstance(value, datetime) and timezone.is_aware(value) else value
+            for value in values
+        ])
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+WRITERS = {'csv': CSVWriter, 'xlsx': XLSXWriter}
+
+
+def enqueue(report):
+    """Queue ``report`` for (re)generation outside the request"""
+    Report.objects.filter(pk=report.pk).update(
+        status='queued', progress=0, rows_processed=0, cancel_requested=False, error='', finished_at=None,
+        attempts=0,
+    )
+    _dispatch(report.pk)
+
+
+def _dispatch(report_id):
+    if settings.CELERY_BROKER_URL:
+        from .tasks import generate_report
+        transaction.on_commit(lambda: generate_report.delay(report_id))
+
+
+def stale():
+    """Running reports whose worker has not sent a heartbeat for REPORT_STALE_SECONDS"""
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORT_STALE_SECONDS)
+    # Reports started before heartbeats were recorded have none.
+    return Report.objects.filter(Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True), status='running')
+
+
+def recover_stale():
+    """Re-queue (or cancel, or fail) reports whose worker died; returns how many"""
+    now = timezone.now()
+    recovered = stale().filter(cancel_requested=True).update(status='cancelled', finished_at=now)
+    recovered += stale().filter(attempts__gte=settings.REPORT_MAX_ATTEMPTS).update(
+        status='failed', finished_at=now, error='The worker stopped responding on every attempt.'
+    )
+    for report_id in stale().values_list('pk', flat=True):
+        # Conditional, so a worker that resumes its heartbeat keeps the report.
+        if stale().filter(pk=report_id).update(status='queued', progress=0, rows_processed=0):
+            _dispatch(report_id)
+            recovered += 1
+    return recovered
+
+
+def cancel(report):
+    """Stop a queued report now and a running one after its current chunk"""
+    Report.objects.filter(pk=report.pk, status='queued').update(status='cancelled', finished_at=timezone.now())
+    Report.objects.filter(pk=report.pk, status='running').update(cancel_requested=True)
+    # Nobody will read the flag of a report whose worker died.
+    stale().filter(pk=report.pk).update(status='cancelled', finished_at=timezone.now())
+
+
+def generate(report_id):
+    """Build a queued report; returns its final status"""
+    now = timezone.now()
+    # Only one worker claims a report.
+    claimed = Report.objects.filter(pk=report_id, status='queued').update(
+        status='running', started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+        progress=0, rows_processed=0, error='',
+    )
+    if not claimed:
+        return None
+    report = Report.objects.get(pk=report_id)
+    try:
+        _build(report)
+    except ReportCancelled:
+        report.refresh_from_db(fields=['progress', 'rows_processed'])
+        report.status = 'cancelled'
+    except Exception as e:
+        logger.exception('Report %s failed', report_id)
+        report.status, report.error = 'failed', str(e)
+    else:
+        report.status, report.progress = 'complete', 100
+    report.finished_at = timezone.now()
+    report.save(update_fields=['status', 'progress', 'rows_processed', 'error', 'finished_at', 'file', 'data'])
+    return report.status
+
+
+def _build(report):
+    if report.report_type not in REPORT_TYPES:
+        raise ValueError(f'{report.get_report_type_display()} cannot be generated automatically.')
+    report_type = REPORT_TYPES[report.report_type]()
+    headers = [header for header, _ in report_type.columns]
+    rows = report_type.rows(report)
+    with replica_reads():
+        total = rows.count()
+    chunk_size = settings.REPORT_CHUNK_SIZE
+
+    tally = Tally(report_type)
+    fd, path = tempfile.mkstemp(suffix=f'.{report.format}')
+    os.close(fd)
+    try:
+        writer = WRITERS[report.format](path, headers)
+        done, last = 0, None
+        try:
+            # Keyset chunks rather than one long cursor: progress writes
+            # between chunks then work on SQLite too.
+            while True:
+                with replica_reads():
+                    chunk = list((rows.filter(pk__gt=last) if last is not None else rows)[:chunk_size])
+                if not chunk:
+                    break
+                for row in chunk:
+                    values = row[1:]
+                    writer.write(values)
+                    tally.add(dict(zip(headers, values)))
+                done += len(chunk)
+                last = chunk[-1][0]
+                _checkpoint(report, done, total)
+        finally:
+            writer.close()
+
+        if report.file:
+            report.file.delete(save=False)
+        with open(path, 'rb') as handle:
+            report.file.save(f'{report.report_type}-{report.pk}.{writer.extension}', File(handle), save=False)
+        report.data = dict(tally.summary(), generated_at=timezone.now().isoformat(), range=[
+            report.date_range_start and report.date_range_start.isoformat(),
+            report.date_range_end and report.date_range_end.isoformat(),
+        ])
+        report.rows_processed = done
+    finally:
+        os.unlink(path)
+
+
+def _checkpoint(report, done, total):
+    """Save progress and the heartbeat; raises ReportCancelled once a cancel was requested"""
+    progress = min(99, done * 100 // total) if total else 99
+    if not Report.objects.filter(pk=report.pk, cancel_requested=False).update(
+        progress=progress, rows_processed=done, heartbeat_at=timezone.now()
+    ):
+        raise ReportCancelled
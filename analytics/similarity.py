@@ -0,0 +1,270 @@
+"""
+Offline related-item index for books, repository documents and blog posts.
+
+Every item is described by a sparse set of weighted features (keywords,
+subject terms, authors, genre/collection/category, tags and, for books, the
+patrons who borrowed them). Weights are TF-IDF scaled and rows are L2
+normalised, so the dot product of two rows is their cosine similarity.
+
+The matrix is kept in both CSR (item -> features) and CSC (feature -> items)
+form as plain NumPy arrays. The neighbours of one item are found by
+gathering the posting lists of its features and summing the products with
+``np.bincount``, which touches only items that share at least one feature,
+then ``np.argpartition`` picks the top K. The results are stored in
+``RelatedItems`` so detail pages read them with one indexed lookup.
+"""
+from collections import Counter, defaultdict
+import re
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import RelatedItems
+
+TOP_K = 10
+
+# Relative importance of each feature family before IDF scaling.
+WEIGHTS = {
+    'kw': 1.0,
+    'subject': 1.0,
+    'title': 0.5,
+    'author': 2.0,
+    'genre': 0.5,
+    'publisher': 0.25,
+    'borrower': 1.0,
+    'collection': 0.5,
+    'department': 0.5,
+    'type': 0.25,
+    'tag': 1.0,
+    'category': 0.5,
+}
+
+_WORD = re.compile(r'[a-z0-9]{3,}')
+
+
+def _terms(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def _phrases(text):
+    return {phrase.strip().lower() for phrase in text.split(',') if phrase.strip()}
+
+
+class ItemFeatures:
+    """Collects weighted features and change times per item"""
+
+    def __init__(self):
+        self.features = defaultdict(Counter)
+        self.changed = {}
+
+    def add(self, item_id, family, values):
+        for value in values:
+            self.features[item_id][f'{family}:{value}'] = WEIGHTS[family]
+
+    def touch(self, item_id, changed_at):
+        if changed_at and (item_id not in self.changed or changed_at > self.changed[item_id]):
+            self.changed[item_id] = changed_at
+
+
+def book_features():
+    from catalog.models import Book
+    from circulation.models import Loan
+
+    items = ItemFeatures()
+    books = Book.objects.filter(is_active=True).values_list(
+        'pk', 'updated_at', 'title', 'keywords', 'subject_heading', 'genre_id', 'publisher_id'
+    )
+    active = set()
+    for pk, updated_at, title, keywords, subject_heading, genre_id, publisher_id in books.iterator(chunk_size=2000):
+        active.add(pk)
+        items.touch(pk, updated_at)
+        items.add(pk, 'kw', _phrases(keywords))
+        items.add(pk, 'subject', _terms(subject_heading))
+        items.add(pk, 'title', _terms(title))
+        items.add(pk, 'genre', [genre_id] if genre_id else [])
+        items.add(pk, 'publisher', [publisher_id] if publisher_id else [])
+
+    authors = Book.authors.through.objects.filter(book_id__in=active).values_list('book_id', 'author_id')
+    for book_id, author_id in authors.iterator(chunk_size=5000):
+        items.add(book_id, 'author', [author_id])
+
+    # Co-borrowing: two books read by the same patrons share "borrower" features.
+    borrowers = Loan.objects.filter(book_id__in=active).values_list('book_id', 'user_id').distinct()
+    for book_id, user_id in borrowers.iterator(chunk_size=5000):
+        items.add(book_id, 'borrower', [user_id])
+    latest_loans = Loan.objects.filter(book_id__in=active).values('book_id').annotate(latest=Max('checkout_date'))
+    for row in latest_loans:
+        items.touch(row['book_id'], row['latest'])
+    return items
+
+
+def document_features():
+    from repository.models import Document
+
+    items = ItemFeatures()
+    documents = Document.objects.filter(is_active=True, is_approved=True).values_list(
+        'pk', 'updated_at', 'title', 'keywords', 'subject', 'author', 'department',
+        'collection_id', 'document_type'
+    )
+    for pk, updated_at, title, keywords, subject, author, department, collection_id, document_type in documents.iterator(chunk_size=2000):
+        items.touch(pk, updated_at)
+        items.add(pk, 'kw', _phrases(keywords))
+        items.add(pk, 'subject', _terms(subject))
+        items.add(pk, 'title', _terms(title))
+        items.add(pk, 'author', [author.strip().lower()] if author.strip() else [])
+        items.add(pk, 'department', [department.strip().lower()] if department.strip() else [])
+        items.add(pk, 'collection', [collection_id] if collection_id else [])
+        items.add(pk, 'type', [document_type])
+    return items
+
+
+def post_features():
+    from blog.models import Post
+
+    items = ItemFeatures()
+    posts = Post.objects.filter(is_published=True).values_list('pk', 'updated_at', 'title', 'category_id')
+    for pk, updated_at, title, category_id in posts.iterator(chunk_size=2000):
+        items.touch(pk, updated_at)
+        items.add(pk, 'title', _terms(title))
+        items.add(pk, 'category', [category_id] if category_id else [])
+    tags = Post.tags.through.objects.filter(post__is_published=True).values_list('post_id', 'tag_id')
+    for post_id, tag_id in tags.iterator(chunk_size=5000):
+        items.add(post_id, 'tag', [tag_id])
+    return items
+
+
+SOURCES = {
+    'book': book_features,
+    'document': document_features,
+    'post': post_features,
+}
+
+
+class SimilarityMatrix:
+    """Row-normalised TF-IDF item x feature matrix in CSR and CSC form"""
+
+    def __init__(self, features):
+        self.ids = np.array(sorted(item_id for item_id, values in features.items() if values), dtype=np.int64)
+        self.position = {item_id: row for row, item_id in enumerate(self.ids.tolist())}
+        vocabulary = {}
+        rows, cols, values = [], [], []
+        for row, item_id in enumerate(self.ids.tolist()):
+            for name, weight in features[item_id].items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(name, len(vocabulary)))
+                values.append(weight)
+        n_items, n_features = len(self.ids), len(vocabulary)
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+
+        # Rare features say more about an item than ones most items share.
+        document_frequency = np.bincount(cols, minlength=n_features)
+        values *= (np.log((1 + n_items) / (1 + document_frequency)) + 1)[cols]
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=n_items))
+        values /= norms[rows]
+
+        # Rows were appended in order, so the triplets are already CSR.
+        self.row_ptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_items))))
+        self.row_cols = cols
+        self.row_values = values
+        order = np.argsort(cols, kind='stable')
+        self.col_ptr = np.concatenate(([0], np.cumsum(document_frequency)))
+        self.col_rows = rows[order]
+        self.col_values = values[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def neighbors(self, item_id, k=TOP_K):
+        """Return (ids, scores) of the ``k`` most similar items, best first.
+
+        ``k=None`` returns every item sharing a feature with ``item_id``.
+        """
+        row = self.position.get(item_id)
+        if row is None:
+            return [], []
+        start, end = self.row_ptr[row], self.row_ptr[row + 1]
+        cols, weights = self.row_cols[start:end], self.row_values[start:end]
+
+        # Concatenate the posting lists of this item's features.
+        starts = self.col_ptr[cols]
+        lengths = self.col_ptr[cols + 1] - starts
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        postings = np.repeat(starts, lengths) + offsets
+        scores = np.bincount(
+            self.col_rows[postings],
+            weights=self.col_values[postings] * np.repeat(weights, lengths),
+            minlength=len(self.ids),
+        )
+        scores[row] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if k is not None and len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return self.ids[candidates].tolist(), np.round(scores[candidates], 4).tolist()
+
+
+def build_index(item_type, incremental=False, top_k=TOP_K):
+    """Recompute stored neighbours for one item type.
+
+    A full build rewrites every row. An incremental build only recomputes
+    items changed (or, for books, borrowed) since the previous run, plus
+    items whose stored neighbours include a changed or removed item and
+    items a changed item now scores high enough to join. Returns a dict with
+    the number of rows written and deleted.
+    """
+    if top_k < 1:
+        raise ValueError('top_k must be at least 1')
+    started = timezone.now()
+    items = SOURCES[item_type]()
+    matrix = SimilarityMatrix(items.features)
+
+    existing, threshold = {}, {}
+    stored = RelatedItems.objects.filter(item_type=item_type).values_list('item_id', 'neighbor_ids', 'scores')
+    for item_id, neighbor_ids, scores in stored:
+        existing[item_id] = set(neighbor_ids)
+        # The score a newcomer has to beat; any score will do on a short list.
+        threshold[item_id] = scores[-1] if len(scores) >= top_k else 0
+    indexed = set(matrix.position)
+    removed = set(existing) - indexed
+
+    if incremental and existing:
+        since = RelatedItems.objects.filter(item_type=item_type).aggregate(last=Max('computed_at'))['last']
+        changed = {
+            item_id for item_id in indexed
+            if item_id not in existing or (items.changed.get(item_id) and items.changed[item_id] > since)
+        }
+        stale = changed | removed
+        targets = changed | {
+            item_id for item_id, neighbor_ids in existing.items()
+            if item_id in indexed and neighbor_ids & stale
+        }
+        # Similarity is symmetric, so a changed item can also enter the
+        # neighbour list of items that did not change themselves.
+        for item_id in changed:
+            for neighbor_id, score in zip(*matrix.neighbors(item_id, k=None)):
+                if score > threshold.get(neighbor_id, 0):
+                    targets.add(neighbor_id)
+    else:
+        targets = indexed
+
+    rows = []
+    for item_id in sorted(targets):
+        neighbor_ids, scores = matrix.neighbors(item_id, top_k)
+        rows.append(RelatedItems(
+            item_type=item_type, item_id=item_id, neighbor_ids=neighbor_ids,
+            scores=scores, computed_at=started,
+        ))
+
+    with transaction.atomic():
+        RelatedItems.objects.filter(item_type=item_type, item_id__in=removed).delete()
+        RelatedItems.objects.bulk_create(
+            rows, batch_size=500, update_conflicts=True,
+            unique_fields=['item_type', 'item_id'],
+            update_fields=['neighbor_ids', 'scores', 'computed_at'],
+        )
+    return {'items': len(matrix), 'written': len(rows), 'deleted': len(removed)}
@@ -0,0 +1,287 @@
+"""
+Search logging and search-box suggestions.
+
+``log_search`` records catalog and repository searches in SearchQuery from
+a background thread, with the number of results found. Only the first page
+of results is logged, so paging through a search counts it once.
+
+Suggestions come from an in-memory index of popular queries (searches that
+found something, counted), book titles, author names and document titles.
+Every entry is stored under its full normalised text and under each later
+word that is not a stop word, so "intro" finds "An Introduction to Botany".
+The (key, entry) pairs are kept in one sorted list: a prefix lookup is a
+``bisect`` into that list and a scan of the matching slice. The best
+entries for one- and two-letter prefixes, whose slices can be very long,
+are precomputed.
+
+Each process keeps its own index. It is built in the background on first
+use (no suggestions are offered until it is ready) and then refreshed in the background every ``SUGGESTIONS_REFRESH_SECONDS``, reading
+only books and documents updated, authors added and searches logged since
+the previous refresh; it is rebuilt from scratch every
+``SUGGESTIONS_REBUILD_SECONDS`` to drop deleted items and old searches.
+``invalidate()`` makes every process refresh on its next lookup (through
+the shared cache) after a bulk change such as lifting embargoes.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from heapq import merge, nsmallest
+from urllib.parse import urlencode
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from unimaid_library.concurrency import fire_and_forget
+
+from .models import SearchQuery
+
+LIMIT = 8
+TABLE_DEPTH = 2
+QUERY_WEIGHT = 2.0
+STOP_WORDS = {'a', 'an', 'and', 'at', 'by', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'}
+
+# Which entries each search box is offered.
+SCOPES = {
+    'all': {'query', 'book', 'author', 'document'},
+    'catalog': {'query', 'book', 'author'},
+    'repository': {'query', 'document'},
+}
+
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return _SPACE.sub(' ', text).strip().lower()
+
+
+def log_search(request, search_type, query, result_count, filters=None):
+    """Record a search in SearchQuery without delaying the response"""
+    query = normalize(query)[:500]
+    if not query or request.GET.get('page', '1') not in ('', '1'):
+        return
+    fire_and_forget(
+        SearchQuery.objects.create,
+        query=query,
+        user=request.user if request.user.is_authenticated else None,
+        result_count=result_count,
+        search_type=search_type,
+        filters=filters or {},
+    )
+
+
+def _keys(text):
+    """The full text and every suffix starting at a non-stop word"""
+    words = normalize(text).split(' ')
+    keys = [' '.join(words)]
+    for position in range(1, len(words)):
+        if words[position] not in STOP_WORDS:
+            keys.append(' '.join(words[position:]))
+    return [key for key in keys if key]
+
+
+def _in_scope(ref, kinds, search_type):
+    # Query refs are ('query', search_type, text); other refs are (kind, pk).
+    if ref[0] == 'query':
+        return 'query' in kinds and (search_type == 'all' or ref[1] == search_type)
+    return ref[0] in kinds
+
+
+class SuggestionIndex:
+    """Immutable sorted (key, ref) pairs plus entry labels and scores"""
+
+    def __init__(self, entries, pairs, watermarks, built_at, rebuilt_at):
+        # ref -> (label, score)
+        self.entries = entries
+        self.pairs = pairs
+        self.watermarks = watermarks
+        self.built_at = built_at
+        self.rebuilt_at = rebuilt_at
+        self.table = self._build_table()
+
+    def _rank(self, refs):
+        return nsmallest(LIMIT, refs, key=lambda ref: (-self.entries[ref][1], self.entries[ref][0]))
+
+    def _build_table(self):
+        buckets = defaultdict(set)
+        for key, ref in self.pairs:
+            for depth in range(1, TABLE_DEPTH + 1):
+                if len(key) >= depth:
+                    buckets[key[:depth]].add(ref)
+        table = {}
+        for prefix, refs in buckets.items():
+            for search_type, kinds in SCOPES.items():
+                table[search_type, prefix] = self._rank(
+                    ref for ref in refs if _in_scope(ref, kinds, search_type)
+                )
+        return table
+
+    def suggest(self, prefix, search_type='all', limit=LIMIT):
+        """Best entries whose text (or a later word of it) starts with ``prefix``"""
+        prefix = normalize(prefix)
+        if not prefix or search_type not in SCOPES:
+            return []
+        if len(prefix) <= TABLE_DEPTH:
+            refs = self.table.get((search_type, prefix), [])
+        else:
+            kinds = SCOPES[search_type]
+            start = bisect_left(self.pairs, (prefix,))
+            end = bisect_left(self.pairs, (prefix + '\uffff',))
+            refs = self._rank({
+                ref for _, ref in self.pairs[start:end] if _in_scope(ref, kinds, search_type)
+            })
+        return [(ref, self.entries[ref][0]) for ref in refs[:limit]]
+
+
+def _query_rows(since_id, until_id):
+    searches = SearchQuery.objects.filter(
+        pk__gt=since_id, pk__lte=until_id, result_count__gt=0,
+        created_at__gte=timezone.now() - timedelta(days=settings.SUGGESTIONS_QUERY_DAYS),
+    ).exclude(search_type__in=['blog', 'general'])
+    return searches.values('search_type', 'query').annotate(searches=Count('pk')).order_by()
+
+
+def _load(watermarks, latest_author, latest_search):
+    """Rows changed since ``watermarks`` (everything when it is empty)"""
+    from catalog.models import Author, Book
+    from repository.models import Document, access_rule
+
+    since = watermarks.get('since')
+    changes = {}
+
+    books = Book.objects.all() if since else Book.objects.filter(is_active=True)
+    if since:
+        books = books.filter(updated_at__gt=since)
+    for pk, title, is_active in books.values_list('pk', 'title', 'is_active').iterator(chunk_size=5000):
+        changes['book', pk] = (title, 1.0) if is_active else None
+
+    # The search box is public: only documents anyone may open are offered.
+    public = Q(is_active=True, is_approved=True) & access_rule(None)
+    documents = Document.objects.filter(updated_at__gt=since) if since else Document.objects.filter(public)
+    rows = documents.annotate(public=ExpressionWrapper(public, output_field=BooleanField()))
+    for pk, title, is_public, view_count in rows.values_list('pk', 'title', 'public', 'view_count').iterator(chunk_size=5000):
+        changes['document', pk] = (title, 1.0 + math.log1p(view_count) / 10) if is_public else None
+
+    authors = Author.objects.filter(
+        pk__gt=watermarks.get('author', 0), pk__lte=latest_author
+    ).annotate(book_count=Count('books'))
+    for author in authors.iterator(chunk_size=5000):
+        changes['author', author.pk] = (str(author), 1.0 + math.log1p(author.book_count) / 10)
+
+    searches = {
+        (row['search_type'], row['query']): row['searches']
+        for row in _query_rows(watermarks.get('search', 0), latest_search)
+    }
+    return changes, searches
+
+
+def build(previous=None):
+    """Build a new index, reusing ``previous`` and reading only what changed"""
+    from catalog.models import Author
+
+    started = timezone.now()
+    watermarks = dict(previous.watermarks) if previous else {}
+    # Rows added while this build runs are left for the next one.
+    latest_author = Author.objects.aggregate(last=Max('pk'))['last'] or 0
+    latest_search = SearchQuery.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    changes, searches = _load(watermarks, latest_author, latest_search)
+
+    entries = dict(previous.entries) if previous else {}
+    counts = dict(watermarks.get('counts', {}))
+    for (search_type, query), searches_count in searches.items():
+        key = f'{search_type}:{query}'
+        counts[key] = counts.get(key, 0) + searches_count
+        ref = ('query', search_type, query)
+        if counts[key] >= settings.SUGGESTIONS_MIN_SEARCHES:
+            changes[ref] = (query, QUERY_WEIGHT * math.log2(1 + counts[key]))
+
+    added = []
+    for ref, entry in changes.items():
+        if entry is None:
+            entries.pop(ref, None)
+            continue
+        entries[ref] = entry
+        added.extend((key, ref) for key in _keys(entry[0]))
+    if previous:
+        kept = [pair for pair in previous.pairs if pair[1] not in changes]
+        pairs = list(merge(kept, sorted(added)))
+    else:
+        pairs = sorted(added)
+
+    watermarks.update(since=started, author=latest_author, search=latest_search, counts=counts)
+    return SuggestionIndex(
+        entries, pairs, watermarks, built_at=time.monotonic(),
+        rebuilt_at=previous.rebuilt_at if previous else time.monotonic(),
+    )
+
+
+_lock = threading.Lock()
+_index = None
+_refreshing = False
+_generation = None
+GENERATION_KEY = 'suggestions:generation'
+
+
+def invalidate():
+    """Ask every process to refresh its index on the next lookup"""
+    cache.set(GENERATION_KEY, time.time(), None)
+
+
+_EMPTY = SuggestionIndex({}, [], {}, built_at=0, rebuilt_at=0)
+
+
+def _refresh(full):
+    global _index, _refreshing
+    try:
+        index = build(None if full else _index)
+        with _lock:
+            _index = index
+    finally:
+        _refreshing = False
+
+
+def current_index():
+    """This process's index; built and refreshed in the background"""
+    global _index, _refreshing, _generation
+    generation = cache.get(GENERATION_KEY)
+    with _lock:
+        if _index is None:
+            # A cold build reads every title; requests do not wait for it.
+            if not _refreshing:
+                _generation = generation
+                _refreshing = True
+                fire_and_forget(_refresh, True)
+            return _EMPTY
+        age = time.monotonic() - _index.built_at
+        stale = age >= settings.SUGGESTIONS_REFRESH_SECONDS or generation != _generation
+        if stale and not _refreshing:
+            _generation = generation
+            _refreshing = True
+            full = time.monotonic() - _index.rebuilt_at >= settings.SUGGESTIONS_REBUILD_SECONDS
+            fire_and_forget(_refresh, full)
+        return _index
+
+
+def suggest(prefix, search_type='all', limit=LIMIT):
+    """Suggestions as dicts with a label, kind and link"""
+    results = []
+    for ref, label in current_index().suggest(prefix, search_type, limit):
+        kind = ref[0]
+        if kind == 'query':
+            view = 'catalog:book_search' if ref[1] == 'catalog' else 'repository:document_search'
+            url = f'{reverse(view)}?{urlencode({"q": label})}'
+        elif kind == 'book':
+            url = reverse('catalog:book_detail', kwargs={'pk': ref[1]})
+        elif kind == 'author':
+            url = reverse('catalog:author_detail', kwargs={'pk': ref[1]})
+        else:
+            url = reverse('repository:document_detail', kwargs={'pk': ref[1]})
+        results.append({'label': label, 'kind': kind, 'url': url})
+    return results
@@ -0,0 +1,8 @@
+from celery import shared_task
+from . import reports
+
+
+@shared_task(ignore_result=True)
+def generate_report(report_id):
+    """Build a queued analytics.Report on a Celery worker"""
+    reports.generate(report_id)
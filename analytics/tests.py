@@ -1,3 +1,230 @@
-from django.test import TestCase
+import csv
+import io
+from datetime import timedelta
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book
+from repository.models import Document
+from unimaid_library.testing import TemporaryMediaMixin
+from . import recently_viewed, reports
+from .admin import ReportAdmin
+from .models import Report, UserActivity
+
+
+class ReportTestCase(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('amina', 'bello', 'chinedu'):
+            User.objects.create_user(username=name, password='secret', membership_type='student')
+        User.objects.create_user(username='dr_yusuf', password='secret', membership_type='faculty')
+
+    def make_report(self, report_type='users', **fields):
+        report = Report.objects.create(report_type=report_type, title=f'{report_type} report', **fields)
+        reports.enqueue(report)
+        return report
+
+    def make_running(self, heartbeat_age=timedelta(hours=1), **fields):
+        report = self.make_report()
+        Report.objects.filter(pk=report.pk).update(
+            status='running', heartbeat_at=timezone.now() - heartbeat_age, attempts=1, **fields
+        )
+        return report
+
+    def status(self, report):
+        report.refresh_from_db()
+        return report.status
+
+
+class GenerateTests(ReportTestCase):
+    def test_generates_file_and_summary(self):
+        report = self.make_report()
+
+        with self.settings(REPORT_CHUNK_SIZE=2):
+            self.assertEqual(reports.generate(report.pk), 'complete')
+
+        report.refresh_from_db()
+        self.assertEqual((report.progress, report.rows_processed, report.attempts), (100, 4, 1))
+        self.assertEqual(report.data['rows'], 4)
+        self.assertEqual(report.data['groups']['membership_type'][0], {'value': 'student', 'count': 3})
+        with report.file.open('r') as handle:
+            rows = list(csv.DictReader(io.StringIO(handle.read())))
+        self.assertEqual(sorted(row['username'] for row in rows), ['amina', 'bello', 'chinedu', 'dr_yusuf'])
+
+    def test_report_is_claimed_once(self):
+        report = self.make_report()
+        self.assertEqual(reports.generate(report.pk), 'complete')
+        self.assertIsNone(reports.generate(report.pk))
+
+    def test_unsupported_type_fails(self):
+        report = self.make_report(report_type='custom')
+
+        with self.assertLogs('analytics.reports', 'ERROR'):
+            self.assertEqual(reports.generate(report.pk), 'failed')
+        report.refresh_from_db()
+        self.assertIn('cannot be generated', report.error)
+
+    def test_run_reports_generates_queued_reports(self):
+        first, second = self.make_report(), self.make_report(report_type='catalog')
+
+        call_command('run_reports', stdout=io.StringIO())
+
+        self.assertEqual((self.status(first), self.status(second)), ('complete', 'complete'))
+
+    @skipUnless(reports.openpyxl is None, 'openpyxl is installed')
+    def test_xlsx_without_openpyxl_fails_clearly(self):
+        report = self.make_report(format='xlsx')
+
+        with self.assertLogs('analytics.reports', 'ERROR'):
+            self.assertEqual(reports.generate(report.pk), 'failed')
+        report.refresh_from_db()
+        self.assertIn('openpyxl', report.error)
+
+    @skipUnless(reports.openpyxl is None, 'openpyxl is installed')
+    def test_admin_hides_xlsx_without_openpyxl(self):
+        request = RequestFactory().get('/')
+        field = ReportAdmin(Report, AdminSite()).formfield_for_dbfield(Report._meta.get_field('format'), request)
+        self.assertNotIn('xlsx', [value for value, _ in field.choices])
+
+    @skipIf(reports.openpyxl is None, 'openpyxl is not installed')
+    def test_generates_xlsx(self):
+        report = self.make_report(format='xlsx')
+
+        self.assertEqual(reports.generate(report.pk), 'complete')
+        report.refresh_from_db()
+        self.assertTrue(report.file.name.endswith('.xlsx'))
+
+
+class CancelTests(ReportTestCase):
+    def test_cancel_queued_report(self):
+        report = self.make_report()
+
+        reports.cancel(report)
+
+        self.assertEqual(self.status(report), 'cancelled')
+        self.assertIsNone(reports.generate(report.pk))
+
+    def test_running_report_stops_at_next_chunk(self):
+        report = self.make_report()
+        # Cancelled after a worker claimed it: the worker sees the flag at its first checkpoint.
+        Report.objects.filter(pk=report.pk).update(cancel_requested=True)
+
+        self.assertEqual(reports.generate(report.pk), 'cancelled')
+        report.refresh_from_db()
+        self.assertFalse(report.file)
+
+    def test_cancel_running_report_sets_flag(self):
+        report = self.make_running(heartbeat_age=timedelta(0))
+
+        reports.cancel(report)
+
+        report.refresh_from_db()
+        self.assertEqual((report.status, report.cancel_requested), ('running', True))
+
+    def test_cancel_stale_report_finishes_it(self):
+        report = self.make_running()
+
+        reports.cancel(report)
+
+        self.assertEqual(self.status(report), 'cancelled')
+
+
+class RecoverStaleTests(ReportTestCase):
+    def test_stale_report_is_requeued_and_regenerated(self):
+        report = self.make_running()
+
+        self.assertEqual(reports.recover_stale(), 1)
+        self.assertEqual(self.status(report), 'queued')
+        self.assertEqual(reports.generate(report.pk), 'complete')
+        report.refresh_from_db()
+        self.assertEqual(report.attempts, 2)
+
+    def test_report_with_recent_heartbeat_is_left_alone(self):
+        report = self.make_running(heartbeat_age=timedelta(seconds=10))
+
+        self.assertEqual(reports.recover_stale(), 0)
+        self.assertEqual(self.status(report), 'running')
+
+    def test_report_without_heartbeat_is_stale(self):
+        report = self.make_running()
+        Report.objects.filter(pk=report.pk).update(heartbeat_at=None)
+
+        self.assertEqual(reports.recover_stale(), 1)
+        self.assertEqual(self.status(report), 'queued')
+
+    def test_repeatedly_stalled_report_fails(self):
+        report = self.make_running()
+        with self.settings(REPORT_MAX_ATTEMPTS=1):
+            reports.recover_stale()
+
+        self.assertEqual(self.status(report), 'failed')
+
+    def test_stale_report_with_cancel_request_is_cancelled(self):
+        report = self.make_running(cancel_requested=True)
+
+        reports.recover_stale()
+
+        self.assertEqual(self.status(report), 'cancelled')
+
+
+@mock.patch('analytics.recently_viewed.fire_and_forget')
+class RecentlyViewedTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='amina', password='secret')
+        cls.book = Book.objects.create(title='Things Fall Apart')
+        cls.document = Document.objects.create(
+            title='Groundwater in the Lake Chad Basin', document_type='thesis', author='A. Bukar',
+            is_approved=True, file=ContentFile(b'%PDF-1.4 thesis', name='thesis.pdf'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def view(self, obj):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.7')
+        request.user = self.user
+        recently_viewed.record_view(request, 'document' if isinstance(obj, Document) else 'book', obj)
+
+    def test_views_only_touch_the_cache_until_flushed(self, fire_and_forget):
+        self.view(self.book)
+        self.view(self.document)
+        self.view(self.document)
+
+        self.assertFalse(UserActivity.objects.exists())
+        self.assertEqual(recently_viewed.recent_ids(self.user, 'document'), [self.document.pk])
+        self.assertEqual(recently_viewed.recent_ids(self.user, 'book'), [self.book.pk])
+        fire_and_forget.assert_called_once_with(recently_viewed.flush)
+
+        with self.assertNumQueries(3):  # user ids, one INSERT, one created_at UPDATE
+            self.assertEqual(recently_viewed.flush(), 2)
+        activities = UserActivity.objects.all()
+        self.assertEqual({activity.action_type for activity in activities}, {'view_document'})
+        self.assertEqual(len(activities), 2)
+        self.assertEqual(recently_viewed.flush(), 0)
+
+    def test_flush_waits_once_for_a_missing_entry(self, fire_and_forget):
+        for _ in range(3):
+            self.view(self.document)
+        cache.delete(recently_viewed._pending_key(2))
+
+        self.assertEqual(recently_viewed.flush(), 1)
+        self.assertEqual(recently_viewed.flush(), 1)
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+    def test_flush_command(self, fire_and_forget):
+        self.view(self.document)
+        out = io.StringIO()
+
+        call_command('flush_recent_views', stdout=out)
+
+        self.assertIn('Wrote 1 view(s)', out.getvalue())
+        self.assertEqual(UserActivity.objects.get().user, self.user)
@@ -5,5 +5,6 @@ app_name = 'analytics'
 
 urlpatterns = [
     path('', views.AnalyticsDashboardView.as_view(), name='dashboard'),
+    path('suggest/', views.SuggestView.as_view(), name='suggest'),
 ]
 
@@ -1,4 +1,5 @@
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
+from django.http import JsonResponse
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.db.models import Sum
 from django.utils import timezone
@@ -8,6 +9,8 @@ from repository.models import Document
 from blog.models import Post
 from events.models import Event
 from accounts.models import User
+from unimaid_library.db_routers import replica_reads
+from .suggestions import suggest
 
 
 class AnalyticsDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
@@ -17,8 +20,10 @@ class AnalyticsDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateVi
         return self.request.user.is_staff
     
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        
+        with replica_reads():
+            return self._get_statistics(super().get_context_data(**kwargs))
+    
+    def _get_statistics(self, context):
         # Catalog statistics
         context['total_books'] = Book.objects.filter(is_active=True).count()
         context['total_copies'] = Copy.objects.count()
@@ -54,3 +59,14 @@ class AnalyticsDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateVi
         ).count()
         
         return context
+
+
+class SuggestView(View):
+    """Search-box suggestions: ?q=<prefix>&type=all|catalog|repository"""
+    
+    def get(self, request):
+        query = request.GET.get('q', '')[:100]
+        search_type = request.GET.get('type', 'all')
+        response = JsonResponse({'query': query, 'suggestions': suggest(query, search_type)})
+        response['Cache-Control'] = 'public, max-age=60'
+        return response
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api import outbox
+from api.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = 'Drop changes superseded by a later change of the same object (run daily)'
+
+    def handle(self, *args, **options):
+        # Consumers must still see every change they have not read yet.
+        removed = ChangeLog.objects.compact(before=outbox.low_watermark())
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} superseded change(s).'))
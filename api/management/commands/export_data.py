@@ -0,0 +1,56 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from django_filters.rest_framework import DjangoFilterBackend
+from api import exports, views
+
+RESOURCES = {
+    'books': views.BookViewSet,
+    'documents': views.DocumentViewSet,
+    'loans': views.LoanViewSet,
+    'users': views.UserViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = 'Stream a whole API resource to a file (or stdout) as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(RESOURCES))
+        parser.add_argument('--as', dest='format', choices=sorted(exports.FORMATS), default='ndjson')
+        parser.add_argument('--output', '-o', help='File to write (default stdout)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE',
+                            help="The resource's API filter fields, e.g. --filter status=active")
+
+    def handle(self, *args, **options):
+        viewset = RESOURCES[options['resource']]()
+        model = viewset.serializer_class.Meta.model
+        # The whole resource, as staff see it through the API.
+        queryset = viewset.queryset.all() if viewset.queryset is not None else model.objects.all()
+
+        params = QueryDict(mutable=True)
+        for item in options['filter']:
+            field, sep, value = item.partition('=')
+            if not sep or field not in viewset.filterset_fields:
+                raise CommandError(f'--filter takes FIELD=VALUE with FIELD one of: {", ".join(viewset.filterset_fields)}')
+            params[field] = value
+        filterset = DjangoFilterBackend().get_filterset_class(viewset, queryset)(params, queryset=queryset)
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        queryset = filterset.qs
+        if getattr(viewset, 'ordering', None):
+            queryset = queryset.order_by(*viewset.ordering)
+
+        blocks = exports.stream(queryset, viewset.export_fields, viewset.export_many, options['format'], options['gzip'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            written = 0
+            for block in blocks:
+                output.write(block)
+                written += len(block)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} bytes to {options["output"]}.'))
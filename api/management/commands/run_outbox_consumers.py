@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = 'Feed new change-log entries to the registered outbox consumers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', action='append', help='Only run these consumers')
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling every --interval seconds')
+        parser.add_argument('--interval', type=float, default=5.0)
+        parser.add_argument('--max-batches', type=int, help='Stop each consumer after this many batches')
+
+    def handle(self, *args, **options):
+        registered = outbox.consumers()
+        names = options['consumer'] or sorted(registered)
+        unknown = set(names) - set(registered)
+        if unknown:
+            raise CommandError(f'Unknown consumer(s): {", ".join(sorted(unknown))}; registered: {", ".join(sorted(registered))}')
+
+        while True:
+            for name in names:
+                handled = outbox.run(registered[name], options['max_batches'])
+                if handled or not options['loop']:
+                    self.stdout.write(self.style.SUCCESS(f'{name}: {handled} change(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumercheckpoint',
+            name='gaps',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
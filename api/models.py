@@ -1,3 +1,139 @@
-from django.db import models
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 
-# Create your models here.
+
+class ChangeLogQuerySet(models.QuerySet):
+    def record(self, instances, action='updated'):
+        """Append a change of each TrackedModel instance, for writes that bypass save()"""
+        return self.bulk_create([self._entry(instance, action) for instance in instances])
+    
+    def record_instance(self, instance, action):
+        """Append a change of a TrackedModel instance with its current field values"""
+        entry = self._entry(instance, action)
+        entry.save(force_insert=True)
+        return entry
+    
+    def _entry(self, instance, action):
+        return self.model(
+            resource=instance.change_resource, object_id=instance.pk, action=action,
+            deleted=action == 'deleted' or not instance.is_listed(), payload=instance.change_payload(),
+        )
+    
+    def settled(self):
+        """Changes old enough for sync clients to read.
+
+        Rows younger than CHANGE_LOG_SETTLE_SECONDS are held back, so a
+        transaction that took its id shortly before a faster one committed
+        is not skipped by clients that resume after the faster one. This is
+        best effort; outbox consumers track skipped ids instead (api.outbox).
+        """
+        return self.filter(created_at__lt=timezone.now() - timedelta(seconds=settings.CHANGE_LOG_SETTLE_SECONDS))
+    
+    def head(self):
+        """The latest settled change sequence"""
+        return self.settled().order_by('-pk').values_list('pk', flat=True).first() or 0
+    
+    def compact(self, before=None):
+        """Delete changes superseded by a later change of the same object; returns the count.
+
+        Only rows up to ``before`` are removed, so consumers that have not
+        read past it still see every change.
+        """
+        # The newest row is never superseded, so SQLite cannot reuse its id
+        # and the sequence stays monotonic.
+        newer = ChangeLog.objects.filter(
+            resource=OuterRef('resource'), object_id=OuterRef('object_id'), pk__gt=OuterRef('pk')
+        )
+        queryset = self.filter(Exists(newer))
+        if before is not None:
+            queryset = queryset.filter(pk__lte=before)
+        return queryset.delete()[0]
+
+
+class ChangeLog(models.Model):
+    """Transactional outbox of model changes (see api.outbox and api.sync).
+
+    The auto-increment id is the change sequence that sync clients and
+    outbox consumers resume from.
+    """
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+    
+    resource = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='updated')
+    deleted = models.BooleanField(default=False)  # Tombstone: deleted or no longer listed
+    payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)  # Field values after the change
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ChangeLogQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "Change Log Entry"
+        verbose_name_plural = "Change Log"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['resource', 'id']),
+            models.Index(fields=['resource', 'object_id', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.resource}/{self.object_id}"
+
+
+class ConsumerCheckpoint(models.Model):
+    """Position of an outbox consumer in the change log"""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    gaps = models.JSONField(default=dict, blank=True)  # Skipped ids below position -> time first seen
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Consumer Checkpoint"
+        verbose_name_plural = "Consumer Checkpoints"
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class TrackedModel(models.Model):
+    """Model whose saves are written to the ChangeLog in the same transaction.
+
+    Deletes (including cascades and queryset deletes) are recorded by a
+    post_delete receiver, which Django runs inside the delete transaction.
+    Set ``change_resource``; override ``is_listed()`` when some rows are
+    hidden from the API.
+    """
+    change_resource = None
+    
+    class Meta:
+        abstract = True
+    
+    def is_listed(self):
+        return True
+    
+    def change_payload(self):
+        """Field values after the change; long text fields are left out"""
+        payload = {}
+        for field in self._meta.concrete_fields:
+            if isinstance(field, models.TextField):
+                continue
+            value = field.value_from_object(self)
+            if isinstance(field, models.FileField):
+                value = value.name or None
+            payload[field.attname] = value
+        return payload
+    
+    def save(self, *args, **kwargs):
+        action = 'created' if self._state.adding else 'updated'
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeLog.objects.record_instance(self, action)
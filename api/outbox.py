@@ -0,0 +1,128 @@
+"""
+Consumers of the change log.
+
+Tracked models (api.models.TrackedModel) write a ``ChangeLog`` row in the
+same transaction as every save and delete, so the log is a transactional
+outbox: it holds exactly the changes that committed. A ``Consumer`` reads
+it in batches after its ``ConsumerCheckpoint``. Handling a batch and
+advancing the checkpoint happen in one transaction, so a consumer's
+database updates are applied once per change; other side effects (such
+as cache deletes) must be idempotent, because a failed batch is retried.
+
+Ids are taken when a row is inserted, not when it commits, so a batch can
+contain a change whose predecessor is still uncommitted. The checkpoint
+only moves to the last id read, and every id skipped on the way is kept
+as a gap and looked up again on each run. A gap that is still empty after
+OUTBOX_GAP_TIMEOUT seconds is taken to be a rolled-back transaction and
+dropped (with a warning); a change that commits even later is missed.
+
+Consumers live in each app's ``consumers.py`` and are registered with
+``@register``; the run_outbox_consumers command runs them.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import ChangeLog, ConsumerCheckpoint
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Consumer:
+    """Handles batches of changes of ``resources`` (all resources when empty).
+
+    Subclasses set ``name`` and define ``handle(changes)``, which receives a
+    list of ChangeLog rows, oldest first.
+    """
+    name = None
+    resources = ()
+    batch_size = None
+    handle = None
+
+    def check(self):
+        if not self.name:
+            raise ImproperlyConfigured(f'{self.__class__.__name__} is missing a name.')
+        if not callable(self.handle):
+            raise ImproperlyConfigured(f'{self.__class__.__name__} must define handle(changes).')
+
+
+def register(cls):
+    consumer = cls()
+    consumer.check()
+    _registry[cls.name] = consumer
+    return cls
+
+
+def consumers():
+    """Registered consumers by name"""
+    autodiscover_modules('consumers')
+    return dict(_registry)
+
+
+def run(consumer, max_batches=None):
+    """Feed ``consumer`` the changes after its checkpoint; returns the number handled"""
+    consumer.check()
+    ConsumerCheckpoint.objects.get_or_create(name=consumer.name)
+    batch_size = consumer.batch_size or settings.OUTBOX_BATCH_SIZE
+    handled = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            # Locks the checkpoint, so two runners never handle a batch twice.
+            checkpoint = ConsumerCheckpoint.objects.select_for_update().get(name=consumer.name)
+            gaps = {int(pk): seen for pk, seen in checkpoint.gaps.items()}
+            now = time.time()
+
+            # Changes that committed since they were skipped.
+            filled = list(ChangeLog.objects.filter(pk__in=gaps).values_list('pk', 'resource')) if gaps else []
+            for pk, _ in filled:
+                del gaps[pk]
+            for pk, seen in list(gaps.items()):
+                if now - seen > settings.OUTBOX_GAP_TIMEOUT:
+                    logger.warning('Outbox consumer %s gave up waiting for change %s', consumer.name, pk)
+                    del gaps[pk]
+
+            scanned = list(
+                ChangeLog.objects.filter(pk__gt=checkpoint.position).order_by('pk')
+                .values_list('pk', 'resource', 'created_at')[:batch_size]
+            )
+            # Holes below older rows are compacted or rolled-back changes:
+            # anything still open would be past the timeout already.
+            recent = timezone.now() - timedelta(seconds=settings.OUTBOX_GAP_TIMEOUT)
+            previous = checkpoint.position
+            for pk, _, created_at in scanned:
+                if created_at >= recent:
+                    gaps.update(dict.fromkeys(range(previous + 1, pk), now))
+                previous = pk
+
+            ids = [pk for pk, resource, *_ in filled + scanned if not consumer.resources or resource in consumer.resources]
+            batch = list(ChangeLog.objects.filter(pk__in=ids).order_by('pk')) if ids else []
+            if batch:
+                consumer.handle(batch)
+            checkpoint.position = previous
+            checkpoint.gaps = {str(pk): seen for pk, seen in gaps.items()}
+            checkpoint.save(update_fields=['position', 'gaps', 'updated_at'])
+        handled += len(batch)
+        batches += 1
+        if len(scanned) < batch_size:
+            break
+    return handled
+
+
+def low_watermark():
+    """Change sequence every registered consumer has read up to (None without consumers)"""
+    names = list(consumers())
+    if not names:
+        return None
+    positions = dict.fromkeys(names, 0)
+    for checkpoint in ConsumerCheckpoint.objects.filter(name__in=names):
+        # Changes in a gap may still commit and must not be compacted away.
+        positions[checkpoint.name] = min([checkpoint.position] + [int(pk) - 1 for pk in checkpoint.gaps])
+    return min(positions.values())
@@ -2,7 +2,8 @@ from rest_framework import serializers
 from catalog.models import Book, Author, Genre, Publisher
 from circulation.models import Loan
 from accounts.models import User
-from repository.models import Document
+from repository import uploads
+from repository.models import Document, UploadSession
 from events.models import Event
 
 
@@ -77,8 +78,6 @@ class DocumentSerializer(serializers.ModelSerializer):
 
 
 class EventSerializer(serializers.ModelSerializer):
-    registration_count = serializers.IntegerField(source='registrations.count', read_only=True)
-    
     class Meta:
         model = Event
         fields = [
@@ -88,3 +87,33 @@ class EventSerializer(serializers.ModelSerializer):
             'registration_count', 'is_featured', 'created_at'
         ]
 
+
+class BulkRegistrationSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=5000)
+    waitlist = serializers.BooleanField(default=True)
+
+
+class CheckInSerializer(serializers.Serializer):
+    codes = serializers.ListField(child=serializers.CharField(max_length=255), allow_empty=False, max_length=5000)
+
+
+class UploadCreateSerializer(serializers.Serializer):
+    document = serializers.PrimaryKeyRelatedField(queryset=Document.objects.all())
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_count = serializers.IntegerField(read_only=True)
+    missing = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'document', 'filename', 'size', 'chunk_size', 'chunk_count',
+            'missing', 'status', 'error', 'created_at', 'updated_at'
+        ]
+    
+    def get_missing(self, obj):
+        return uploads.missing_chunks(obj) if obj.status == 'open' else []
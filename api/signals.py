@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import ChangeLog, TrackedModel
+
+
+@receiver(post_delete)
+def record_delete(sender, instance, **kwargs):
+    """Log deletes of tracked models, cascades included, inside the delete transaction"""
+    if isinstance(instance, TrackedModel):
+        ChangeLog.objects.record_instance(instance, 'deleted')
@@ -0,0 +1,65 @@
+"""
+Delta sync for mobile and kiosk clients.
+
+Saves and deletes of tracked models (api.models.TrackedModel) append
+``ChangeLog`` rows; the row id is a monotonic change sequence.
+``GET /api/sync/<resource>/`` without ``since`` returns the current
+sequence, and ``?since=<next>`` returns the objects changed after it
+(serialized as in the list API) and the ids to drop, together with the
+``next`` value to resume from. Objects that were deleted or are no longer
+listed (e.g. ``is_active=False``) are tombstones.
+"""
+from catalog.models import Book
+from events.models import Event
+from .models import ChangeLog
+from .serializers import BookSerializer, EventSerializer
+
+
+class Resource:
+    def __init__(self, queryset, serializer_class):
+        self.model = queryset.model
+        self.name = self.model.change_resource
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+
+
+RESOURCES = {
+    resource.name: resource for resource in [
+        Resource(
+            Book.objects.filter(is_active=True).select_related('genre', 'publisher').prefetch_related('authors'),
+            BookSerializer,
+        ),
+        Resource(Event.objects.filter(is_published=True, is_cancelled=False), EventSerializer),
+    ]
+}
+
+
+def head():
+    """The latest change sequence"""
+    return ChangeLog.objects.head()
+
+
+def changes(resource, since, limit, context=None):
+    """Objects of ``resource`` changed after sequence ``since``, at most ``limit`` changes"""
+    log = list(
+        ChangeLog.objects.settled().filter(resource=resource.name, pk__gt=since)
+        .order_by('pk').values_list('pk', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(log) > limit
+    log = log[:limit]
+
+    latest = {}
+    for _, object_id, deleted in log:
+        latest[object_id] = deleted
+    upserts = [object_id for object_id, deleted in latest.items() if not deleted]
+    objects = resource.queryset.filter(pk__in=upserts).order_by('pk')
+    data = resource.serializer_class(objects, many=True, context=context).data
+    found = {item['id'] for item in data}
+    return {
+        'since': since,
+        'next': log[-1][0] if log else since,
+        'has_more': has_more,
+        'changes': data,
+        # Tombstones, and changed objects that are no longer listed
+        'deleted': sorted(object_id for object_id in latest if object_id not in found),
+    }
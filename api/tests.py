@@ -1,3 +1,248 @@
+import gzip
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from events.models import Event
+from repository import uploads
+from repository.models import Document
+from unimaid_library.testing import TemporaryMediaMixin
+from . import outbox
+from .exports import accepts_gzip
+from .models import ChangeLog, ConsumerCheckpoint
+
+
+class APITestCase(TemporaryMediaMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patron = User.objects.create_user(username='patron', password='secret', phone_number='0800000000')
+        cls.staff = User.objects.create_user(username='librarian', password='secret', is_staff=True)
+
+    def make_event(self, **fields):
+        start = timezone.now() + timedelta(days=3)
+        fields.setdefault('title', 'Open Access Week')
+        return Event.objects.create(
+            description='Talks', start_date=start, end_date=start + timedelta(hours=1),
+            location='Main Library', is_published=True, **fields
+        )
+
+
+class ExportPermissionTests(APITestCase):
+    url = reverse('user-export')
+
+    def test_member_directory_export_is_staff_only(self):
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+        self.client.force_authenticate(self.patron)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_can_export_members(self):
+        self.client.force_authenticate(self.staff)
+
+        response = self.client.get(self.url, {'as': 'ndjson'})
+
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({row['username'] for row in rows}, {'patron', 'librarian'})
+
+    def test_member_list_stays_open_to_patrons(self):
+        self.client.force_authenticate(self.patron)
+        self.assertEqual(self.client.get(reverse('user-list')).status_code, 200)
+
+    def test_document_export_only_includes_accessible_documents(self):
+        for level in ('open', 'private'):
+            Document.objects.create(
+                title=f'{level} report', document_type='project', author='B. Musa', is_approved=True,
+                access_level=level, file=ContentFile(level.encode(), name='report.pdf'),
+            )
+
+        response = self.client.get(reverse('document-export'), {'as': 'csv'})
+
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('open report', body)
+        self.assertNotIn('private report', body)
+
+    def test_gzip_follows_accept_encoding(self):
+        self.client.force_authenticate(self.staff)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'librarian', gzip.decompress(b''.join(response.streaming_content)))
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, deflate')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip('gzip'))
+        self.assertTrue(accepts_gzip('br;q=1.0, gzip;q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('*;q=0'))
+        self.assertFalse(accepts_gzip(''))
+
+
+class UploadAPITests(APITestCase):
+    def setUp(self):
+        document = Document.objects.create(
+            title='Dataset', document_type='dataset', author='C. Ali', submitted_by=self.patron,
+            file=ContentFile(b'placeholder', name='data.csv'),
+        )
+        self.session = uploads.open_session(self.patron, document, 'data.csv', 16)
+        self.url = reverse('upload-chunk', kwargs={'pk': self.session.pk, 'index': 0})
+        self.client.force_authenticate(self.patron)
+
+    def put(self, data, **headers):
+        headers.setdefault('HTTP_UPLOAD_CHECKSUM', f'sha256 {hashlib.sha256(data).hexdigest()}')
+        return self.client.generic('PUT', self.url, data, content_type='application/octet-stream', **headers)
+
+    def test_chunk_is_accepted(self):
+        self.assertEqual(self.put(b'0123456789abcdef').status_code, 204)
+        self.assertEqual(uploads.missing_chunks(self.session), [])
+
+    def test_checksum_header_is_required(self):
+        self.assertEqual(self.put(b'0123456789abcdef', HTTP_UPLOAD_CHECKSUM='').status_code, 400)
+
+    def test_invalid_content_length_is_a_bad_request(self):
+        self.assertEqual(self.put(b'0123456789abcdef', CONTENT_LENGTH='sixteen').status_code, 400)
+
+    def test_checksum_mismatch_is_unprocessable(self):
+        response = self.put(b'0123456789abcdef', HTTP_UPLOAD_CHECKSUM=f'sha256 {"0" * 64}')
+        self.assertEqual(response.status_code, 422)
+
+    def test_other_users_cannot_write_to_a_session(self):
+        self.client.force_authenticate(User.objects.create_user(username='intruder', password='secret'))
+        self.assertEqual(self.put(b'0123456789abcdef').status_code, 404)
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.patron)
+
+    def sync(self, since=None):
+        params = {} if since is None else {'since': since}
+        with self.settings(CHANGE_LOG_SETTLE_SECONDS=0):
+            return self.client.get(reverse('sync', kwargs={'resource': 'events'}), params).json()
+
+    def test_changes_and_tombstones_since_checkpoint(self):
+        kept = self.make_event()
+        hidden = self.make_event(title='Staff Retreat')
+        since = self.sync()['next']
+        self.assertEqual(since, ChangeLog.objects.latest('pk').pk)
+
+        kept.title = 'Open Access Week 2026'
+        kept.save()
+        hidden.is_published = False
+        hidden.save()
+        created = self.make_event(title='Thesis Bootcamp')
+
+        page = self.sync(since)
+        self.assertEqual({item['id'] for item in page['changes']}, {kept.pk, created.pk})
+        self.assertEqual(page['deleted'], [hidden.pk])
+        self.assertEqual(self.sync(page['next'])['changes'], [])
+
+    def test_unsettled_changes_are_held_back(self):
+        since = self.sync()['next']
+        self.make_event()
+
+        response = self.client.get(reverse('sync', kwargs={'resource': 'events'}), {'since': since})
+
+        self.assertEqual(response.json()['next'], since)
+
+
+class RecordingConsumer(outbox.Consumer):
+    name = 'test-recorder'
+    resources = ('events',)
+
+    def __init__(self):
+        self.seen = []
+
+    def handle(self, changes):
+        self.seen.extend(change.pk for change in changes)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.consumer = RecordingConsumer()
+
+    def log(self, count, resource='events'):
+        return [ChangeLog.objects.create(resource=resource, object_id=1).pk for _ in range(count)]
+
+    def checkpoint(self):
+        return ConsumerCheckpoint.objects.get(name=self.consumer.name)
+
+    def test_consumer_without_handle_is_rejected(self):
+        class Incomplete(outbox.Consumer):
+            name = 'test-incomplete'
+
+        with self.assertRaises(ImproperlyConfigured):
+            outbox.register(Incomplete)
+        with self.assertRaises(ImproperlyConfigured):
+            outbox.run(Incomplete())
+        self.assertNotIn('test-incomplete', outbox.consumers())
+
+    def test_each_change_is_handled_once(self):
+        ids = self.log(3)
+        self.log(1, resource='books')
+
+        self.assertEqual(outbox.run(self.consumer), 3)
+        self.assertEqual(outbox.run(self.consumer), 0)
+        self.assertEqual(self.consumer.seen, ids)
+        self.assertEqual(self.checkpoint().position, ChangeLog.objects.latest('pk').pk)
+
+    def test_skipped_id_is_handled_when_it_commits(self):
+        first, pending, last = self.log(3)
+        ChangeLog.objects.filter(pk=pending).delete()
+
+        outbox.run(self.consumer)
+        self.assertEqual(self.consumer.seen, [first, last])
+        self.assertEqual(list(self.checkpoint().gaps), [str(pending)])
+
+        ChangeLog.objects.create(pk=pending, resource='events', object_id=1)
+        outbox.run(self.consumer)
+
+        self.assertEqual(self.consumer.seen, [first, last, pending])
+        self.assertEqual(self.checkpoint().gaps, {})
+
+    def test_gap_is_dropped_after_timeout(self):
+        _, pending, _ = self.log(3)
+        ChangeLog.objects.filter(pk=pending).delete()
+        outbox.run(self.consumer)
+
+        with self.settings(OUTBOX_GAP_TIMEOUT=-1), self.assertLogs('api.outbox', 'WARNING'):
+            outbox.run(self.consumer)
+
+        self.assertEqual(self.checkpoint().gaps, {})
+
+    def test_old_holes_are_not_gaps(self):
+        _, compacted, _ = self.log(3)
+        ChangeLog.objects.filter(pk=compacted).delete()
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        outbox.run(self.consumer)
+
+        self.assertEqual(self.checkpoint().gaps, {})
+
+    def test_batches_resume_from_checkpoint(self):
+        self.consumer.batch_size = 2
+        ids = self.log(5)
+
+        self.assertEqual(outbox.run(self.consumer, max_batches=1), 2)
+        self.assertEqual(self.checkpoint().position, ids[1])
+        self.assertEqual(outbox.run(self.consumer), 3)
+        self.assertEqual(self.consumer.seen, ids)
+
+    def test_compaction_keeps_latest_change_and_unread_rows(self):
+        ids = self.log(4)
+
+        self.assertEqual(ChangeLog.objects.compact(before=ids[1]), 2)
 
-# Create your tests here.
+        self.assertEqual(list(ChangeLog.objects.values_list('pk', flat=True)), ids[2:])
@@ -7,10 +7,12 @@ router.register(r'books', views.BookViewSet, basename='book')
 router.register(r'loans', views.LoanViewSet, basename='loan')
 router.register(r'users', views.UserViewSet, basename='user')
 router.register(r'documents', views.DocumentViewSet, basename='document')
+router.register(r'uploads', views.UploadViewSet, basename='upload')
 router.register(r'events', views.EventViewSet, basename='event')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('sync/<str:resource>/', views.SyncView.as_view(), name='sync'),
     path('auth/', include('rest_framework.urls')),
 ]
 
@@ -1,16 +1,28 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import mixins, viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.utils import timezone
 from catalog.models import Book
 from circulation.models import Loan
 from accounts.models import User
-from repository.models import Document
-from events.models import Event
-from .serializers import BookSerializer, LoanSerializer, UserSerializer, DocumentSerializer, EventSerializer
+from repository import uploads
+from repository.models import Document, UploadSession
+from events.models import Event, EventRegistration
+from . import sync
+from .exports import ExportMixin
+from .serializers import (
+    BookSerializer, LoanSerializer, UserSerializer, DocumentSerializer, EventSerializer,
+    BulkRegistrationSerializer, CheckInSerializer, UploadCreateSerializer, UploadSessionSerializer,
+)
 
 
-class BookViewSet(viewsets.ReadOnlyModelViewSet):
+class BookViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Book.objects.filter(is_active=True)
     serializer_class = BookSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -18,15 +30,31 @@ class BookViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['title', 'isbn', 'authors__first_name', 'authors__last_name', 'description']
     ordering_fields = ['title', 'created_at', 'publication_date']
     ordering = ['-created_at']
+    export_fields = {
+        'id': 'id', 'title': 'title', 'subtitle': 'subtitle', 'isbn': 'isbn', 'isbn13': 'isbn13',
+        'publisher': 'publisher__name', 'genre': 'genre__name', 'publication_date': 'publication_date',
+        'edition': 'edition', 'language': 'language', 'pages': 'pages', 'description': 'description',
+        'total_copies': 'total_copies', 'available_copies': 'available_copies', 'location': 'location',
+        'call_number': 'call_number', 'is_featured': 'is_featured', 'created_at': 'created_at',
+    }
+    export_many = {
+        'authors': ('authors', Concat('authors__first_name', Value(' '), 'authors__last_name')),
+    }
 
 
-class LoanViewSet(viewsets.ModelViewSet):
+class LoanViewSet(ExportMixin, viewsets.ModelViewSet):
     serializer_class = LoanSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'user']
     ordering_fields = ['checkout_date', 'due_date']
     ordering = ['-checkout_date']
+    export_fields = {
+        'id': 'id', 'user': 'user', 'user_username': 'user__username', 'book': 'book',
+        'book_title': 'book__title', 'copy': 'copy', 'checkout_date': 'checkout_date',
+        'due_date': 'due_date', 'return_date': 'return_date', 'status': 'status',
+        'renewed_count': 'renewed_count', 'max_renewals': 'max_renewals', 'created_at': 'created_at',
+    }
     
     def get_queryset(self):
         if self.request.user.is_staff:
@@ -37,16 +65,23 @@ class LoanViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['membership_type']
     search_fields = ['username', 'email', 'first_name', 'last_name']
+    # The member directory (emails, phone numbers) is exported by staff only.
+    export_permission_classes = [permissions.IsAdminUser]
+    export_fields = {
+        'id': 'id', 'username': 'username', 'email': 'email', 'first_name': 'first_name',
+        'last_name': 'last_name', 'membership_type': 'membership_type', 'phone_number': 'phone_number',
+        'is_active': 'is_active', 'date_joined': 'date_joined',
+    }
 
 
-class DocumentViewSet(viewsets.ReadOnlyModelViewSet):
+class DocumentViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Document.objects.filter(is_active=True, is_approved=True)
     serializer_class = DocumentSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -54,6 +89,83 @@ class DocumentViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['title', 'author', 'abstract', 'keywords']
     ordering_fields = ['submission_date', 'title']
     ordering = ['-submission_date']
+    export_fields = {
+        'id': 'id', 'title': 'title', 'subtitle': 'subtitle', 'document_type': 'document_type',
+        'collection': 'collection', 'collection_name': 'collection__name', 'author': 'author',
+        'department': 'department', 'faculty': 'faculty', 'publication_date': 'publication_date',
+        'year': 'year', 'abstract': 'abstract', 'keywords': 'keywords', 'access_level': 'access_level',
+        'download_count': 'download_count', 'view_count': 'view_count',
+        'submission_date': 'submission_date', 'is_featured': 'is_featured',
+    }
+    
+    def get_queryset(self):
+        return super().get_queryset().accessible_to(self.request.user)
+
+
+class UploadViewSet(mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Resumable chunked uploads of document files (see repository.uploads).
+
+    POST opens a session, ``PUT chunks/<index>/`` sends one chunk as the raw
+    body with an ``Upload-Checksum: sha256 <hex>`` header, GET lists the
+    chunks still missing and ``POST complete/`` assembles the file.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = []
+    
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return UploadSession.objects.all()
+        return UploadSession.objects.filter(user=self.request.user)
+    
+    def create(self, request):
+        serializer = UploadCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        document = data['document']
+        if not (request.user.is_staff or document.submitted_by_id == request.user.pk):
+            raise PermissionDenied('You cannot upload files for this document.')
+        try:
+            session = uploads.open_session(request.user, document, data['filename'], data['size'], data.get('sha256', ''))
+        except uploads.UploadError as e:
+            return Response({'detail': str(e)}, status=e.status)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        """Write one chunk, streamed from the request body"""
+        session = self.get_object()
+        algorithm, _, checksum = request.headers.get('Upload-Checksum', '').partition(' ')
+        if algorithm.lower() != 'sha256' or not checksum:
+            return Response({'detail': 'Upload-Checksum: sha256 <hex> header required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'detail': 'Invalid Content-Length header.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read the raw stream; request.data would spool the chunk first.
+            uploads.write_chunk(session, int(index), request._request, length, checksum.strip())
+        except uploads.UploadError as e:
+            return Response({'detail': str(e)}, status=e.status)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Assemble the upload in the background once every chunk has arrived"""
+        try:
+            session = uploads.complete(self.get_object())
+        except uploads.UploadError as e:
+            return Response({'detail': str(e)}, status=e.status)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_202_ACCEPTED)
+    
+    def perform_destroy(self, instance):
+        uploads.abort(instance)
+    
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except uploads.UploadError as e:
+            return Response({'detail': str(e)}, status=e.status)
 
 
 class EventViewSet(viewsets.ReadOnlyModelViewSet):
@@ -64,3 +176,60 @@ class EventViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['title', 'description']
     ordering_fields = ['start_date', 'title']
     ordering = ['start_date']
+    
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_register(self, request, pk=None):
+        """Register a list of user ids in one transaction; overflow is waitlisted"""
+        event = self.get_object()
+        serializer = BulkRegistrationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        confirmed, waitlisted, skipped = event.bulk_register(
+            serializer.validated_data['users'], waitlist=serializer.validated_data['waitlist']
+        )
+        return Response({
+            'confirmed': confirmed,
+            'waitlisted': waitlisted,
+            'skipped': skipped,
+            'registration_count': event.registration_count,
+        })
+    
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def check_in(self, request, pk=None):
+        """Mark attendance for a batch of scanned membership QR codes"""
+        event = self.get_object()
+        serializer = CheckInSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        codes = set(serializer.validated_data['codes'])
+        
+        # One UPDATE for the whole batch; scanners can queue codes and post
+        # them every few seconds instead of saving each registration.
+        registrations = EventRegistration.objects.filter(
+            event=event, is_confirmed=True, user__qr_code_data__in=codes
+        )
+        checked_in = registrations.filter(is_attended=False).update(
+            is_attended=True, attendance_date=timezone.now(), updated_at=timezone.now()
+        )
+        registered = set(registrations.values_list('user__qr_code_data', flat=True))
+        return Response({
+            'checked_in': checked_in,
+            'already_checked_in': len(registered) - checked_in,
+            'not_registered': sorted(codes - registered),
+        })
+
+
+class SyncView(APIView):
+    """Delta sync: ``GET /api/sync/<resource>/?since=<next>`` (see api.sync)"""
+    
+    def get(self, request, resource):
+        if resource not in sync.RESOURCES:
+            raise NotFound(f'Unknown resource; choose one of: {", ".join(sync.RESOURCES)}.')
+        if 'since' not in request.query_params:
+            # Starting point for a client that has just downloaded the full list
+            return Response({'next': sync.head()})
+        try:
+            since = int(request.query_params['since'])
+            limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError('since and limit must be integers.')
+        limit = max(1, min(limit, settings.SYNC_PAGE_SIZE))
+        return Response(sync.changes(sync.RESOURCES[resource], since, limit, {'request': request}))
@@ -0,0 +1,80 @@
+"""
+Threaded comment loading for blog posts.
+
+All approved comments of a post are read with one query and linked into a
+tree in memory. The rendered tree is cached per post and dropped whenever
+one of its comments is saved or deleted (see blog.signals).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Comment
+
+
+class CommentNode:
+    """One comment in the tree; slots keep large threads compact"""
+    __slots__ = ('pk', 'author_name', 'content', 'created_at', 'children')
+
+    def __init__(self, pk, author_name, content, created_at):
+        self.pk = pk
+        self.author_name = author_name
+        self.content = content
+        self.created_at = created_at
+        self.children = []
+
+
+def build_comment_tree(post_id):
+    """Return (top-level nodes, number of visible comments) for a post.
+
+    Top-level comments are newest first and replies oldest first. Replies to
+    a comment that is not approved are hidden along with it.
+    """
+    rows = Comment.objects.filter(post_id=post_id, is_approved=True).order_by('created_at', 'pk').values_list(
+        'pk', 'parent_id', 'content', 'created_at',
+        'author__username', 'author__first_name', 'author__last_name'
+    )
+    nodes = {}
+    parents = []
+    for pk, parent_id, content, created_at, username, first_name, last_name in rows:
+        full_name = f'{first_name} {last_name}'.strip()
+        nodes[pk] = CommentNode(pk, full_name or username, content, created_at)
+        parents.append((pk, parent_id))
+
+    roots = []
+    for pk, parent_id in parents:
+        if parent_id is None:
+            roots.append(nodes[pk])
+        elif parent_id in nodes:
+            nodes[parent_id].children.append(nodes[pk])
+    roots.reverse()
+
+    # Count only comments reachable from a visible root.
+    count, stack = 0, list(roots)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return roots, count
+
+
+def cache_key(post_id):
+    return f'blog:comment-tree:{post_id}'
+
+
+def rendered_comment_tree(post_id):
+    """Return {'html', 'count'} for a post's comments, from cache when possible"""
+    key = cache_key(post_id)
+    tree = cache.get(key)
+    if tree is None:
+        roots, count = build_comment_tree(post_id)
+        tree = {
+            'html': render_to_string('blog/comment_tree.html', {'comments': roots}),
+            'count': count,
+        }
+        cache.set(key, tree, settings.BLOG_COMMENT_TREE_TIMEOUT)
+    return tree
+
+
+def invalidate_comment_tree(post_id):
+    cache.delete(cache_key(post_id))
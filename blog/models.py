@@ -3,6 +3,7 @@ from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 from accounts.models import User
+from api.models import TrackedModel
 
 
 class Category(models.Model):
@@ -43,8 +44,18 @@ class Tag(models.Model):
         return reverse('blog:tag_detail', kwargs={'slug': self.slug})
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def listing(self):
+        """Published posts with everything a listing card shows loaded up front"""
+        # Meta.ordering is not applied to aggregated queries, so order explicitly.
+        return self.filter(is_published=True).select_related('category').prefetch_related('tags').annotate(
+            approved_comment_count=models.Count('comments', filter=models.Q(comments__is_approved=True))
+        ).order_by('-published_date', '-created_at')
+
+
+class Post(TrackedModel):
     """Blog/news post"""
+    change_resource = 'posts'
     title = models.CharField(max_length=500)
     slug = models.SlugField(max_length=500, unique=True, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
@@ -60,6 +71,8 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PostQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Post"
         verbose_name_plural = "Posts"
@@ -72,6 +85,9 @@ class Post(models.Model):
     def __str__(self):
         return self.title
     
+    def is_listed(self):
+        return self.is_published
+    
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
@@ -84,8 +100,10 @@ class Post(models.Model):
     
     def increment_view_count(self):
         """Increment view count"""
+        # A single UPDATE: no lost increments under concurrent views, and no
+        # post_save, which would otherwise drop the cached blog sidebar.
+        Post.objects.filter(pk=self.pk).update(view_count=models.F('view_count') + 1)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
 
 
 class Comment(models.Model):
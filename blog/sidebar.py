@@ -0,0 +1,30 @@
+"""
+The blog sidebar (featured posts, categories, recent posts) is cached as one
+unit and rebuilt after any post or category change (see blog.signals).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Category, Post
+
+CACHE_KEY = 'blog:sidebar'
+
+
+def _build_sidebar():
+    return {
+        'featured_posts': list(Post.objects.listing().filter(is_featured=True)[:3]),
+        'categories': list(Category.objects.filter(is_active=True).annotate(
+            post_count=Count('post', filter=Q(post__is_published=True))
+        )),
+        'recent_posts': list(Post.objects.listing()[:5]),
+    }
+
+
+def get_sidebar():
+    """Return the sidebar context, from cache when possible"""
+    return cache.get_or_set(CACHE_KEY, _build_sidebar, settings.BLOG_SIDEBAR_TIMEOUT)
+
+
+def invalidate_sidebar():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .comments import invalidate_comment_tree
+from .models import Category, Comment, Post
+from .sidebar import invalidate_sidebar
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """Drop the cached comment tree of the comment's post"""
+    invalidate_comment_tree(instance.post_id)
+    # Posts in the sidebar carry their comment counts.
+    invalidate_sidebar()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def post_changed(sender, instance, **kwargs):
+    """Rebuild the sidebar once a post is published, edited or removed"""
+    invalidate_sidebar()
@@ -1,7 +1,11 @@
 from django.views.generic import ListView, DetailView
 from django.shortcuts import get_object_or_404
-from .models import Post, Category, Tag, Comment
-from analytics.models import UserActivity
+from .models import Post, Category, Tag
+from .comments import rendered_comment_tree
+from .sidebar import get_sidebar
+from analytics.models import RelatedItems, UserActivity
+from unimaid_library.concurrency import fire_and_forget
+from unimaid_library.generic import ObjectDetailView
 
 
 class PostListView(ListView):
@@ -11,17 +15,15 @@ class PostListView(ListView):
     paginate_by = 10
     
     def get_queryset(self):
-        return Post.objects.filter(is_published=True).order_by('-published_date')
+        return Post.objects.listing().order_by('-published_date')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['featured_posts'] = Post.objects.filter(is_published=True, is_featured=True)[:3]
-        context['categories'] = Category.objects.filter(is_active=True)
-        context['recent_posts'] = Post.objects.filter(is_published=True)[:5]
+        context.update(get_sidebar())
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(ObjectDetailView):
     model = Post
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
@@ -29,35 +31,38 @@ class PostDetailView(DetailView):
     slug_url_kwarg = 'slug'
     
     def get_queryset(self):
-        return Post.objects.filter(is_published=True)
+        return Post.objects.filter(is_published=True).select_related('author', 'category')
     
-    def get(self, request, *args, **kwargs):
-        response = super().get(request, *args, **kwargs)
-        post = self.get_object()
+    def after_response(self):
+        post = self.object
+        request = self.request
         
         # Increment view count
-        post.increment_view_count()
+        fire_and_forget(post.increment_view_count)
         
         # Log activity
         if request.user.is_authenticated:
-            UserActivity.objects.create(
+            fire_and_forget(
+                UserActivity.objects.create,
                 user=request.user,
                 action_type='view_book',
-                description=f'Viewed blog post: {post.title}',
+                description=f'Viewed blog post: {post.title}'[:500],
                 ip_address=request.META.get('REMOTE_ADDR'),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
+                user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
             )
-        
-        return response
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = self.get_object()
-        context['comments'] = Comment.objects.filter(post=post, is_approved=True, parent=None).order_by('-created_at')
-        context['related_posts'] = Post.objects.filter(
-            category=post.category,
-            is_published=True
-        ).exclude(pk=post.pk)[:3]
+        post = self.object
+        context['comment_tree'] = rendered_comment_tree(post.pk)
+        context.update(get_sidebar())
+        related = RelatedItems.related_to('post', post.pk, Post.objects.filter(is_published=True), limit=3)
+        if related is None:
+            related = Post.objects.filter(
+                category=post.category,
+                is_published=True
+            ).exclude(pk=post.pk)[:3]
+        context['related_posts'] = related
         return context
 
 
@@ -68,9 +73,8 @@ class CategoryDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['posts'] = Post.objects.filter(
-            category=self.object,
-            is_published=True
+        context['posts'] = Post.objects.listing().filter(
+            category=self.object
         ).order_by('-published_date')
         return context
 
@@ -82,5 +86,5 @@ class TagDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['posts'] = self.object.posts.filter(is_published=True).order_by('-published_date')
+        context['posts'] = Post.objects.listing().filter(tags=self.object).order_by('-published_date')
         return context
@@ -0,0 +1,12 @@
+from api.outbox import Consumer, register
+from .views import BOOK_FACETS
+
+
+@register
+class BookFacetsConsumer(Consumer):
+    """Drops the cached book facet counts after books change"""
+    name = 'catalog.book_facets'
+    resources = ('books',)
+
+    def handle(self, changes):
+        BOOK_FACETS.invalidate()
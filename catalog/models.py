@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.utils import timezone
 from accounts.models import User
+from api.models import TrackedModel
 
 
 class Genre(models.Model):
@@ -69,8 +70,9 @@ class Author(models.Model):
         return reverse('catalog:author_detail', kwargs={'pk': self.pk})
 
 
-class Book(models.Model):
+class Book(TrackedModel):
     """Main book/resource model"""
+    change_resource = 'books'
     title = models.CharField(max_length=500)
     subtitle = models.CharField(max_length=500, blank=True)
     isbn = models.CharField(max_length=20, unique=True, blank=True, null=True)
@@ -108,6 +110,9 @@ class Book(models.Model):
     def __str__(self):
         return self.title
     
+    def is_listed(self):
+        return self.is_active
+    
     def get_absolute_url(self):
         return reverse('catalog:book_detail', kwargs={'pk': self.pk})
     
@@ -121,8 +126,9 @@ class Book(models.Model):
         return self.available_copies > 0
 
 
-class Copy(models.Model):
+class Copy(TrackedModel):
     """Individual copy of a book"""
+    change_resource = 'copies'
     STATUS_CHOICES = [
         ('available', 'Available'),
         ('on_loan', 'On Loan'),
@@ -151,6 +157,7 @@ class Copy(models.Model):
     def __str__(self):
         return f"{self.book.title} - Copy {self.barcode}"
     
+    @transaction.atomic
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
         self.book.update_available_copies()
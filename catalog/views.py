@@ -1,16 +1,37 @@
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import ExtractYear
 from .models import Book, Genre, Author
+from analytics import recently_viewed
+from analytics.models import RelatedItems
+from analytics.suggestions import log_search
+from unimaid_library.concurrency import AsyncListView
+from unimaid_library.facets import Facet, FacetSet
+from unimaid_library.generic import ObjectDetailView
 
 
-class BookListView(ListView):
-    model = Book
+BOOK_FACETS = FacetSet('books', [
+    Facet('genre', 'Genre', 'genre__slug', label_field='genre__name'),
+    Facet('publisher', 'Publisher', 'publisher_id', label_field='publisher__name', cast=int),
+    Facet('language', 'Language', 'language'),
+    Facet(
+        'availability', 'Availability', 'availability',
+        expression=Case(When(available_copies__gt=0, then=Value('available')), default=Value('on_loan')),
+        choices=[('available', 'Available now'), ('on_loan', 'All copies on loan')],
+    ),
+    Facet('year', 'Publication Year', 'publication_year', expression=ExtractYear('publication_date'), cast=int, order='-value'),
+])
+
+
+class BookListMixin:
+    """Queries shared by BookListView and AsyncBookListView"""
     template_name = 'catalog/book_list.html'
     context_object_name = 'books'
     paginate_by = 20
     
-    def get_queryset(self):
-        queryset = Book.objects.filter(is_active=True).select_related('publisher', 'genre').prefetch_related('authors')
+    def get_base_queryset(self):
+        """Active books matching the search, before facet filters"""
+        queryset = Book.objects.filter(is_active=True)
         
         # Search functionality
         search_query = self.request.GET.get('q')
@@ -22,21 +43,28 @@ class BookListView(ListView):
                 Q(authors__last_name__icontains=search_query) |
                 Q(description__icontains=search_query)
             ).distinct()
-        
-        # Filter by genre
-        genre_slug = self.request.GET.get('genre')
-        if genre_slug:
-            queryset = queryset.filter(genre__slug=genre_slug)
-        
-        return queryset.order_by('-created_at')
+        return queryset
+    
+    def get_queryset(self):
+        queryset = BOOK_FACETS.apply(self.get_base_queryset(), BOOK_FACETS.selected(self.request.GET))
+        return queryset.select_related('publisher', 'genre').prefetch_related('authors').order_by('-created_at')
+    
+    def get_facets(self):
+        return BOOK_FACETS.counts(
+            self.get_base_queryset(), self.request.GET, unfiltered=not self.request.GET.get('q')
+        )
+
+
+class BookListView(BookListMixin, ListView):
+    model = Book
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['genres'] = Genre.objects.all()
+        context['facets'] = self.get_facets()
         return context
 
 
-class BookDetailView(DetailView):
+class BookDetailView(ObjectDetailView):
     model = Book
     template_name = 'catalog/book_detail.html'
     context_object_name = 'book'
@@ -47,7 +75,15 @@ class BookDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['available_copies'] = self.object.copies.filter(status='available')
+        related = RelatedItems.related_to('book', self.object.pk, Book.objects.filter(is_active=True))
+        if related is None and self.object.genre_id:
+            # Not indexed yet (see build_similarity_index); same genre will do.
+            related = Book.objects.filter(genre_id=self.object.genre_id, is_active=True).exclude(pk=self.object.pk)[:5]
+        context['related_books'] = related or []
         return context
+    
+    def after_response(self):
+        recently_viewed.record_view(self.request, 'book', self.object)
 
 
 class GenreDetailView(DetailView):
@@ -72,8 +108,8 @@ class AuthorDetailView(DetailView):
         return context
 
 
-class BookSearchView(ListView):
-    model = Book
+class BookSearchMixin:
+    """Queries and search logging shared by BookSearchView and AsyncBookSearchView"""
     template_name = 'catalog/book_search.html'
     context_object_name = 'books'
     paginate_by = 20
@@ -87,10 +123,36 @@ class BookSearchView(ListView):
                 Q(authors__first_name__icontains=query) |
                 Q(authors__last_name__icontains=query) |
                 Q(description__icontains=query)
-            ).distinct().filter(is_active=True)
+            ).distinct().filter(is_active=True).prefetch_related('authors')
         return Book.objects.none()
     
+    def log_search(self, context):
+        log_search(self.request, 'catalog', context['query'], context['paginator'].count)
+
+
+class BookSearchView(BookSearchMixin, ListView):
+    model = Book
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = self.request.GET.get('q', '')
+        self.log_search(context)
         return context
+
+
+class AsyncBookListView(BookListMixin, AsyncListView):
+    """BookListView for ASGI deployments; the page, count and facet counts load concurrently"""
+    
+    def get_extra_queries(self):
+        return {'facets': self.get_facets}
+
+
+class AsyncBookSearchView(BookSearchMixin, AsyncListView):
+    """BookSearchView for ASGI deployments"""
+    
+    def get_context_data(self, **context):
+        context['query'] = self.request.GET.get('q', '')
+        return context
+    
+    def after_response(self, context):
+        self.log_search(context)
@@ -1,12 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta
 from accounts.models import User
+from api.models import TrackedModel
 from catalog.models import Book, Copy
 
 
-class Loan(models.Model):
+class Loan(TrackedModel):
     """Book loan/borrowing record"""
+    change_resource = 'loans'
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('returned', 'Returned'),
@@ -74,6 +76,7 @@ class Loan(models.Model):
             return True
         return False
     
+    @transaction.atomic
     def return_book(self, returned_by=None):
         """Mark loan as returned"""
         self.status = 'returned'
@@ -127,6 +130,7 @@ class Reservation(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.book.title} (Position: {self.queue_position})"
     
+    @transaction.atomic
     def update_queue_position(self):
         """Update queue position based on other pending reservations"""
         pending = Reservation.objects.filter(
@@ -136,6 +140,7 @@ class Reservation(models.Model):
         self.queue_position = pending.count() + 1
         self.save(update_fields=['queue_position'])
     
+    @transaction.atomic
     def fulfill(self):
         """Mark reservation as fulfilled"""
         self.status = 'fulfilled'
@@ -0,0 +1,286 @@
+"""
+"Patrons also borrowed" recommendations from circulation history.
+
+``build()`` streams Loan rows ordered by patron and turns every patron's set
+of borrowed books into book-book co-occurrence counts. The counts, each
+patron's borrowing history and a precomputed top-N list per patron are
+written as NumPy arrays to a new generation directory under
+``RECOMMENDATIONS_DIR``; the ``CURRENT`` file is then switched to it
+atomically. Web processes memory-map the current generation read-only, so
+a dashboard needs one binary search in ``user_ids`` and one slice of
+``rec_books`` to find a patron's suggestions.
+
+Later builds are incremental: only loans with a higher id than the last
+checkpoint are read, their pairs are merged into the stored counts, and
+suggestions are recomputed only for patrons whose books were affected.
+Other patrons' scores can drift slightly as popularity changes; a periodic
+``--full`` build brings them back in line.
+"""
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+TOP_N = 20
+CHUNK_SIZE = 5000
+# Number of pending pair codes collected before they are merged.
+PAIR_BUFFER = 2_000_000
+
+ARRAYS = (
+    'book_ids', 'popularity',
+    'cooc_indptr', 'cooc_indices', 'cooc_data',
+    'user_ids', 'hist_indptr', 'hist_books',
+    'rec_indptr', 'rec_books',
+)
+
+_lock = threading.Lock()
+_loaded = None
+
+
+def _root():
+    return Path(settings.RECOMMENDATIONS_DIR)
+
+
+def _load_array(path, mmap_mode):
+    try:
+        return np.load(path, mmap_mode=mmap_mode)
+    except ValueError:
+        # Empty arrays cannot be memory-mapped.
+        return np.load(path)
+
+
+class RecommendationIndex:
+    """One generation of the on-disk index"""
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        for name in ARRAYS:
+            setattr(self, name, _load_array(path / f'{name}.npy', mmap_mode))
+        self.state = json.loads((path / 'state.json').read_text())
+
+    def for_user(self, user_id, limit=TOP_N):
+        """Recommended book ids for a patron, best first"""
+        position = int(np.searchsorted(self.user_ids, user_id))
+        if position == len(self.user_ids) or self.user_ids[position] != user_id:
+            return []
+        start, end = self.rec_indptr[position], self.rec_indptr[position + 1]
+        return self.rec_books[start:min(end, start + limit)].tolist()
+
+
+def current_index():
+    """The current generation, memory-mapped once per process, or None"""
+    global _loaded
+    try:
+        name = (_root() / 'CURRENT').read_text().strip()
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if _loaded is None or _loaded.path.name != name:
+            _loaded = RecommendationIndex(_root() / name)
+        return _loaded
+
+
+def recommended_books(user, limit=5):
+    """Active books recommended for ``user``, in order of relevance"""
+    from catalog.models import Book
+
+    index = current_index()
+    if index is None:
+        return []
+    # Over-fetch a little to make up for books withdrawn since the build.
+    ids = index.for_user(user.pk, limit * 2)
+    books = Book.objects.filter(is_active=True).in_bulk(ids)
+    return [books[pk] for pk in ids if pk in books][:limit]
+
+
+class _CodeCounter:
+    """Counts int64 codes, merging pending batches with np.unique"""
+
+    def __init__(self, codes=None, counts=None):
+        self.codes = np.empty(0, np.int64) if codes is None else codes
+        self.counts = np.empty(0, np.float64) if counts is None else counts
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, codes):
+        self.pending.append(codes)
+        self.pending_size += len(codes)
+        if self.pending_size >= PAIR_BUFFER:
+            self._merge()
+
+    def _merge(self):
+        if not self.pending:
+            return
+        codes = np.concatenate([self.codes] + self.pending)
+        counts = np.concatenate([self.counts, np.ones(self.pending_size)])
+        self.codes, inverse = np.unique(codes, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts)
+        self.pending, self.pending_size = [], 0
+
+    def result(self):
+        """Sorted unique codes and their counts"""
+        self._merge()
+        return self.codes, self.counts
+
+
+def _indptr(rows, size):
+    return np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=size)))).astype(np.int64)
+
+
+def _score(books, cooc_indptr, cooc_indices, cooc_data, popularity, top_n):
+    """Top books co-borrowed with ``books`` (indices), excluding them"""
+    starts = cooc_indptr[books]
+    lengths = cooc_indptr[books + 1] - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    postings = np.repeat(starts, lengths) + offsets
+    columns = cooc_indices[postings]
+    # Cosine-normalised counts, so bestsellers do not crowd out everything else.
+    weights = cooc_data[postings] / np.sqrt(np.repeat(popularity[books], lengths) * popularity[columns])
+    scores = np.bincount(columns, weights=weights, minlength=len(popularity))
+    scores[books] = 0
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > top_n:
+        candidates = candidates[np.argpartition(-scores[candidates], top_n - 1)[:top_n]]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def build(full=False, top_n=TOP_N):
+    """Build a new generation from loans since the last one (or all loans).
+
+    Returns the new generation's state, or None when there were no new loans.
+    """
+    from circulation.models import Loan
+
+    previous = None if full else current_index()
+    last_loan_id = previous.state['last_loan_id'] if previous else 0
+    max_loan_id = Loan.objects.filter(pk__gt=last_loan_id).aggregate(last=Max('pk'))['last']
+    if max_loan_id is None:
+        return None
+    loans = Loan.objects.filter(pk__gt=last_loan_id, pk__lte=max_loan_id)
+
+    # Id spaces: every book and patron seen so far, sorted.
+    book_ids = np.union1d(
+        previous.book_ids if previous else np.empty(0, np.int64),
+        np.fromiter(loans.values_list('book_id', flat=True).distinct().order_by(), np.int64),
+    )
+    user_ids = np.union1d(
+        previous.user_ids if previous else np.empty(0, np.int64),
+        np.fromiter(loans.values_list('user_id', flat=True).distinct().order_by(), np.int64),
+    )
+    n_books, n_users = len(book_ids), len(user_ids)
+
+    # Carry the previous generation over into the new id spaces. Both maps
+    # are monotonic, so sorted codes stay sorted.
+    if previous:
+        book_map = np.searchsorted(book_ids, previous.book_ids)
+        user_map = np.searchsorted(user_ids, previous.user_ids)
+        rows = np.repeat(np.arange(len(previous.book_ids)), np.diff(previous.cooc_indptr))
+        cooc = _CodeCounter(
+            book_map[rows] * n_books + book_map[previous.cooc_indices],
+            np.asarray(previous.cooc_data, dtype=np.float64),
+        )
+        rows = np.repeat(np.arange(len(previous.user_ids)), np.diff(previous.hist_indptr))
+        history = user_map[rows] * n_books + book_map[previous.hist_books]
+    else:
+        cooc = _CodeCounter()
+        history = np.empty(0, np.int64)
+
+    # Stream the new loans one patron at a time.
+    changed_users = []
+    touched_books = np.zeros(n_books, dtype=bool)
+    new_history = []
+    rows = loans.order_by('user_id', 'pk').values_list('user_id', 'book_id').iterator(chunk_size=CHUNK_SIZE)
+    for user_id, group in groupby(rows, key=itemgetter(0)):
+        user = int(np.searchsorted(user_ids, user_id))
+        books = np.unique(np.searchsorted(book_ids, [book_id for _, book_id in group]))
+        lo, hi = np.searchsorted(history, [user * n_books, (user + 1) * n_books])
+        old = history[lo:hi] % n_books
+        fresh = np.setdiff1d(books, old, assume_unique=True)
+        if not len(fresh):
+            continue
+        everything = np.union1d(old, fresh)
+        # fresh -> every other book (covers both directions between fresh books)
+        a, b = np.repeat(fresh, len(everything)), np.tile(everything, len(fresh))
+        keep = a != b
+        cooc.add(a[keep] * n_books + b[keep])
+        # earlier books -> fresh
+        cooc.add(np.repeat(old, len(fresh)) * n_books + np.tile(fresh, len(old)))
+        new_history.append(user * n_books + fresh)
+        touched_books[everything] = True
+        changed_users.append(user)
+
+    if new_history:
+        history = np.union1d(history, np.concatenate(new_history))
+    codes, counts = cooc.result()
+
+    cooc_indptr = _indptr(codes // n_books, n_books)
+    cooc_indices = (codes % n_books).astype(np.int32)
+    cooc_data = counts.astype(np.float32)
+    history_users = history // n_books
+    hist_indptr = _indptr(history_users, n_users)
+    hist_books = (history % n_books).astype(np.int32)
+    popularity = np.bincount(hist_books, minlength=n_books).astype(np.float64)
+
+    # Recompute suggestions for patrons whose books gained co-borrowings.
+    if previous:
+        affected = np.bincount(history_users[touched_books[hist_books]], minlength=n_users) > 0
+        affected[changed_users] = True
+    else:
+        affected = np.ones(n_users, dtype=bool)
+    recommendations = [None] * n_users
+    if previous:
+        for old_position, position in enumerate(user_map.tolist()):
+            start, end = previous.rec_indptr[old_position], previous.rec_indptr[old_position + 1]
+            recommendations[position] = np.asarray(previous.rec_books[start:end])
+    for position in np.flatnonzero(affected).tolist():
+        books = hist_books[hist_indptr[position]:hist_indptr[position + 1]]
+        best = _score(books, cooc_indptr, cooc_indices, cooc_data, popularity, top_n)
+        recommendations[position] = book_ids[best]
+    rec_indptr = _indptr(
+        np.repeat(np.arange(n_users), [len(recs) for recs in recommendations]), n_users
+    )
+    rec_books = np.concatenate(recommendations).astype(np.int64) if n_users else np.empty(0, np.int64)
+
+    state = {
+        'last_loan_id': max_loan_id,
+        'built_at': timezone.now().isoformat(),
+        'incremental': previous is not None,
+        'books': n_books,
+        'users': n_users,
+        'pairs': int(len(codes)),
+        'recomputed_users': int(affected.sum()),
+    }
+    _publish({
+        'book_ids': book_ids, 'popularity': popularity,
+        'cooc_indptr': cooc_indptr, 'cooc_indices': cooc_indices, 'cooc_data': cooc_data,
+        'user_ids': user_ids, 'hist_indptr': hist_indptr, 'hist_books': hist_books,
+        'rec_indptr': rec_indptr, 'rec_books': rec_books,
+    }, state)
+    return state
+
+
+def _publish(arrays, state):
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    generation = root / f'gen-{timezone.now().strftime("%Y%m%d%H%M%S%f")}-{os.getpid()}'
+    generation.mkdir()
+    for name, array in arrays.items():
+        np.save(generation / f'{name}.npy', array)
+    (generation / 'state.json').write_text(json.dumps(state))
+
+    pointer = root / 'CURRENT.tmp'
+    pointer.write_text(generation.name)
+    os.replace(pointer, root / 'CURRENT')
+
+    # Keep the generation before this one for processes still reading it.
+    generations = sorted(path for path in root.glob('gen-*') if path.is_dir())
+    for stale in generations[:-2]:
+        shutil.rmtree(stale, ignore_errors=True)
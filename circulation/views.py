@@ -2,6 +2,7 @@ from django.views.generic import ListView, RedirectView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.urls import reverse_lazy
 from django.utils import timezone
 from datetime import timedelta
@@ -33,19 +34,20 @@ class ReserveBookView(LoginRequiredMixin, RedirectView):
     def get_redirect_url(self, *args, **kwargs):
         book = get_object_or_404(Book, pk=kwargs['book_id'], is_active=True)
         
-        # Check if already reserved
-        existing = Reservation.objects.filter(user=self.request.user, book=book, status='pending')
-        if existing.exists():
-            messages.warning(self.request, 'You already have a pending reservation for this book.')
-            return reverse_lazy('catalog:book_detail', kwargs={'pk': book.pk})
+        with transaction.atomic():
+            # Check if already reserved
+            existing = Reservation.objects.filter(user=self.request.user, book=book, status='pending')
+            if existing.exists():
+                messages.warning(self.request, 'You already have a pending reservation for this book.')
+                return reverse_lazy('catalog:book_detail', kwargs={'pk': book.pk})
         
-        # Create reservation
-        reservation = Reservation.objects.create(
-            user=self.request.user,
-            book=book,
-            status='pending'
-        )
-        reservation.update_queue_position()
+            # Create reservation
+            reservation = Reservation.objects.create(
+                user=self.request.user,
+                book=book,
+                status='pending'
+            )
+            reservation.update_queue_position()
         
         messages.success(self.request, f'Book "{book.title}" has been reserved. You are #{reservation.queue_position} in the queue.')
         return reverse_lazy('catalog:book_detail', kwargs={'pk': book.pk})
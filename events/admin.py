@@ -6,7 +6,7 @@ class EventRegistrationInline(admin.TabularInline):
     model = EventRegistration
     extra = 0
     readonly_fields = ['registration_date', 'confirmation_date']
-    fields = ['user', 'is_confirmed', 'is_attended', 'payment_status', 'registration_date']
+    fields = ['user', 'is_confirmed', 'is_waitlisted', 'is_attended', 'payment_status', 'registration_date']
 
 
 @admin.register(Event)
@@ -47,8 +47,8 @@ class EventAdmin(admin.ModelAdmin):
 
 @admin.register(EventRegistration)
 class EventRegistrationAdmin(admin.ModelAdmin):
-    list_display = ['event', 'user', 'is_confirmed', 'is_attended', 'payment_status', 'registration_date']
-    list_filter = ['is_confirmed', 'is_attended', 'payment_status', 'registration_date']
+    list_display = ['event', 'user', 'is_confirmed', 'is_waitlisted', 'is_attended', 'payment_status', 'registration_date']
+    list_filter = ['is_confirmed', 'is_waitlisted', 'is_attended', 'payment_status', 'registration_date']
     search_fields = ['user__username', 'event__title', 'payment_reference']
     raw_id_fields = ['event', 'user']
     readonly_fields = ['registration_date', 'confirmation_date', 'attendance_date', 'created_at', 'updated_at']
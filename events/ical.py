@@ -0,0 +1,138 @@
+"""
+iCalendar (RFC 5545) feeds for library events.
+
+Every event is rendered once into a VEVENT block and cached under a key that
+includes its ``updated_at``: editing an event invalidates exactly one
+fragment, and a feed of thousands of events is assembled from batched
+``cache.get_many`` hits, loading and rendering only the events that changed.
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import F
+from accounts.models import User
+
+PRODID = '-//University of Maiduguri Library//Events//EN'
+BATCH_SIZE = 500
+TOKEN_SALT = 'events.ical.user-feed'
+
+
+def escape(text):
+    """Escape a TEXT property value"""
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n')
+    )
+
+
+def fold(line):
+    """Fold a content line to at most 75 octets per physical line"""
+    if len(line.encode()) <= 75:
+        return line + '\r\n'
+    parts = []
+    current, size = '', 0
+    for char in line:
+        width = len(char.encode())
+        # Continuation lines start with a space, which counts towards the limit.
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_vevent(event, host, scheme='https'):
+    """Render one event as a VEVENT block"""
+    location = ', '.join(part for part in (event.venue, event.location) if part)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@{host}',
+        f'DTSTAMP:{format_datetime(event.updated_at)}',
+        f'LAST-MODIFIED:{format_datetime(event.updated_at)}',
+        f'DTSTART:{format_datetime(event.start_date)}',
+        f'DTEND:{format_datetime(event.end_date)}',
+        f'SUMMARY:{escape(event.title)}',
+        f'DESCRIPTION:{escape(event.short_description or event.description)}',
+        f'LOCATION:{escape(location)}',
+        f'CATEGORIES:{escape(event.get_event_type_display())}',
+        f'URL:{scheme}://{host}{event.get_absolute_url()}',
+        f'STATUS:{"CANCELLED" if event.is_cancelled else "CONFIRMED"}',
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) for line in lines)
+
+
+def fragment_key(pk, updated_at, host):
+    return f'ical:vevent:{host}:{pk}:{updated_at.timestamp()}'
+
+
+def iter_calendar(queryset, name, host, scheme='https'):
+    """Yield a calendar for ``queryset`` piece by piece, for a streaming response"""
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}',
+    ])
+
+    # Only keys are read up front; full rows are loaded for cache misses only.
+    keys = queryset.values_list('pk', 'updated_at')
+    batch = []
+    for pk, updated_at in keys.iterator(chunk_size=BATCH_SIZE):
+        batch.append((pk, fragment_key(pk, updated_at, host)))
+        if len(batch) == BATCH_SIZE:
+            yield _render_batch(queryset, batch, host, scheme)
+            batch = []
+    if batch:
+        yield _render_batch(queryset, batch, host, scheme)
+
+    yield fold('END:VCALENDAR')
+
+
+def _render_batch(queryset, batch, host, scheme):
+    cached = cache.get_many([key for _, key in batch])
+    fragments = {pk: cached[key] for pk, key in batch if key in cached}
+    missing = [pk for pk, _ in batch if pk not in fragments]
+    if missing:
+        rendered = {}
+        for event in queryset.model.objects.filter(pk__in=missing):
+            fragments[event.pk] = render_vevent(event, host, scheme)
+            rendered[fragment_key(event.pk, event.updated_at, host)] = fragments[event.pk]
+        cache.set_many(rendered, settings.ICAL_FRAGMENT_TIMEOUT)
+    return ''.join(fragments.get(pk, '') for pk, _ in batch)
+
+
+def feed_token(user):
+    """Unguessable token for a user's personal calendar feed URL.
+
+    Tokens expire after ``ICAL_TOKEN_MAX_AGE`` seconds and are revoked
+    together by ``revoke_feed_tokens()``.
+    """
+    return signing.dumps([user.pk, user.calendar_feed_version], salt=TOKEN_SALT)
+
+
+def user_from_token(token):
+    """Return the user id encoded in a feed token, or None if it is invalid"""
+    try:
+        user_id, version = signing.loads(token, salt=TOKEN_SALT, max_age=settings.ICAL_TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if not User.objects.filter(pk=user_id, calendar_feed_version=version, is_active=True).exists():
+        return None
+    return user_id
+
+
+def revoke_feed_tokens(user):
+    """Invalidate every feed token issued to ``user`` so far"""
+    User.objects.filter(pk=user.pk).update(calendar_feed_version=F('calendar_feed_version') + 1)
+    user.refresh_from_db(fields=['calendar_feed_version'])
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:53
+
+from django.db import migrations, models
+
+
+def backfill_registration_count(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    EventRegistration = apps.get_model('events', 'EventRegistration')
+    confirmed = (
+        EventRegistration.objects.filter(event=models.OuterRef('pk'), is_confirmed=True)
+        .order_by().values('event').annotate(total=models.Count('pk')).values('total')
+    )
+    Event.objects.update(
+        registration_count=models.functions.Coalesce(models.Subquery(confirmed), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='registration_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_registration_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_registration_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventregistration',
+            name='is_waitlisted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='eventregistration',
+            index=models.Index(fields=['event', 'is_waitlisted', 'registration_date'], name='events_even_event_i_4eae5f_idx'),
+        ),
+    ]
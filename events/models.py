@@ -1,12 +1,20 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 from accounts.models import User
+from api.models import ChangeLog, TrackedModel
 
 
-class Event(models.Model):
+class EventFull(Exception):
+    """Raised when an event has no spots left for a confirmed registration"""
+
+
+class Event(TrackedModel):
     """Library events"""
+    change_resource = 'events'
     EVENT_TYPES = [
         ('workshop', 'Workshop'),
         ('seminar', 'Seminar'),
@@ -38,6 +46,8 @@ class Event(models.Model):
     capacity = models.IntegerField(null=True, blank=True)
     requires_registration = models.BooleanField(default=False)
     registration_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Number of confirmed registrations, maintained by EventRegistration
+    registration_count = models.PositiveIntegerField(default=0, editable=False)
     
     # Status
     is_published = models.BooleanField(default=False)
@@ -73,13 +83,29 @@ class Event(models.Model):
     def __str__(self):
         return self.title
     
+    def is_listed(self):
+        return self.is_published and not self.is_cancelled
+    
     def get_absolute_url(self):
         return reverse('events:event_detail', kwargs={'slug': self.slug})
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'capacity' in field_names:
+            instance._loaded_capacity = instance.capacity
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # A raised (or removed) capacity opens spots for the waitlist.
+            capacity_changed = getattr(self, '_loaded_capacity', self.capacity) != self.capacity
+            self._loaded_capacity = self.capacity
+            if capacity_changed:
+                self.promote_waitlist()
     
     @property
     def is_upcoming(self):
@@ -98,23 +124,128 @@ class Event(models.Model):
         return self.end_date < timezone.now()
     
     @property
-    def registration_count(self):
-        """Get number of registrations"""
-        return self.registrations.filter(is_confirmed=True).count()
+    def has_capacity_limit(self):
+        """A missing, zero or negative capacity means unlimited spots"""
+        return self.capacity is not None and self.capacity > 0
     
     @property
     def available_spots(self):
         """Get available spots"""
-        if not self.capacity:
+        if not self.has_capacity_limit:
             return None
         return max(0, self.capacity - self.registration_count)
     
     @property
     def is_full(self):
         """Check if event is full"""
-        if not self.capacity:
+        if not self.has_capacity_limit:
             return False
         return self.registration_count >= self.capacity
+    
+    def claim_spots(self, count=1):
+        """Atomically take spots if capacity allows; returns False when full.
+
+        The capacity check and the increment are a single conditional UPDATE,
+        so concurrent registrations can never push the count past capacity.
+        """
+        claimed = Event.objects.filter(pk=self.pk).filter(
+            Q(capacity__isnull=True) | Q(capacity__lte=0) |
+            Q(registration_count__lte=F('capacity') - count)
+        ).update(registration_count=F('registration_count') + count)
+        if claimed:
+            self.registration_count += count
+            ChangeLog.objects.record([self])
+        return bool(claimed)
+    
+    def adjust_registration_count(self, delta):
+        """Shift the stored count without a capacity check, never below zero"""
+        Event.objects.filter(pk=self.pk).update(
+            registration_count=Greatest(F('registration_count') + delta, 0)
+        )
+        self.registration_count = max(0, self.registration_count + delta)
+        ChangeLog.objects.record([self])
+    
+    def recount_registrations(self):
+        """Rebuild the stored count from the registrations table"""
+        self.registration_count = self.registrations.filter(is_confirmed=True).count()
+        Event.objects.filter(pk=self.pk).update(registration_count=self.registration_count)
+        ChangeLog.objects.record([self])
+        return self.registration_count
+    
+    @transaction.atomic
+    def register(self, user, waitlist=False, **fields):
+        """Create a confirmed registration.
+
+        When no spot is left the user is put on the waitlist if ``waitlist``
+        is set, otherwise EventFull is raised.
+        """
+        if self.claim_spots():
+            registration = EventRegistration(
+                event=self, user=user, is_confirmed=True,
+                confirmation_date=timezone.now(), **fields
+            )
+            # The spot is already counted; tell save() not to count it again.
+            registration._counted_confirmed = True
+        elif waitlist:
+            registration = EventRegistration(event=self, user=user, is_waitlisted=True, **fields)
+        else:
+            raise EventFull(self.title)
+        registration.save()
+        return registration
+    
+    @transaction.atomic
+    def bulk_register(self, user_ids, waitlist=True):
+        """Register many users with a single INSERT.
+
+        Users are admitted in the given order until the event is full; the
+        rest are waitlisted, or skipped when ``waitlist`` is off. Unknown,
+        inactive and already registered users are skipped. Returns the
+        confirmed, waitlisted and skipped user ids.
+        """
+        # Lock the event row so the free spots counted here cannot be taken
+        # by a concurrent registration before this transaction commits.
+        event = Event.objects.select_for_update().get(pk=self.pk)
+        requested = list(dict.fromkeys(user_ids))
+        eligible = set(
+            User.objects.filter(pk__in=requested, is_active=True).values_list('pk', flat=True)
+        )
+        eligible -= set(self.registrations.filter(user_id__in=eligible).values_list('user_id', flat=True))
+        admitted = [pk for pk in requested if pk in eligible]
+        spots = len(admitted) if event.available_spots is None else event.available_spots
+        confirmed, overflow = admitted[:spots], admitted[spots:]
+        waitlisted = overflow if waitlist else []
+        
+        now = timezone.now()
+        EventRegistration.objects.bulk_create(
+            [EventRegistration(event=self, user_id=pk, is_confirmed=True, confirmation_date=now) for pk in confirmed] +
+            [EventRegistration(event=self, user_id=pk, is_waitlisted=True) for pk in waitlisted]
+        )
+        self.registration_count = event.registration_count
+        if confirmed:
+            self.adjust_registration_count(len(confirmed))
+        skipped = [pk for pk in requested if pk not in eligible] + ([] if waitlist else overflow)
+        return confirmed, waitlisted, skipped
+    
+    @transaction.atomic
+    def promote_waitlist(self):
+        """Confirm waitlisted registrations, oldest first, while spots remain"""
+        self.refresh_from_db(fields=['capacity', 'registration_count'])
+        queue = self.registrations.select_for_update().filter(
+            is_waitlisted=True
+        ).order_by('registration_date', 'pk')
+        if self.available_spots is not None:
+            queue = queue[:self.available_spots]
+        promoted = []
+        for registration in queue:
+            if not self.claim_spots():
+                break
+            registration._counted_confirmed = True
+            registration.is_waitlisted = False
+            registration.is_confirmed = True
+            registration.confirmation_date = timezone.now()
+            registration.save(update_fields=['is_waitlisted', 'is_confirmed', 'confirmation_date', 'updated_at'])
+            promoted.append(registration)
+        return promoted
 
 
 class EventRegistration(models.Model):
@@ -122,6 +253,7 @@ class EventRegistration(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='registrations')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_registrations')
     is_confirmed = models.BooleanField(default=False)
+    is_waitlisted = models.BooleanField(default=False)
     is_attended = models.BooleanField(default=False)
     registration_date = models.DateTimeField(auto_now_add=True)
     confirmation_date = models.DateTimeField(null=True, blank=True)
@@ -148,17 +280,56 @@ class EventRegistration(models.Model):
         indexes = [
             models.Index(fields=['event', 'is_confirmed']),
             models.Index(fields=['user', 'is_confirmed']),
+            models.Index(fields=['event', 'is_waitlisted', 'registration_date']),
         ]
     
     def __str__(self):
         return f"{self.user.username} - {self.event.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'is_confirmed' in field_names:
+            instance._counted_confirmed = instance.is_confirmed
+        return instance
+    
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        # Keep Event.registration_count in step with confirmations made or
+        # withdrawn here (including the admin). Capacity is enforced by
+        # Event.register/confirm, not on this path.
+        counted = getattr(self, '_counted_confirmed', False)
+        super().save(*args, **kwargs)
+        if self.is_confirmed != counted:
+            self.event.adjust_registration_count(1 if self.is_confirmed else -1)
+            self._counted_confirmed = self.is_confirmed
+            if not self.is_confirmed:
+                # The withdrawn spot goes to the first patron on the waitlist.
+                self.event.promote_waitlist()
+    
+    @transaction.atomic
     def confirm(self):
-        """Confirm registration"""
+        """Confirm registration, raising EventFull if the event has no spot left"""
+        if self.is_confirmed:
+            return
+        if not self.event.claim_spots():
+            raise EventFull(self.event.title)
+        self._counted_confirmed = True
         self.is_confirmed = True
+        self.is_waitlisted = False
         self.confirmation_date = timezone.now()
         self.save()
     
+    @property
+    def waitlist_position(self):
+        """Get 1-based position on the waitlist"""
+        if not self.is_waitlisted:
+            return None
+        return self.event.registrations.filter(is_waitlisted=True).filter(
+            Q(registration_date__lt=self.registration_date) |
+            Q(registration_date=self.registration_date, pk__lt=self.pk)
+        ).count() + 1
+    
     def mark_attended(self):
         """Mark as attended"""
         self.is_attended = True
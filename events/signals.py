@@ -0,0 +1,19 @@
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from api.models import ChangeLog
+from .models import Event, EventRegistration
+
+
+@receiver(post_delete, sender=EventRegistration)
+def release_registration_spot(sender, instance, **kwargs):
+    """Give a confirmed registration's spot back, including cascade deletes,
+    and hand it to the first patron on the waitlist"""
+    if getattr(instance, '_counted_confirmed', instance.is_confirmed):
+        released = Event.objects.filter(pk=instance.event_id, registration_count__gt=0).update(
+            registration_count=F('registration_count') - 1
+        )
+        if released:
+            event = Event.objects.get(pk=instance.event_id)
+            ChangeLog.objects.record([event])
+            event.promote_waitlist()
@@ -1,3 +1,198 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from unimaid_library.testing import TemporaryMediaMixin
+from . import ical
+from .models import Event, EventFull, EventRegistration
+
+
+class EventTestCase(TemporaryMediaMixin, TestCase):
+    def make_event(self, capacity=2, **fields):
+        start = timezone.now() + timedelta(days=7)
+        return Event.objects.create(
+            title=fields.pop('title', 'Research Skills Workshop'), description='Hands-on session',
+            start_date=start, end_date=start + timedelta(hours=2), location='Main Library',
+            capacity=capacity, is_published=True, requires_registration=True, **fields
+        )
+
+    def make_users(self, count):
+        return [User.objects.create_user(username=f'patron{i}', password='secret') for i in range(count)]
+
+
+class CapacityTests(EventTestCase):
+    def test_register_fills_event_then_waitlists(self):
+        event = self.make_event(capacity=2)
+        first, second, third = self.make_users(3)
+
+        event.register(first)
+        event.register(second)
+        waitlisted = event.register(third, waitlist=True)
+
+        event.refresh_from_db()
+        self.assertEqual(event.registration_count, 2)
+        self.assertTrue(event.is_full)
+        self.assertEqual(event.available_spots, 0)
+        self.assertTrue(waitlisted.is_waitlisted)
+        self.assertEqual(waitlisted.waitlist_position, 1)
+
+    def test_register_without_waitlist_raises_when_full(self):
+        event = self.make_event(capacity=1)
+        first, second = self.make_users(2)
+        event.register(first)
+
+        with self.assertRaises(EventFull):
+            event.register(second)
+        self.assertFalse(EventRegistration.objects.filter(user=second).exists())
+
+    def test_non_positive_capacity_is_unlimited(self):
+        for capacity in (None, 0, -3):
+            event = self.make_event(capacity=capacity, title=f'Open day {capacity}')
+            for user in self.make_users(3) if capacity is None else []:
+                event.register(user)
+            self.assertIsNone(event.available_spots)
+            self.assertFalse(event.is_full)
+            self.assertTrue(event.claim_spots())
+
+    def test_adjust_registration_count_never_goes_negative(self):
+        event = self.make_event()
+        event.adjust_registration_count(-1)
+
+        self.assertEqual(event.registration_count, 0)
+        event.refresh_from_db()
+        self.assertEqual(event.registration_count, 0)
+
+
+class BulkRegisterTests(EventTestCase):
+    def test_admits_until_full_then_waitlists(self):
+        event = self.make_event(capacity=2)
+        users = self.make_users(3)
+
+        confirmed, waitlisted, skipped = event.bulk_register([user.pk for user in users])
+
+        self.assertEqual(confirmed, [users[0].pk, users[1].pk])
+        self.assertEqual(waitlisted, [users[2].pk])
+        self.assertEqual(skipped, [])
+        event.refresh_from_db()
+        self.assertEqual(event.registration_count, 2)
+
+    def test_skips_registered_and_inactive_users(self):
+        event = self.make_event(capacity=5)
+        registered, inactive, new = self.make_users(3)
+        event.register(registered)
+        User.objects.filter(pk=inactive.pk).update(is_active=False)
+
+        confirmed, waitlisted, skipped = event.bulk_register([registered.pk, inactive.pk, new.pk])
+
+        self.assertEqual(confirmed, [new.pk])
+        self.assertEqual(sorted(skipped), sorted([registered.pk, inactive.pk]))
+
+
+class WaitlistTests(EventTestCase):
+    def setUp(self):
+        self.event = self.make_event(capacity=1)
+        self.first, self.second, self.third = self.make_users(3)
+        self.confirmed = self.event.register(self.first)
+        self.event.register(self.second, waitlist=True)
+        self.event.register(self.third, waitlist=True)
+
+    def registration(self, user):
+        return EventRegistration.objects.get(event=self.event, user=user)
+
+    def test_deleting_confirmed_registration_promotes_first_waitlisted(self):
+        self.confirmed.delete()
+
+        self.assertTrue(self.registration(self.second).is_confirmed)
+        self.assertTrue(self.registration(self.third).is_waitlisted)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registration_count, 1)
+
+    def test_unconfirming_registration_promotes_first_waitlisted(self):
+        self.confirmed.is_confirmed = False
+        self.confirmed.save()
+
+        self.assertTrue(self.registration(self.second).is_confirmed)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registration_count, 1)
+
+    def test_raising_capacity_promotes_waitlist(self):
+        self.event.capacity = 3
+        self.event.save()
+
+        self.assertTrue(self.registration(self.second).is_confirmed)
+        self.assertTrue(self.registration(self.third).is_confirmed)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registration_count, 3)
+
+    def test_waitlisted_registration_cannot_confirm_past_capacity(self):
+        with self.assertRaises(EventFull):
+            self.registration(self.second).confirm()
+
+
+class CancelRegistrationViewTests(EventTestCase):
+    def setUp(self):
+        self.event = self.make_event(capacity=1)
+        self.first, self.second = self.make_users(2)
+        self.event.register(self.first)
+        self.event.register(self.second, waitlist=True)
+        self.url = reverse('events:event_cancel_registration', kwargs={'slug': self.event.slug})
+        self.client.force_login(self.first)
+
+    def test_get_does_not_cancel(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 405)
+        self.assertTrue(EventRegistration.objects.filter(event=self.event, user=self.first).exists())
+
+    def test_post_cancels_and_promotes(self):
+        response = self.client.post(self.url)
+
+        self.assertRedirects(response, self.event.get_absolute_url(), fetch_redirect_response=False)
+        self.assertFalse(EventRegistration.objects.filter(event=self.event, user=self.first).exists())
+        self.assertTrue(EventRegistration.objects.get(event=self.event, user=self.second).is_confirmed)
+
+    def test_post_requires_csrf_token(self):
+        self.client.logout()
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.first)
+
+        self.assertEqual(client.post(self.url).status_code, 403)
+
+
+class UserCalendarFeedTests(EventTestCase):
+    def setUp(self):
+        self.user, = self.make_users(1)
+        self.event = self.make_event()
+        self.other = self.make_event(title='Citation Clinic')
+        self.registration = self.event.register(self.user)
+
+    def feed_url(self):
+        return reverse('events:calendar_feed_user', args=[ical.feed_token(self.user)])
+
+    def test_etag_changes_when_registrations_are_swapped(self):
+        url = self.feed_url()
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.registration.delete()
+        self.other.register(self.user)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_reset_revokes_old_links(self):
+        old_url = self.feed_url()
+        self.client.force_login(self.user)
+
+        self.client.post(reverse('events:calendar_reset'))
+
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        self.user.refresh_from_db()
+        self.assertEqual(self.client.get(self.feed_url()).status_code, 200)
 
-# Create your tests here.
+    def test_expired_token_is_rejected(self):
+        url = self.feed_url()
+        with self.settings(ICAL_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.client.get(url).status_code, 404)
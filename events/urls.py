@@ -5,7 +5,12 @@ app_name = 'events'
 
 urlpatterns = [
     path('', views.EventListView.as_view(), name='event_list'),
+    path('calendar.ics', views.CalendarFeedView.as_view(), name='calendar_feed'),
+    path('calendar/<str:event_type>.ics', views.CalendarFeedView.as_view(), name='calendar_feed_type'),
+    path('calendar/user/<str:token>.ics', views.UserCalendarFeedView.as_view(), name='calendar_feed_user'),
+    path('calendar/reset/', views.ResetCalendarLinkView.as_view(), name='calendar_reset'),
     path('<slug:slug>/', views.EventDetailView.as_view(), name='event_detail'),
     path('<slug:slug>/register/', views.EventRegisterView.as_view(), name='event_register'),
+    path('<slug:slug>/cancel/', views.CancelRegistrationView.as_view(), name='event_cancel_registration'),
 ]
 
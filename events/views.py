@@ -1,10 +1,19 @@
-from django.views.generic import ListView, DetailView, CreateView
+import hashlib
+
+from django.views.generic import View, ListView, CreateView, RedirectView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.db import IntegrityError
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from . import ical
 from .models import Event, EventRegistration
+from unimaid_library.generic import ObjectDetailView
 
 
 class EventListView(ListView):
@@ -33,10 +42,12 @@ class EventListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['event_types'] = Event.EVENT_TYPES
+        if self.request.user.is_authenticated:
+            context['calendar_token'] = ical.feed_token(self.request.user)
         return context
 
 
-class EventDetailView(DetailView):
+class EventDetailView(ObjectDetailView):
     model = Event
     template_name = 'events/event_detail.html'
     context_object_name = 'event'
@@ -48,16 +59,17 @@ class EventDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        event = self.get_object()
+        event = self.object
         
-        # Check if user is registered
+        # Check if user is registered or waitlisted
         if self.request.user.is_authenticated:
-            context['is_registered'] = EventRegistration.objects.filter(
+            context['registration'] = EventRegistration.objects.filter(
                 event=event,
                 user=self.request.user
-            ).exists()
+            ).first()
         else:
-            context['is_registered'] = False
+            context['registration'] = None
+        context['is_registered'] = context['registration'] is not None
         
         return context
 
@@ -78,27 +90,141 @@ class EventRegisterView(LoginRequiredMixin, CreateView):
             messages.warning(self.request, 'You are already registered for this event.')
             return redirect('events:event_detail', slug=self.event.slug)
         
-        # Check if event is full
-        if self.event.is_full:
-            messages.error(self.request, 'Sorry, this event is full.')
-            return redirect('events:event_detail', slug=self.event.slug)
-        
         # Check if registration deadline has passed
         if self.event.registration_deadline and timezone.now() > self.event.registration_deadline:
             messages.error(self.request, 'Registration deadline has passed.')
             return redirect('events:event_detail', slug=self.event.slug)
         
-        registration = form.save(commit=False)
-        registration.event = self.event
-        registration.user = self.request.user
-        registration.is_confirmed = True
-        registration.confirmation_date = timezone.now()
-        registration.save()
+        # Claiming the spot and creating the registration happen in one
+        # transaction, so a full event is detected without a COUNT and
+        # concurrent requests cannot oversell it.
+        # A full event puts the patron on its waitlist instead.
+        try:
+            registration = self.event.register(self.request.user, waitlist=True)
+        except IntegrityError:
+            messages.warning(self.request, 'You are already registered for this event.')
+            return redirect('events:event_detail', slug=self.event.slug)
         
-        messages.success(self.request, f'Successfully registered for "{self.event.title}"!')
+        if registration.is_waitlisted:
+            messages.info(
+                self.request,
+                f'"{self.event.title}" is full. You are #{registration.waitlist_position} on the waitlist '
+                'and will be registered automatically if a spot opens up.'
+            )
+        else:
+            messages.success(self.request, f'Successfully registered for "{self.event.title}"!')
         return redirect('events:event_detail', slug=self.event.slug)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['event'] = self.event
         return context
+
+
+class CancelRegistrationView(LoginRequiredMixin, RedirectView):
+    """Cancel the user's registration; POST only, so links cannot trigger it"""
+    pattern_name = 'events:event_detail'
+    http_method_names = ['post']
+    
+    def get_redirect_url(self, *args, **kwargs):
+        registration = get_object_or_404(
+            EventRegistration, event__slug=kwargs['slug'], user=self.request.user
+        )
+        was_waitlisted = registration.is_waitlisted
+        # Deleting a confirmed registration promotes the next waitlisted patron.
+        registration.delete()
+        
+        if was_waitlisted:
+            messages.success(self.request, 'You have left the waitlist.')
+        else:
+            messages.success(self.request, 'Your registration has been cancelled.')
+        return super().get_redirect_url(*args, **kwargs)
+
+
+class CalendarFeedView(View):
+    """Streaming iCalendar feed of published events"""
+    
+    def get_queryset(self):
+        queryset = Event.objects.filter(is_published=True)
+        event_type = self.kwargs.get('event_type')
+        if event_type:
+            if event_type not in dict(Event.EVENT_TYPES):
+                raise Http404('Unknown event type')
+            queryset = queryset.filter(event_type=event_type)
+        return queryset
+    
+    def get_calendar_name(self):
+        event_type = self.kwargs.get('event_type')
+        if event_type:
+            return f'Library {dict(Event.EVENT_TYPES)[event_type]} Events'
+        return 'Library Events'
+    
+    def get_validators(self, queryset):
+        """ETag and Last-Modified timestamp of the feed.
+
+        Any edit bumps updated_at and any addition or removal changes the
+        count, so calendar clients polling with If-None-Match or
+        If-Modified-Since get a 304 from this single aggregate query.
+        """
+        state = queryset.aggregate(total=Count('pk'), last_modified=Max('updated_at'))
+        last_modified = int(state['last_modified'].timestamp()) if state['last_modified'] else None
+        etag = f"{state['total']}-{state['last_modified'].timestamp() if last_modified else 0}"
+        return etag, last_modified
+    
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        etag, last_modified = self.get_validators(queryset)
+        etag = quote_etag(etag)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+        
+        response = StreamingHttpResponse(
+            ical.iter_calendar(
+                queryset.order_by('start_date', 'pk'), self.get_calendar_name(),
+                request.get_host(), request.scheme
+            ),
+            content_type='text/calendar; charset=utf-8'
+        )
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Content-Disposition'] = 'inline; filename="events.ics"'
+        return response
+
+
+class UserCalendarFeedView(CalendarFeedView):
+    """Feed of the events a patron is registered for, addressed by a signed token"""
+    
+    def get_queryset(self):
+        user_id = ical.user_from_token(self.kwargs['token'])
+        if user_id is None:
+            raise Http404('Invalid calendar link')
+        return Event.objects.filter(
+            is_published=True, registrations__user_id=user_id, registrations__is_confirmed=True
+        )
+    
+    def get_validators(self, queryset):
+        """Hash the registered event ids into the ETag.
+
+        Registering for one event and withdrawing from another changes
+        neither the count nor the newest updated_at, and no event timestamp
+        tells when a registration changed, so Last-Modified is not sent.
+        """
+        etag, _ = super().get_validators(queryset)
+        event_ids = ','.join(str(pk) for pk in queryset.order_by('pk').values_list('pk', flat=True))
+        return f"{etag}-{hashlib.sha1(event_ids.encode()).hexdigest()[:16]}", None
+    
+    def get_calendar_name(self):
+        return 'My Library Events'
+
+
+class ResetCalendarLinkView(LoginRequiredMixin, RedirectView):
+    """Revoke the user's calendar feed links; POST only"""
+    pattern_name = 'events:event_list'
+    http_method_names = ['post']
+    
+    def get_redirect_url(self, *args, **kwargs):
+        ical.revoke_feed_tokens(self.request.user)
+        messages.success(self.request, 'Your old calendar links no longer work. Subscribe again with the new link.')
+        return super().get_redirect_url(*args, **kwargs)
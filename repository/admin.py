@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Collection, Document
+from .models import Collection, Document, StoredFile, UploadSession
 
 
 @admin.register(Collection)
@@ -18,7 +18,7 @@ class DocumentAdmin(admin.ModelAdmin):
     search_fields = ['title', 'author', 'abstract', 'keywords', 'doi', 'isbn']
     raw_id_fields = ['submitted_by', 'reviewed_by', 'authors']
     filter_horizontal = ['authors']
-    readonly_fields = ['submission_date', 'download_count', 'view_count', 'created_at', 'updated_at']
+    readonly_fields = ['submission_date', 'released_at', 'file_size', 'checksum', 'download_count', 'view_count', 'created_at', 'updated_at']
     date_hierarchy = 'submission_date'
     
     fieldsets = (
@@ -32,7 +32,7 @@ class DocumentAdmin(admin.ModelAdmin):
             'fields': ('publication_date', 'year', 'publisher', 'journal_name', 'volume', 'issue', 'pages')
         }),
         ('File and Access', {
-            'fields': ('file', 'file_size', 'thumbnail', 'access_level', 'embargo_date')
+            'fields': ('file', 'file_size', 'checksum', 'thumbnail', 'access_level', 'embargo_date', 'released_at')
         }),
         ('Metadata (Dublin Core)', {
             'fields': ('abstract', 'keywords', 'subject', 'language', 'doi', 'isbn', 'issn')
@@ -53,3 +53,20 @@ class DocumentAdmin(admin.ModelAdmin):
             'fields': ('notes', 'created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'fixity_ok', 'verified_at', 'created_at']
+    list_filter = ['fixity_ok', 'verified_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'ref_count', 'verified_at', 'fixity_ok', 'created_at', 'updated_at']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'document', 'user', 'size', 'status', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['filename', 'document__title', 'user__username']
+    raw_id_fields = ['user', 'document']
+    readonly_fields = ['id', 'size', 'chunk_size', 'sha256', 'stored_name', 'error', 'created_at', 'updated_at']
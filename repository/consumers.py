@@ -0,0 +1,12 @@
+from api.outbox import Consumer, register
+from .facets import DOCUMENT_FACETS
+
+
+@register
+class DocumentFacetsConsumer(Consumer):
+    """Drops the cached document facet counts after documents change"""
+    name = 'repository.document_facets'
+    resources = ('documents',)
+
+    def handle(self, changes):
+        DOCUMENT_FACETS.invalidate()
@@ -0,0 +1,11 @@
+from unimaid_library.facets import Facet, FacetSet
+from .models import Document
+
+
+DOCUMENT_FACETS = FacetSet('documents', [
+    Facet('type', 'Document Type', 'document_type', choices=Document.DOCUMENT_TYPES),
+    Facet('collection', 'Collection', 'collection__slug', label_field='collection__name'),
+    Facet('department', 'Department', 'department'),
+    Facet('year', 'Year', 'year', cast=int, order='-value'),
+    Facet('access', 'Access', 'access_level', choices=Document.ACCESS_LEVELS),
+], variants=('anonymous', 'staff'))
@@ -0,0 +1,31 @@
+from django.contrib.syndication.views import Feed
+from django.urls import reverse_lazy
+from django.utils.text import Truncator
+from .models import Document
+
+
+class NewlyAvailableFeed(Feed):
+    """Documents recently opened by the end of their embargo"""
+    title = 'Ramat Library Repository: newly available'
+    link = reverse_lazy('repository:document_list')
+    description = 'Theses, papers and reports whose embargo has ended.'
+
+    def items(self):
+        return Document.objects.filter(
+            is_active=True, is_approved=True, access_level='open', released_at__isnull=False
+        ).order_by('-released_at')[:50]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return Truncator(item.abstract).words(60)
+
+    def item_author_name(self, item):
+        return item.author
+
+    def item_pubdate(self, item):
+        return item.released_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
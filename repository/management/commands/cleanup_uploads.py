@@ -0,0 +1,15 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from repository import uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned resumable upload sessions and their part files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='Idle time before a session is removed (default UPLOAD_SESSION_TIMEOUT)')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['hours']) if options['hours'] else None
+        removed = uploads.cleanup(max_age)
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} upload session(s).'))
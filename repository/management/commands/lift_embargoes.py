@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from analytics import suggestions
+from repository.facets import DOCUMENT_FACETS
+from repository.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Open embargoed documents whose embargo date has passed (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many documents are due')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            due = Document.objects.embargo_expired().count()
+            self.stdout.write(f'{due} document(s) due for release.')
+            return
+
+        released = Document.objects.lift_embargoes()
+        if released:
+            # Listings filter on access_level directly; suggestion indexes
+            # re-read the documents from their new updated_at.
+            DOCUMENT_FACETS.invalidate()
+            suggestions.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Released {len(released)} embargoed document(s).'))
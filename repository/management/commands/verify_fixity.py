@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.utils import timezone
+from repository.models import StoredFile
+from repository.storage import document_storage, file_digest
+
+
+def _check(stored):
+    """Re-hash one stored file; returns (ok, problem)"""
+    try:
+        with document_storage.open(stored.name, 'rb') as handle:
+            digest, size = file_digest(handle)
+    except FileNotFoundError:
+        return False, 'missing'
+    if size != stored.size:
+        return False, f'size {size} != {stored.size}'
+    if digest != stored.sha256:
+        return False, f'checksum {digest} != {stored.sha256}'
+    return True, ''
+
+
+class Command(BaseCommand):
+    help = 'Re-hash stored repository files and compare them with their recorded checksums'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1),
+                            help='Files hashed in parallel')
+        parser.add_argument('--older-than', type=int, default=0, metavar='DAYS',
+                            help='Only check files not verified in the last DAYS days')
+        parser.add_argument('--limit', type=int, help='Check at most this many files (least recently verified first)')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete files no document has referenced for a day')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            pruned = StoredFile.objects.prune()
+            self.stdout.write(f'Pruned {pruned} unreferenced file(s).')
+
+        files = StoredFile.objects.filter(ref_count__gt=0).order_by(F('verified_at').asc(nulls_first=True), 'pk')
+        if options['older_than']:
+            cutoff = timezone.now() - timedelta(days=options['older_than'])
+            files = files.filter(Q(verified_at__isnull=True) | Q(verified_at__lt=cutoff))
+        if options['limit']:
+            files = files[:options['limit']]
+        files = list(files)
+
+        # hashlib releases the GIL on large buffers, so threads hash in parallel.
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            results = list(pool.map(_check, files))
+
+        now = timezone.now()
+        failures = 0
+        for stored, (ok, problem) in zip(files, results):
+            stored.verified_at = now
+            stored.fixity_ok = ok
+            if not ok:
+                failures += 1
+                self.stderr.write(self.style.ERROR(f'{stored.name}: {problem}'))
+        StoredFile.objects.bulk_update(files, ['verified_at', 'fixity_ok'], batch_size=500)
+
+        if failures:
+            raise CommandError(f'{failures} of {len(files)} file(s) failed the fixity check.')
+        self.stdout.write(self.style.SUCCESS(f'Verified {len(files)} file(s).'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repository', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['access_level', 'embargo_date'], name='repository__access__677269_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repository', '0002_document_access_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='released_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:10
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _payload(document):
+    # Mirrors TrackedModel.change_payload(), which historical models lack.
+    payload = {}
+    for field in document._meta.concrete_fields:
+        if isinstance(field, models.TextField):
+            continue
+        value = field.value_from_object(document)
+        if isinstance(field, models.FileField):
+            value = value.name or None
+        payload[field.attname] = value
+    return payload
+
+
+def lift_expired_embargoes(apps, schema_editor):
+    # Access checks no longer compare embargo dates; open the documents the
+    # old checks already treated as open (see DocumentQuerySet.lift_embargoes)
+    # and log the changes, since a bulk UPDATE skips save().
+    Document = apps.get_model('repository', 'Document')
+    ChangeLog = apps.get_model('api', 'ChangeLog')
+    now = timezone.now()
+    expired = Document.objects.filter(
+        models.Q(embargo_date__isnull=True) | models.Q(embargo_date__lte=now.date()), access_level='embargoed'
+    )
+    if not expired.update(access_level='open', released_at=now, updated_at=now):
+        return
+    ChangeLog.objects.bulk_create([
+        ChangeLog(
+            resource='documents', object_id=document.pk, action='updated',
+            deleted=not (document.is_active and document.is_approved), payload=_payload(document),
+        )
+        for document in Document.objects.filter(released_at=now)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_outbox'),
+        ('repository', '0006_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.RunPython(lift_expired_embargoes, migrations.RunPython.noop),
+    ]
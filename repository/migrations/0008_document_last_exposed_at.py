@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:05
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+
+def _harvestable(payload):
+    return payload.get('is_active') and payload.get('is_approved') and payload.get('access_level') == 'open'
+
+
+def backfill_last_exposed_at(apps, schema_editor):
+    # A document was exposed to harvesters if it is open now or a change log
+    # entry shows it open. Record that on the document and in the payload of
+    # its latest entry, which is all deleted_records() keeps of deletions.
+    Document = apps.get_model('repository', 'Document')
+    ChangeLog = apps.get_model('api', 'ChangeLog')
+    exposed = {}
+    for entry in ChangeLog.objects.filter(resource='documents').order_by('pk').iterator():
+        if _harvestable(entry.payload or {}):
+            exposed[entry.object_id] = entry.created_at
+    harvestable = Document.objects.filter(is_active=True, is_approved=True, access_level='open')
+    for pk, updated_at in harvestable.values_list('pk', 'updated_at'):
+        exposed[pk] = updated_at
+
+    for pk, exposed_at in exposed.items():
+        Document.objects.filter(pk=pk).update(last_exposed_at=exposed_at)
+        latest = ChangeLog.objects.filter(resource='documents', object_id=pk).order_by('-pk').first()
+        if latest is not None and latest.payload is not None:
+            latest.payload['last_exposed_at'] = DjangoJSONEncoder().default(exposed_at)
+            latest.save(update_fields=['payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_checkpoint_gaps'),
+        ('repository', '0007_lift_expired_embargoes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='last_exposed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_last_exposed_at, migrations.RunPython.noop),
+    ]
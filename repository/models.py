@@ -1,7 +1,11 @@
-from django.db import models
+import uuid
+from datetime import timedelta
+from django.db import models, transaction
 from django.urls import reverse
 from django.utils import timezone
 from accounts.models import User
+from api.models import ChangeLog, TrackedModel
+from .storage import document_storage
 
 
 class Collection(models.Model):
@@ -25,8 +29,128 @@ class Collection(models.Model):
         return reverse('repository:collection_detail', kwargs={'slug': self.slug})
 
 
-class Document(models.Model):
+class StoredFileQuerySet(models.QuerySet):
+    def register(self, name, size):
+        """Record that ``name`` was just stored, before any document references it.
+
+        Restarts the grace period of an unreferenced row, so prune() leaves a
+        file alone while an upload that found it on disk acquires it.
+        """
+        if not self.filter(name=name).update(updated_at=timezone.now()):
+            self.get_or_create(name=name, defaults={'sha256': document_storage.digest(name), 'size': size})
+    
+    def acquire(self, name, size):
+        """Count one more reference to the stored file ``name``"""
+        stored, created = self.get_or_create(
+            name=name, defaults={'sha256': document_storage.digest(name), 'size': size, 'ref_count': 1}
+        )
+        if not created:
+            self.filter(pk=stored.pk).update(ref_count=models.F('ref_count') + 1, updated_at=timezone.now())
+        return stored
+    
+    def release(self, name):
+        """Drop one reference; unreferenced files are removed by prune()"""
+        self.filter(name=name, ref_count__gt=0).update(
+            ref_count=models.F('ref_count') - 1, updated_at=timezone.now()
+        )
+    
+    def prune(self, grace=timedelta(hours=24)):
+        """Delete files unreferenced for longer than ``grace``; returns the count"""
+        cutoff = timezone.now() - grace
+        pruned = 0
+        for pk in self.filter(ref_count=0, updated_at__lt=cutoff).values_list('pk', flat=True):
+            with transaction.atomic():
+                # Re-checked under the row lock: an upload of the same content
+                # registers (or acquires) the row before relying on the file.
+                stored = self.select_for_update().filter(pk=pk, ref_count=0, updated_at__lt=cutoff).first()
+                if stored:
+                    document_storage.delete(stored.name)
+                    stored.delete()
+                    pruned += 1
+        return pruned + self._prune_orphans(cutoff)
+    
+    def _prune_orphans(self, cutoff):
+        """Delete stored files without a row (e.g. the document insert failed)"""
+        pruned = 0
+        for names in document_storage.walk(older_than=cutoff):
+            known = set(self.filter(name__in=names).values_list('name', flat=True))
+            for name in names:
+                if name not in known:
+                    document_storage.delete(name)
+                    pruned += 1
+        return pruned
+
+
+class StoredFile(models.Model):
+    """A content-addressed file shared by every document with the same bytes"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    fixity_ok = models.BooleanField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = StoredFileQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "Stored File"
+        verbose_name_plural = "Stored Files"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return self.name
+
+
+def access_rule(user=None):
+    """Q object matching the documents ``user`` may open (see Document.is_accessible)"""
+    # Expired embargoes are opened by the lift_embargoes job, so 'embargoed'
+    # always means closed here and no date comparison is needed.
+    rule = models.Q(access_level='open')
+    if user is not None and user.is_authenticated:
+        rule |= models.Q(access_level='restricted')
+        if user.is_staff:
+            rule |= models.Q(access_level='private')
+        else:
+            rule |= models.Q(access_level='private', submitted_by=user)
+    return rule
+
+
+class DocumentQuerySet(models.QuerySet):
+    def accessible_to(self, user=None):
+        """Documents ``user`` may open, as one SQL predicate"""
+        return self.filter(access_rule(user))
+    
+    def embargo_expired(self, today=None):
+        """Embargoed documents whose embargo date has passed"""
+        today = today or timezone.now().date()
+        return self.filter(
+            models.Q(embargo_date__isnull=True) | models.Q(embargo_date__lte=today), access_level='embargoed'
+        )
+    
+    def lift_embargoes(self, today=None):
+        """Open every expired embargo in one UPDATE; returns the ids released"""
+        now = timezone.now()
+        with transaction.atomic():
+            released = self.embargo_expired(today).update(
+                access_level='open', released_at=now, updated_at=now,
+                last_exposed_at=models.Case(
+                    models.When(is_active=True, is_approved=True, then=models.Value(now)),
+                    default=models.F('last_exposed_at'),
+                ),
+            )
+            if not released:
+                return []
+            documents = list(self.filter(released_at=now))
+            # A bulk UPDATE skips save(), so log the changes here.
+            ChangeLog.objects.record(documents)
+            return [document.pk for document in documents]
+
+
+class Document(TrackedModel):
     """Institutional repository documents"""
+    change_resource = 'documents'
     DOCUMENT_TYPES = [
         ('thesis', 'Thesis'),
         ('dissertation', 'Dissertation'),
@@ -68,11 +192,16 @@ class Document(models.Model):
     pages = models.CharField(max_length=50, blank=True)
     
     # File and Access
-    file = models.FileField(upload_to='repository/documents/')
+    file = models.FileField(upload_to='repository/documents/', storage=document_storage, max_length=255)
     file_size = models.BigIntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, editable=False, db_index=True)  # SHA-256
     thumbnail = models.ImageField(upload_to='repository/thumbnails/', blank=True, null=True)
     access_level = models.CharField(max_length=20, choices=ACCESS_LEVELS, default='open')
     embargo_date = models.DateField(null=True, blank=True)
+    released_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    # Last saved while open to OAI-PMH harvesters; only such documents are
+    # reported to them as deleted once hidden (see repository.oai).
+    last_exposed_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     # Metadata (Dublin Core compatible)
     abstract = models.TextField(blank=True)
@@ -118,6 +247,8 @@ class Document(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DocumentQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Document"
         verbose_name_plural = "Documents"
@@ -126,23 +257,44 @@ class Document(models.Model):
             models.Index(fields=['document_type', 'is_active']),
             models.Index(fields=['department', 'year']),
             models.Index(fields=['-submission_date']),
+            models.Index(fields=['access_level', 'embargo_date']),
+            # Keyset order of OAI-PMH harvests
+            models.Index(fields=['updated_at', 'id']),
         ]
     
     def __str__(self):
         return self.title
     
+    def is_listed(self):
+        return self.is_active and self.is_approved
+    
+    def is_harvestable(self):
+        """Whether OAI-PMH harvesters see the document (repository.oai.records)"""
+        return self.is_listed() and bool(self.is_accessible(None))
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored file so save() can move its reference.
+        if 'file' in instance.__dict__:
+            instance._stored_name = instance.__dict__['file']
+        return instance
+    
     def get_absolute_url(self):
         return reverse('repository:document_detail', kwargs={'pk': self.pk})
     
     def increment_view_count(self):
         """Increment view count"""
+        # A single UPDATE, so concurrent views are not lost.
+        Document.objects.filter(pk=self.pk).update(view_count=models.F('view_count') + 1)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
     
     def increment_download_count(self):
         """Increment download count"""
+        # A single UPDATE that bypasses save(), so counters are not logged
+        # as changes.
+        Document.objects.filter(pk=self.pk).update(download_count=models.F('download_count') + 1)
         self.download_count += 1
-        self.save(update_fields=['download_count'])
     
     def is_accessible(self, user=None):
         """Check if document is accessible to user"""
@@ -151,9 +303,8 @@ class Document(models.Model):
         if self.access_level == 'private':
             return user and (user == self.submitted_by or user.is_staff)
         if self.access_level == 'embargoed':
-            if not self.embargo_date:
-                return True
-            return timezone.now().date() >= self.embargo_date
+            # Opened by lift_embargoes once embargo_date has passed
+            return False
         if self.access_level == 'restricted':
             return user and user.is_authenticated
         return False
@@ -162,10 +313,93 @@ class Document(models.Model):
         # Auto-set year from publication_date if not set
         if not self.year and self.publication_date:
             self.year = self.publication_date.year
-        # Auto-set file_size if file exists
-        if self.file and not self.file_size:
+        if self.is_harvestable():
+            self.last_exposed_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'last_exposed_at'}
+        if self.file and not self.file._committed:
+            # Store the upload first so its size and checksum are saved with the row
+            size = self.file.size
+            self.file.save(self.file.name, self.file.file, save=False)
+            self.file_size = size
+            self.checksum = document_storage.digest(self.file.name) or ''
+        elif self.file and not self.file_size:
+            # Files stored before checksums were recorded
             try:
                 self.file_size = self.file.size
-            except:
+            except OSError:
                 pass
-        super().save(*args, **kwargs)
+        
+        current = self.file.name or None
+        # A loaded document with the file deferred keeps its reference.
+        previous = None if self._state.adding else getattr(self, '_stored_name', current)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if current != previous:
+                if current and document_storage.digest(current):
+                    StoredFile.objects.acquire(current, self.file_size)
+                if previous:
+                    StoredFile.objects.release(previous)
+        self._stored_name = current
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked upload of a document's file (see repository.uploads)"""
+    STATUS_CHOICES = [
+        ('open', 'Receiving chunks'),
+        ('assembling', 'Assembling'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # Expected digest of the whole file
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    error = models.CharField(max_length=255, blank=True)
+    stored_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+    
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+    
+    def chunk_length(self, index):
+        """Expected byte length of chunk ``index``"""
+        if index == self.chunk_count - 1:
+            return self.size - index * self.chunk_size
+        return self.chunk_size
+
+
+class UploadChunk(models.Model):
+    """A received chunk of an upload session"""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Upload Chunk"
+        verbose_name_plural = "Upload Chunks"
+        ordering = ['session', 'index']
+        unique_together = [['session', 'index']]
+    
+    def __str__(self):
+        return f"{self.session_id} #{self.index}"
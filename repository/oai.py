@@ -0,0 +1,403 @@
+"""
+OAI-PMH 2.0 data provider for the institutional repository.
+
+Records are the approved, active, open-access documents, exposed as
+``oai_dc``; sets are collections (setSpec = collection slug). Documents that
+drop out (deleted, withdrawn, made private or embargoed) are listed as
+deleted records, dated by their latest entry in the change log. Lists are
+paged by keyset on ``(updated_at, id)``: the signed resumption token carries
+the last key of the previous page, so every page is one indexed range query
+however deep a harvest goes, and nothing is held between requests.
+
+Responses are streamed. Each ``<record>`` is rendered once and cached under
+a key that includes the document's ``updated_at`` and collection, so a
+harvest only loads and renders documents changed since they were last
+served.
+"""
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from xml.sax.saxutils import escape, quoteattr
+import mimetypes
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Exists, Min, OuterRef, Q
+
+from api.models import ChangeLog
+from .models import Collection, Document
+
+PROTOCOL_VERSION = '2.0'
+GRANULARITY = 'YYYY-MM-DDThh:mm:ssZ'
+TOKEN_SALT = 'repository.oai.resumption'
+
+OAI_DC = {
+    'metadataPrefix': 'oai_dc',
+    'schema': 'http://www.openarchives.org/OAI/2.0/oai_dc.xsd',
+    'metadataNamespace': 'http://www.openarchives.org/OAI/2.0/oai_dc/',
+}
+
+# Arguments each verb accepts: (required, optional, exclusive)
+VERBS = {
+    'Identify': (set(), set(), None),
+    'ListMetadataFormats': (set(), {'identifier'}, None),
+    'ListSets': (set(), set(), 'resumptionToken'),
+    'GetRecord': ({'identifier', 'metadataPrefix'}, set(), None),
+    'ListIdentifiers': ({'metadataPrefix'}, {'from', 'until', 'set'}, 'resumptionToken'),
+    'ListRecords': ({'metadataPrefix'}, {'from', 'until', 'set'}, 'resumptionToken'),
+}
+
+# Characters XML 1.0 does not allow, occasionally pasted into abstracts.
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+class OAIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _text(value):
+    return escape(_INVALID_XML.sub('', str(value)))
+
+
+def _datestamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_date(value, end_of_day=False):
+    """Parse a from/until argument; returns (datetime, granularity)"""
+    for fmt, granularity in (('%Y-%m-%dT%H:%M:%SZ', 'seconds'), ('%Y-%m-%d', 'day')):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if granularity == 'day' and end_of_day:
+            parsed = datetime.combine(parsed.date(), dt_time.max)
+        return parsed.replace(tzinfo=dt_timezone.utc), granularity
+    raise OAIError('badArgument', f'Invalid date: {value}')
+
+
+def identifier(pk):
+    return f'oai:{settings.OAI_REPOSITORY_IDENTIFIER}:document/{pk}'
+
+
+def _document_id(value):
+    prefix = f'oai:{settings.OAI_REPOSITORY_IDENTIFIER}:document/'
+    if value.startswith(prefix) and value[len(prefix):].isdigit():
+        return int(value[len(prefix):])
+    return None
+
+
+def records():
+    """Documents exposed to harvesters"""
+    return Document.objects.filter(is_active=True, is_approved=True).accessible_to(None)
+
+
+def deleted_records():
+    """Latest change log entry of every document harvesters saw but can no longer see.
+
+    Documents that were never open to harvesters (private, unapproved or
+    still embargoed since submission) have no ``last_exposed_at`` and are
+    left out. Compaction keeps the newest entry per document, so a deletion
+    stays visible until the document changes again; older history is not
+    kept, hence ``deletedRecord`` is ``transient``.
+    """
+    newer = ChangeLog.objects.filter(
+        resource=Document.change_resource, object_id=OuterRef('object_id'), pk__gt=OuterRef('pk')
+    )
+    return ChangeLog.objects.filter(
+        resource=Document.change_resource, payload__last_exposed_at__isnull=False,
+    ).filter(~Exists(newer)).exclude(
+        payload__last_exposed_at=None,
+    ).exclude(object_id__in=records().values('pk'))
+
+
+def _header(pk, updated_at, collection_slug, deleted=False):
+    set_spec = f'<setSpec>{_text(collection_slug)}</setSpec>' if collection_slug else ''
+    status = ' status="deleted"' if deleted else ''
+    return (
+        f'<header{status}><identifier>{identifier(pk)}</identifier>'
+        f'<datestamp>{_datestamp(updated_at)}</datestamp>{set_spec}</header>'
+    )
+
+
+def _dc(document, base_url):
+    elements = [('title', document.title + (f': {document.subtitle}' if document.subtitle else ''))]
+    elements.append(('creator', document.author))
+    if document.supervisor:
+        elements.append(('contributor', document.supervisor))
+    subjects = {part.strip() for part in f'{document.subject},{document.keywords}'.split(',') if part.strip()}
+    elements.extend(('subject', subject) for subject in sorted(subjects))
+    if document.abstract:
+        elements.append(('description', document.abstract))
+    elements.append(('publisher', document.publisher or settings.LIBRARY_NAME))
+    if document.publication_date:
+        elements.append(('date', document.publication_date.isoformat()))
+    elif document.year:
+        elements.append(('date', str(document.year)))
+    elements.append(('type', document.get_document_type_display()))
+    content_type = mimetypes.guess_type(document.file.name)[0] if document.file else None
+    if content_type:
+        elements.append(('format', content_type))
+    elements.append(('identifier', f'{base_url}{document.get_absolute_url()}'))
+    if document.doi:
+        elements.append(('identifier', f'https://doi.org/{document.doi}'))
+    if document.isbn:
+        elements.append(('identifier', f'urn:isbn:{document.isbn}'))
+    if document.issn:
+        elements.append(('identifier', f'urn:issn:{document.issn}'))
+    if document.journal_name:
+        elements.append(('source', document.journal_name))
+    if document.language:
+        elements.append(('language', document.language))
+    for rights in (document.license, document.rights_statement):
+        if rights:
+            elements.append(('rights', rights))
+    return (
+        '<oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://www.openarchives.org/OAI/2.0/oai_dc/ '
+        'http://www.openarchives.org/OAI/2.0/oai_dc.xsd">'
+        + ''.join(f'<dc:{name}>{_text(value)}</dc:{name}>' for name, value in elements)
+        + '</oai_dc:dc>'
+    )
+
+
+def render_record(document, base_url):
+    return (
+        f'<record>{_header(document.pk, document.updated_at, document.collection.slug if document.collection else None)}'
+        f'<metadata>{_dc(document, base_url)}</metadata></record>'
+    )
+
+
+def fragment_key(pk, updated_at, collection_slug, base_url):
+    return f'oai:record:{base_url}:{pk}:{updated_at.timestamp()}:{collection_slug or ""}'
+
+
+def _render_records(keys, base_url):
+    """Record fragments for (pk, updated_at, collection_slug) keys, in order"""
+    cache_keys = [fragment_key(*key, base_url) for key in keys]
+    cached = cache.get_many(cache_keys)
+    missing = [key[0] for key, cache_key in zip(keys, cache_keys) if cache_key not in cached]
+    if missing:
+        rendered = {}
+        for document in Document.objects.filter(pk__in=missing).select_related('collection'):
+            slug = document.collection.slug if document.collection else None
+            rendered[fragment_key(document.pk, document.updated_at, slug, base_url)] = render_record(document, base_url)
+        cache.set_many(rendered, settings.OAI_FRAGMENT_TIMEOUT)
+        cached.update(rendered)
+    return [cached.get(cache_key, '') for cache_key in cache_keys]
+
+
+class Request:
+    """One OAI-PMH request: validates its arguments, then yields the response"""
+
+    def __init__(self, params, base_url, endpoint):
+        self.params = params
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.verb = None
+        self.args = {}
+
+    def response(self):
+        """Iterator over the XML response, errors included"""
+        try:
+            body = self._dispatch()
+        except OAIError as error:
+            return self._envelope(iter([
+                f'<error code="{error.code}">{_text(error.message)}</error>'
+            ]), error.code in ('badVerb', 'badArgument'))
+        return self._envelope(body)
+
+    def _envelope(self, body, bare_request=False):
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://www.openarchives.org/OAI/2.0/ '
+            'http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd">'
+            f'<responseDate>{_datestamp(datetime.now(dt_timezone.utc))}</responseDate>'
+        )
+        if bare_request:
+            yield f'<request>{_text(self.endpoint)}</request>'
+        else:
+            attributes = ''.join(f' {name}={quoteattr(value)}' for name, value in [('verb', self.verb)] + sorted(self.args.items()))
+            yield f'<request{attributes}>{_text(self.endpoint)}</request>'
+        yield from body
+        yield '</OAI-PMH>\n'
+
+    def _dispatch(self):
+        verbs = self.params.getlist('verb')
+        if len(verbs) != 1 or verbs[0] not in VERBS:
+            raise OAIError('badVerb', 'Illegal or missing verb')
+        self.verb = verbs[0]
+        required, optional, exclusive = VERBS[self.verb]
+        allowed = required | optional | ({exclusive} if exclusive else set())
+        for name in self.params:
+            if name == 'verb':
+                continue
+            values = self.params.getlist(name)
+            if name not in allowed or len(values) != 1:
+                raise OAIError('badArgument', f'Illegal or repeated argument: {name}')
+            self.args[name] = values[0]
+        if exclusive and exclusive in self.args:
+            if len(self.args) != 1:
+                raise OAIError('badArgument', f'{exclusive} is an exclusive argument')
+        elif not required <= set(self.args):
+            raise OAIError('badArgument', f'Missing argument(s): {", ".join(sorted(required - set(self.args)))}')
+        return getattr(self, f'_{self.verb}')()
+
+    def _check_prefix(self, prefix):
+        if prefix != OAI_DC['metadataPrefix']:
+            raise OAIError('cannotDisseminateFormat', f'Unsupported metadata format: {prefix}')
+
+    def _Identify(self):
+        earliest = [
+            records().aggregate(earliest=Min('updated_at'))['earliest'],
+            deleted_records().aggregate(earliest=Min('created_at'))['earliest'],
+        ]
+        earliest = min(filter(None, earliest), default=None)
+        earliest = _datestamp(earliest) if earliest else '1970-01-01T00:00:00Z'
+        return iter([
+            '<Identify>'
+            f'<repositoryName>{_text(settings.OAI_REPOSITORY_NAME)}</repositoryName>'
+            f'<baseURL>{_text(self.endpoint)}</baseURL>'
+            f'<protocolVersion>{PROTOCOL_VERSION}</protocolVersion>'
+            f'<adminEmail>{_text(settings.OAI_ADMIN_EMAIL)}</adminEmail>'
+            f'<earliestDatestamp>{earliest}</earliestDatestamp>'
+            '<deletedRecord>transient</deletedRecord>'
+            f'<granularity>{GRANULARITY}</granularity>'
+            '</Identify>'
+        ])
+
+    def _ListMetadataFormats(self):
+        if 'identifier' in self.args:
+            pk = _document_id(self.args['identifier'])
+            if pk is None or not records().filter(pk=pk).exists():
+                raise OAIError('idDoesNotExist', f'No such record: {self.args["identifier"]}')
+        return iter([
+            '<ListMetadataFormats><metadataFormat>'
+            + ''.join(f'<{name}>{_text(value)}</{name}>' for name, value in OAI_DC.items())
+            + '</metadataFormat></ListMetadataFormats>'
+        ])
+
+    def _ListSets(self):
+        if 'resumptionToken' in self.args:
+            raise OAIError('badResumptionToken', 'ListSets is not paged')
+        collections = Collection.objects.filter(is_active=True).order_by('display_order', 'name')
+        return iter([
+            '<ListSets>'
+            + ''.join(
+                f'<set><setSpec>{_text(collection.slug)}</setSpec><setName>{_text(collection.name)}</setName></set>'
+                for collection in collections
+            )
+            + '</ListSets>'
+        ])
+
+    def _GetRecord(self):
+        self._check_prefix(self.args['metadataPrefix'])
+        pk = _document_id(self.args['identifier'])
+        row = records().filter(pk=pk).values_list('pk', 'updated_at', 'collection__slug').first() if pk else None
+        if row is not None:
+            return iter(['<GetRecord>', *_render_records([row], self.base_url), '</GetRecord>'])
+        deleted_at = deleted_records().filter(object_id=pk).values_list('created_at', flat=True).first() if pk else None
+        if deleted_at is None:
+            raise OAIError('idDoesNotExist', f'No such record: {self.args["identifier"]}')
+        return iter([f'<GetRecord><record>{_header(pk, deleted_at, None, deleted=True)}</record></GetRecord>'])
+
+    def _ListIdentifiers(self):
+        return self._list(full=False)
+
+    def _ListRecords(self):
+        return self._list(full=True)
+
+    def _list(self, full):
+        if 'resumptionToken' in self.args:
+            state = self._load_token(self.args['resumptionToken'])
+        else:
+            self._check_prefix(self.args['metadataPrefix'])
+            state = {'from': self.args.get('from'), 'until': self.args.get('until'), 'set': self.args.get('set'), 'cursor': 0}
+
+        queryset = records()
+        deletions = deleted_records()
+        granularities = set()
+        if state['from']:
+            since, granularity = _parse_date(state['from'])
+            granularities.add(granularity)
+            queryset = queryset.filter(updated_at__gte=since)
+            deletions = deletions.filter(created_at__gte=since)
+        if state['until']:
+            until, granularity = _parse_date(state['until'], end_of_day=True)
+            granularities.add(granularity)
+            queryset = queryset.filter(updated_at__lte=until)
+            deletions = deletions.filter(created_at__lte=until)
+        if len(granularities) > 1:
+            raise OAIError('badArgument', 'from and until must have the same granularity')
+        if state['set']:
+            queryset = queryset.filter(collection__slug=state['set'])
+            deletions = deletions.filter(
+                payload__collection_id__in=Collection.objects.filter(slug=state['set']).values('pk')
+            )
+        if state['cursor'] == 0:
+            state['total'] = queryset.count() + deletions.count()
+            if not state['total']:
+                raise OAIError('noRecordsMatch', 'No records match the request')
+
+        if 'after' in state:
+            after = datetime.fromisoformat(state['after'][0])
+            queryset = queryset.filter(Q(updated_at__gt=after) | Q(updated_at=after, pk__gt=state['after'][1]))
+            deletions = deletions.filter(Q(created_at__gt=after) | Q(created_at=after, object_id__gt=state['after'][1]))
+        size = settings.OAI_PAGE_SIZE
+        # A document is either a record or a deletion, so (datestamp, id)
+        # orders both lists as one. One row more than a page tells whether
+        # another page follows.
+        keys = [
+            (pk, updated_at, slug, False)
+            for pk, updated_at, slug in queryset.order_by('updated_at', 'pk').values_list('pk', 'updated_at', 'collection__slug')[:size + 1]
+        ] + [
+            (pk, created_at, None, True)
+            for pk, created_at in deletions.order_by('created_at', 'object_id').values_list('object_id', 'created_at')[:size + 1]
+        ]
+        keys = sorted(keys, key=lambda key: (key[1], key[0]))[:size + 1]
+        more = len(keys) > size
+        keys = keys[:size]
+        return self._stream_list(keys, state, more, full)
+
+    def _stream_list(self, keys, state, more, full):
+        tag = 'ListRecords' if full else 'ListIdentifiers'
+        yield f'<{tag}>'
+        if full:
+            # Fragments in chunks keep cache round trips and memory small.
+            for start in range(0, len(keys), 50):
+                chunk = keys[start:start + 50]
+                rendered = iter(_render_records([key[:3] for key in chunk if not key[3]], self.base_url))
+                yield ''.join(
+                    f'<record>{_header(*key)}</record>' if key[3] else next(rendered)
+                    for key in chunk
+                )
+        else:
+            yield ''.join(_header(*key) for key in keys)
+        cursor = state['cursor']
+        if more or cursor:
+            token = ''
+            if more:
+                last_pk, last_updated = keys[-1][:2]
+                token = signing.dumps({
+                    'from': state['from'], 'until': state['until'], 'set': state['set'],
+                    'total': state['total'], 'cursor': cursor + len(keys),
+                    'after': [last_updated.isoformat(), last_pk],
+                }, salt=TOKEN_SALT, compress=True)
+            yield (
+                f'<resumptionToken completeListSize="{state["total"]}" cursor="{cursor}">'
+                f'{_text(token)}</resumptionToken>'
+            )
+        yield f'</{tag}>'
+
+    def _load_token(self, token):
+        try:
+            return signing.loads(token, salt=TOKEN_SALT, max_age=settings.OAI_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            raise OAIError('badResumptionToken', 'Invalid or expired resumption token')
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Document, StoredFile
+
+
+@receiver(post_delete, sender=Document)
+def release_stored_file(sender, instance, **kwargs):
+    """Drop the deleted document's reference to its stored file"""
+    if instance.file:
+        StoredFile.objects.release(instance.file.name)
@@ -0,0 +1,117 @@
+"""
+Content-addressed storage for repository uploads.
+
+Uploads are hashed (SHA-256) while they are streamed to a temporary file
+and then renamed to ``<prefix>/ab/cd/<digest><ext>``, so identical files
+share one copy on disk and the checksum is known as soon as the upload is
+stored. ``StoredFile`` rows count the documents referencing each copy;
+a row is registered as soon as a file is stored, so ``prune()`` can tell
+a file that is about to be referenced from one nobody will reference.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 1024 * 1024
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def file_digest(handle, chunk_size=CHUNK_SIZE):
+    """SHA-256 hex digest and size of an open binary file"""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := handle.read(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files after their SHA-256 digest"""
+
+    def __init__(self, prefix='repository/cas', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix.strip('/')
+
+    def content_name(self, digest, ext=''):
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def digest(self, name):
+        """The digest encoded in ``name``, or None for files stored elsewhere"""
+        if not name or not name.startswith(f'{self.prefix}/'):
+            return None
+        stem = os.path.splitext(os.path.basename(name))[0]
+        return stem if DIGEST_RE.match(stem) else None
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, see _save().
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        tmp_dir = os.path.dirname(self.work_path('upload'))
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+
+        return self.commit(tmp.name, digest.hexdigest(), ext)
+
+    def commit(self, path, digest, ext=''):
+        """Move the local file ``path`` with SHA-256 ``digest`` into place; returns its name"""
+        name = self.content_name(digest, ext.lower())
+        target = self.path(name)
+        # Registered before the file is checked, so a concurrent prune
+        # either sees the fresh row or has already removed the file.
+        apps.get_model('repository', 'StoredFile').objects.register(name, os.path.getsize(path))
+        if os.path.exists(target):
+            # Same content already stored: keep the existing copy, and
+            # touch it so the orphan sweep does not take it meanwhile.
+            os.unlink(path)
+            os.utime(target)
+            return name
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        # Atomic on one file system; a concurrent upload of the same
+        # content replaces it with identical bytes.
+        os.replace(path, target)
+        return name
+
+    def walk(self, older_than):
+        """Lists of stored names, one per directory, last modified before ``older_than``"""
+        cutoff = older_than.timestamp()
+        root = self.path(self.prefix)
+        for directory, subdirs, files in os.walk(root):
+            if directory == root:
+                subdirs[:] = [subdir for subdir in subdirs if subdir != 'tmp']
+            names = [
+                f'{self.prefix}/{os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, "/")}'
+                for filename in files
+                if os.path.getmtime(os.path.join(directory, filename)) < cutoff
+            ]
+            if names:
+                yield names
+
+    def work_path(self, name):
+        """Path for in-progress files, on the same file system as the store"""
+        path = self.path(f'{self.prefix}/tmp/{name}')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+
+document_storage = ContentAddressedStorage()
@@ -1,3 +1,312 @@
+import hashlib
+import io
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from api.models import ChangeLog
+from unimaid_library.testing import TemporaryMediaMixin
+from . import oai, uploads
+from .models import Document, StoredFile, UploadSession
+from .storage import document_storage
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class RepositoryTestCase(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='author', password='secret')
+        cls.reader = User.objects.create_user(username='reader', password='secret')
+        cls.staff = User.objects.create_user(username='librarian', password='secret', is_staff=True)
+
+    def make_document(self, content=b'%PDF-1.4 thesis', **fields):
+        fields.setdefault('title', 'Groundwater in the Lake Chad Basin')
+        fields.setdefault('submitted_by', self.owner)
+        fields.setdefault('is_approved', True)
+        return Document.objects.create(
+            document_type='thesis', author='A. Bukar',
+            file=ContentFile(content, name='thesis.pdf'), **fields
+        )
+
+
+class AccessRuleTests(RepositoryTestCase):
+    def test_queryset_rule_matches_is_accessible(self):
+        documents = [
+            self.make_document(title=level, access_level=level)
+            for level, _ in Document.ACCESS_LEVELS
+        ]
+        for user in (None, self.owner, self.reader, self.staff):
+            with self.subTest(user=user):
+                visible = set(Document.objects.accessible_to(user).values_list('pk', flat=True))
+                expected = {document.pk for document in documents if document.is_accessible(user)}
+                self.assertEqual(visible, expected)
+
+    def test_levels_per_user(self):
+        private = self.make_document(access_level='private')
+        restricted = self.make_document(access_level='restricted')
+
+        self.assertNotIn(restricted, Document.objects.accessible_to(None))
+        self.assertIn(restricted, Document.objects.accessible_to(self.reader))
+        self.assertNotIn(private, Document.objects.accessible_to(self.reader))
+        self.assertIn(private, Document.objects.accessible_to(self.owner))
+        self.assertIn(private, Document.objects.accessible_to(self.staff))
+
+
+class EmbargoTests(RepositoryTestCase):
+    def test_embargo_is_closed_until_lifted(self):
+        today = timezone.now().date()
+        past = self.make_document(access_level='embargoed', embargo_date=today - timedelta(days=1))
+        undated = self.make_document(access_level='embargoed')
+        future = self.make_document(access_level='embargoed', embargo_date=today + timedelta(days=30))
+        self.assertFalse(Document.objects.accessible_to(self.staff).filter(pk=past.pk).exists())
+
+        call_command('lift_embargoes', stdout=io.StringIO())
+
+        open_ids = set(Document.objects.accessible_to(None).values_list('pk', flat=True))
+        self.assertIn(past.pk, open_ids)
+        self.assertIn(undated.pk, open_ids)
+        self.assertNotIn(future.pk, open_ids)
+        self.assertTrue(ChangeLog.objects.filter(resource='documents', object_id=past.pk, payload__access_level='open').exists())
+
+
+class OAIDeletedRecordTests(RepositoryTestCase):
+    def test_closed_documents_are_deleted_records(self):
+        document = self.make_document()
+        self.assertFalse(oai.deleted_records().filter(object_id=document.pk).exists())
+
+        document.access_level = 'private'
+        document.save()
+
+        self.assertTrue(oai.deleted_records().filter(object_id=document.pk).exists())
+        self.assertFalse(oai.records().filter(pk=document.pk).exists())
+
+    def test_never_public_documents_are_not_listed(self):
+        private = self.make_document(title='Draft thesis', access_level='private')
+        unapproved = self.make_document(title='Pending thesis', is_approved=False)
+        embargoed = self.make_document(
+            title='Embargoed thesis', access_level='embargoed', embargo_date=timezone.now().date() + timedelta(days=30)
+        )
+        private.title = 'Draft thesis (revised)'
+        private.save()
+        unapproved.delete()
+        visible = self.make_document(title='Open thesis')
+
+        response = self.client.get(reverse('repository:oai'), {'verb': 'ListIdentifiers', 'metadataPrefix': 'oai_dc'})
+
+        self.assertContains(response, oai.identifier(visible.pk))
+        for document in (private, unapproved, embargoed):
+            self.assertNotContains(response, f'<identifier>{oai.identifier(document.pk)}</identifier>')
+        self.assertFalse(oai.deleted_records().exists())
+
+    def test_lifted_embargo_is_deleted_record_when_closed_again(self):
+        document = self.make_document(access_level='embargoed', embargo_date=timezone.now().date())
+        Document.objects.lift_embargoes()
+        document.refresh_from_db()
+        self.assertIsNotNone(document.last_exposed_at)
+
+        document.access_level = 'private'
+        document.save()
+
+        self.assertTrue(oai.deleted_records().filter(object_id=document.pk).exists())
+
+
+class StoredFileTests(RepositoryTestCase):
+    def stored(self, document):
+        return StoredFile.objects.get(name=document.file.name)
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.make_document()
+        second = self.make_document()
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.checksum, sha256(b'%PDF-1.4 thesis'))
+        self.assertEqual(self.stored(first).ref_count, 2)
+
+    def test_replacing_and_deleting_release_references(self):
+        first = self.make_document()
+        second = self.make_document()
+        shared = first.file.name
+
+        second.file = ContentFile(b'%PDF-1.4 revised', name='revised.pdf')
+        second.save()
+        self.assertEqual(StoredFile.objects.get(name=shared).ref_count, 1)
+        self.assertEqual(self.stored(second).ref_count, 1)
+
+        first.delete()
+        self.assertEqual(StoredFile.objects.get(name=shared).ref_count, 0)
+
+    def test_prune_removes_unreferenced_files_after_grace(self):
+        document = self.make_document()
+        name = document.file.name
+        document.delete()
+
+        self.assertEqual(StoredFile.objects.prune(), 0)
+        StoredFile.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(StoredFile.objects.prune(), 1)
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(document_storage.exists(name))
+
+    def test_prune_keeps_file_registered_by_a_new_upload(self):
+        document = self.make_document()
+        name = document.file.name
+        document.delete()
+        StoredFile.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(days=2))
+
+        # A re-upload of the same bytes registers the row before the document is saved.
+        document_storage.save('again.pdf', ContentFile(b'%PDF-1.4 thesis'))
+
+        self.assertEqual(StoredFile.objects.prune(), 0)
+        self.assertTrue(document_storage.exists(name))
+
+    def test_prune_removes_orphaned_files(self):
+        name = document_storage.save('orphan.pdf', ContentFile(b'never referenced'))
+        StoredFile.objects.filter(name=name).delete()
+        path = document_storage.path(name)
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(path, (old, old))
+
+        self.assertEqual(StoredFile.objects.prune(), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+@mock.patch('repository.uploads.fire_and_forget')
+class UploadTests(RepositoryTestCase):
+    data = bytes(range(256)) * 40
+
+    def setUp(self):
+        self.document = self.make_document()
+
+    def open_session(self, **kwargs):
+        with self.settings(UPLOAD_CHUNK_SIZE=4096):
+            return uploads.open_session(self.owner, self.document, 'final.pdf', len(self.data), **kwargs)
+
+    def chunk(self, session, index):
+        return self.data[index * session.chunk_size:(index + 1) * session.chunk_size]
+
+    def send(self, session, index, data=None, checksum=None):
+        data = self.chunk(session, index) if data is None else data
+        uploads.write_chunk(session, index, io.BytesIO(data), len(data), checksum or sha256(data))
+
+    def assemble(self, session):
+        uploads.complete(session)
+        uploads._assemble(session.pk)
+        session.refresh_from_db()
+        return session
+
+    def test_chunks_in_any_order_with_resume(self, fire_and_forget):
+        session = self.open_session(sha256=sha256(self.data))
+        self.assertEqual(session.chunk_count, 3)
+        self.send(session, 2)
+        self.send(session, 0)
+        self.assertEqual(uploads.missing_chunks(session), [1])
+        with self.assertRaises(uploads.UploadError) as error:
+            uploads.complete(session)
+        self.assertEqual(error.exception.status, 409)
+
+        self.send(session, 1)
+        session = self.assemble(session)
+
+        self.assertEqual(session.status, 'complete')
+        fire_and_forget.assert_called_once()
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.checksum, sha256(self.data))
+        with self.document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_corrupt_resend_keeps_accepted_chunk(self, fire_and_forget):
+        session = self.open_session()
+        for index in range(session.chunk_count):
+            self.send(session, index)
+        good = self.chunk(session, 0)
+
+        with self.assertRaises(uploads.UploadError) as error:
+            self.send(session, 0, data=b'x' * len(good), checksum=sha256(good))
+        self.assertEqual(error.exception.status, 422)
+
+        self.assertEqual(self.assemble(session).status, 'complete')
+
+    def test_short_or_wrong_sized_chunk_is_rejected(self, fire_and_forget):
+        session = self.open_session()
+        chunk = self.chunk(session, 0)
+        with self.assertRaises(uploads.UploadError):
+            uploads.write_chunk(session, 0, io.BytesIO(chunk[:10]), len(chunk), sha256(chunk))
+        with self.assertRaises(uploads.UploadError):
+            self.send(session, 0, data=chunk[:10])
+        self.assertEqual(uploads.missing_chunks(session), [0, 1, 2])
+
+    def test_in_order_upload_is_not_read_back(self, fire_and_forget):
+        session = self.open_session(sha256=sha256(self.data))
+        for index in range(session.chunk_count):
+            self.send(session, index)
+        self.send(session, 1)
+
+        with mock.patch('repository.uploads.file_digest') as file_digest:
+            session = self.assemble(session)
+
+        self.assertEqual(session.status, 'complete')
+        file_digest.assert_not_called()
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.checksum, sha256(self.data))
+
+    def test_out_of_order_upload_is_hashed_once(self, fire_and_forget):
+        session = self.open_session()
+        for index in reversed(range(session.chunk_count)):
+            self.send(session, index)
+
+        with mock.patch('repository.uploads.file_digest', wraps=uploads.file_digest) as file_digest:
+            session = self.assemble(session)
+
+        self.assertEqual(session.status, 'complete')
+        file_digest.assert_called_once()
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.checksum, sha256(self.data))
+
+    def test_tampered_part_file_fails_assembly(self, fire_and_forget):
+        session = self.open_session(sha256=sha256(self.data))
+        for index in reversed(range(session.chunk_count)):
+            self.send(session, index)
+        with open(uploads.part_path(session), 'r+b') as part:
+            part.write(b'tampered')
+
+        session = self.assemble(session)
+
+        self.assertEqual(session.status, 'failed')
+        self.document.refresh_from_db()
+        self.assertNotEqual(self.document.checksum, sha256(self.data))
+
+    def test_declared_digest_mismatch_fails(self, fire_and_forget):
+        session = self.open_session(sha256=sha256(b'something else'))
+        for index in range(session.chunk_count):
+            self.send(session, index)
+
+        self.assertEqual(self.assemble(session).status, 'failed')
+
+    def test_stalled_assembly_can_be_aborted_and_cleaned_up(self, fire_and_forget):
+        session = self.open_session()
+        for index in range(session.chunk_count):
+            self.send(session, index)
+        uploads.complete(session)
+        with self.assertRaises(uploads.UploadError):
+            uploads.abort(session)
+
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        session.refresh_from_db()
+        self.assertTrue(uploads.is_stalled(session))
+        uploads.cleanup()
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'failed')
 
-# Create your tests here.
+        uploads.abort(session)
+        self.assertFalse(UploadSession.objects.filter(pk=session.pk).exists())
+        self.assertFalse(os.path.exists(uploads.part_path(session)))
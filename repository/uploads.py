@@ -0,0 +1,231 @@
+"""
+Resumable, chunked uploads of large repository files.
+
+A client opens an ``UploadSession`` for a document and PUTs the file in
+fixed-size chunks, each with its SHA-256. Chunks may arrive in any order,
+in parallel and more than once (after a dropped connection the client asks
+which chunks are missing and sends only those). Every chunk is written
+straight to its offset in one preallocated part file, so completing the
+upload needs no assembly copy: the part file is renamed into the
+content-addressed store in the background.
+
+Chunks are verified against their SHA-256 before they are written and are
+not read again. The digest of the whole file, which names it in the store,
+is extended chunk by chunk while a process receives the chunks in order;
+only when chunks arrived out of order or through several processes is the
+part file hashed at assembly.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from unimaid_library.concurrency import fire_and_forget
+from .models import UploadChunk, UploadSession
+from .storage import CHUNK_SIZE, document_storage, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Session id -> (next chunk index, SHA-256 of the chunks before it, their digests)
+_running = {}
+_running_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """A request the upload session cannot accept; ``status`` is the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def part_path(session):
+    return document_storage.work_path(f'{session.pk}.part')
+
+
+def open_session(user, document, filename, size, sha256=''):
+    """Start an upload of ``size`` bytes that will replace ``document.file``"""
+    if size <= 0 or size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f'Size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes.')
+    session = UploadSession.objects.create(
+        user=user, document=document, filename=os.path.basename(filename),
+        size=size, chunk_size=settings.UPLOAD_CHUNK_SIZE, sha256=sha256.lower(),
+    )
+    # Sparse where the file system supports it; chunks fill in the holes.
+    with open(part_path(session), 'wb') as part:
+        part.truncate(size)
+    return session
+
+
+def write_chunk(session, index, stream, length, checksum):
+    """Write chunk ``index`` read from ``stream`` after checking its SHA-256"""
+    if session.status != 'open':
+        raise UploadError(f'Upload is {session.get_status_display().lower()}.', status=409)
+    if not 0 <= index < session.chunk_count:
+        raise UploadError(f'Chunk index must be between 0 and {session.chunk_count - 1}.')
+    expected = session.chunk_length(index)
+    if length != expected:
+        raise UploadError(f'Chunk {index} must be {expected} bytes, not {length}.')
+
+    # Buffered and checked before it reaches the part file, so a corrupt
+    # resend cannot overwrite a chunk that was already accepted.
+    running = _running_digest(session, index)
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE, dir=os.path.dirname(part_path(session))) as buffer:
+        digest = hashlib.sha256()
+        written = 0
+        while written < expected:
+            block = stream.read(min(CHUNK_SIZE, expected - written))
+            if not block:
+                break
+            digest.update(block)
+            if running is not None:
+                running.update(block)
+            buffer.write(block)
+            written += len(block)
+        if written != expected:
+            raise UploadError(f'Chunk {index} ended after {written} of {expected} bytes.')
+        if digest.hexdigest() != checksum.lower():
+            raise UploadError(f'Checksum mismatch for chunk {index}.', status=422)
+
+        buffer.seek(0)
+        # Each request writes through its own handle, so chunks of one
+        # session can be accepted concurrently without locking.
+        with open(part_path(session), 'r+b') as part:
+            part.seek(index * session.chunk_size)
+            shutil.copyfileobj(buffer, part, CHUNK_SIZE)
+
+    _advance(session, index, checksum.lower(), running)
+    UploadChunk.objects.update_or_create(
+        session=session, index=index, defaults={'size': written, 'sha256': checksum.lower()}
+    )
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+
+
+def _running_digest(session, index):
+    """A copy of the session's running digest when chunk ``index`` extends it"""
+    with _running_lock:
+        state = _running.get(session.pk)
+        next_index, digest = (state[0], state[1]) if state else (0, None)
+        if index != next_index:
+            return None
+        return digest.copy() if digest else hashlib.sha256()
+
+
+def _advance(session, index, checksum, running):
+    with _running_lock:
+        next_index, _, digests = _running.get(session.pk) or (0, None, [])
+        if running is not None and index == next_index:
+            _running[session.pk] = (index + 1, running, digests + [checksum])
+        elif index < next_index and digests[index] != checksum:
+            # A chunk already in the running digest was replaced.
+            del _running[session.pk]
+
+
+def missing_chunks(session):
+    received = set(session.chunks.values_list('index', flat=True))
+    return [index for index in range(session.chunk_count) if index not in received]
+
+
+def complete(session):
+    """Queue assembly once every chunk has been received"""
+    missing = missing_chunks(session)
+    if missing:
+        raise UploadError(f'{len(missing)} chunk(s) missing.', status=409)
+    # Only the first completion request starts the assembly.
+    if UploadSession.objects.filter(pk=session.pk, status='open').update(status='assembling', updated_at=timezone.now()):
+        fire_and_forget(_assemble, session.pk)
+    session.refresh_from_db()
+    return session
+
+
+def _assemble(pk):
+    session = UploadSession.objects.select_related('document').get(pk=pk)
+    try:
+        _commit(session)
+    except Exception as e:
+        logger.exception('Assembling upload %s failed', pk)
+        _fail(session, f'Assembly failed: {e}'[:255])
+
+
+def _commit(session):
+    path = part_path(session)
+    size = os.path.getsize(path)
+    digest = _digest(session, path)
+    if size != session.size or (session.sha256 and digest != session.sha256):
+        os.unlink(path)
+        _fail(session, 'Assembled file does not match the declared size or checksum.')
+        return
+
+    name = document_storage.commit(path, digest, os.path.splitext(session.filename)[1])
+    document = session.document
+    document.file = name
+    document.file_size = size
+    document.checksum = digest
+    document.save()
+    session.status, session.stored_name = 'complete', name
+    session.save(update_fields=['status', 'stored_name', 'updated_at'])
+    session.chunks.all().delete()
+
+
+def _digest(session, path):
+    """SHA-256 of the part file, read from it only when no running digest covers every chunk"""
+    with _running_lock:
+        state = _running.pop(session.pk, None)
+    if state is not None and state[0] == session.chunk_count:
+        # Chunks written by other processes would show up as other digests.
+        recorded = list(session.chunks.order_by('index').values_list('sha256', flat=True))
+        if recorded == state[2]:
+            return state[1].hexdigest()
+    with open(path, 'rb') as part:
+        return file_digest(part)[0]
+
+
+def _fail(session, error):
+    session.status, session.error = 'failed', error
+    session.save(update_fields=['status', 'error', 'updated_at'])
+
+
+def is_stalled(session):
+    """Whether an assembling session has outlived UPLOAD_ASSEMBLY_TIMEOUT (e.g. after a restart)"""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_ASSEMBLY_TIMEOUT)
+    return session.status == 'assembling' and session.updated_at < cutoff
+
+
+def abort(session):
+    """Delete an unfinished session and its part file"""
+    if session.status == 'assembling' and not is_stalled(session):
+        raise UploadError('Upload is being assembled.', status=409)
+    _discard(session)
+
+
+def cleanup(max_age=None):
+    """Delete sessions idle for longer than ``max_age``; returns the count"""
+    max_age = max_age or timedelta(seconds=settings.UPLOAD_SESSION_TIMEOUT)
+    cutoff = timezone.now() - max_age
+    # Assemblies interrupted by a restart never finish; let clients see why.
+    stalled = timezone.now() - timedelta(seconds=settings.UPLOAD_ASSEMBLY_TIMEOUT)
+    UploadSession.objects.filter(status='assembling', updated_at__lt=stalled).update(
+        status='failed', error='Assembly was interrupted.', updated_at=timezone.now()
+    )
+    stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+    removed = 0
+    for session in stale:
+        _discard(session)
+        removed += 1
+    return removed
+
+
+def _discard(session):
+    with _running_lock:
+        _running.pop(session.pk, None)
+    try:
+        os.unlink(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import feeds, views
 
 app_name = 'repository'
 
@@ -7,6 +8,8 @@ urlpatterns = [
     path('', views.DocumentListView.as_view(), name='document_list'),
     path('<int:pk>/', views.DocumentDetailView.as_view(), name='document_detail'),
     path('collection/<slug:slug>/', views.CollectionDetailView.as_view(), name='collection_detail'),
-    path('search/', views.DocumentSearchView.as_view(), name='document_search'),
+    path('oai/', views.OAIView.as_view(), name='oai'),
+    path('newly-available/feed/', feeds.NewlyAvailableFeed(), name='newly_available_feed'),
+    path('search/', (views.AsyncDocumentSearchView if settings.ASYNC_VIEWS else views.DocumentSearchView).as_view(), name='document_search'),
 ]
 
@@ -1,9 +1,18 @@
-from django.views.generic import ListView, DetailView
+from django.views.generic import View, ListView, DetailView
 from django.db.models import Q
-from django.http import FileResponse
-from django.shortcuts import get_object_or_404
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.contrib import messages
+from django.shortcuts import get_object_or_404, redirect
+from . import oai
+from .facets import DOCUMENT_FACETS
 from .models import Document, Collection
-from analytics.models import UserActivity
+from analytics import recently_viewed
+from analytics.models import RelatedItems
+from analytics.suggestions import log_search
+from unimaid_library.concurrency import AsyncListView, fire_and_forget
+from unimaid_library.generic import ObjectDetailView
 
 
 class DocumentListView(ListView):
@@ -12,42 +21,27 @@ class DocumentListView(ListView):
     context_object_name = 'documents'
     paginate_by = 20
     
+    def get_base_queryset(self):
+        return Document.objects.filter(is_active=True, is_approved=True).accessible_to(self.request.user)
+    
     def get_queryset(self):
-        queryset = Document.objects.filter(is_active=True, is_approved=True)
-        
-        # Filter by document type
-        doc_type = self.request.GET.get('type')
-        if doc_type:
-            queryset = queryset.filter(document_type=doc_type)
-        
-        # Filter by collection
-        collection_slug = self.request.GET.get('collection')
-        if collection_slug:
-            queryset = queryset.filter(collection__slug=collection_slug)
-        
-        # Filter by department
-        department = self.request.GET.get('department')
-        if department:
-            queryset = queryset.filter(department=department)
-        
-        # Filter by year
-        year = self.request.GET.get('year')
-        if year:
-            queryset = queryset.filter(year=year)
-        
+        queryset = DOCUMENT_FACETS.apply(self.get_base_queryset(), DOCUMENT_FACETS.selected(self.request.GET))
         return queryset.order_by('-submission_date')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['collections'] = Collection.objects.filter(is_active=True)
-        context['document_types'] = Document.DOCUMENT_TYPES
-        # Get unique years from documents
-        years = Document.objects.filter(is_active=True, is_approved=True, year__isnull=False).values_list('year', flat=True).distinct().order_by('-year')
-        context['years'] = sorted(set(years), reverse=True)[:10]  # Last 10 years
+        # What is visible depends on the user; only anonymous and staff
+        # visitors all see the same documents, so only their counts are cached
+        # (one variant each, see DOCUMENT_FACETS).
+        user = self.request.user
+        audience = 'staff' if user.is_staff else None if user.is_authenticated else 'anonymous'
+        context['facets'] = DOCUMENT_FACETS.counts(
+            self.get_base_queryset(), self.request.GET, unfiltered=audience is not None, variant=audience
+        )
         return context
 
 
-class DocumentDetailView(DetailView):
+class DocumentDetailView(ObjectDetailView):
     model = Document
     template_name = 'repository/document_detail.html'
     context_object_name = 'document'
@@ -55,39 +49,24 @@ class DocumentDetailView(DetailView):
     def get_queryset(self):
         return Document.objects.filter(is_active=True, is_approved=True)
     
-    def get(self, request, *args, **kwargs):
-        response = super().get(request, *args, **kwargs)
-        document = self.get_object()
-        
-        # Check access
-        if not document.is_accessible(request.user):
-            from django.contrib import messages
-            messages.error(request, 'You do not have access to this document.')
-            from django.shortcuts import redirect
+    def check_access(self, document):
+        if not document.is_accessible(self.request.user):
+            messages.error(self.request, 'You do not have access to this document.')
             return redirect('repository:document_list')
-        
-        # Increment view count
-        document.increment_view_count()
-        
-        # Log activity
-        if request.user.is_authenticated:
-            UserActivity.objects.create(
-                user=request.user,
-                action_type='view_document',
-                description=f'Viewed document: {document.title}',
-                ip_address=request.META.get('REMOTE_ADDR'),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
-            )
-        
-        return response
+        return None
+    
+    def after_response(self):
+        fire_and_forget(self.object.increment_view_count)
+        # Remember the view; activity is written in batches
+        recently_viewed.record_view(self.request, 'document', self.object)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['related_documents'] = Document.objects.filter(
-            collection=self.object.collection,
-            is_active=True,
-            is_approved=True
-        ).exclude(pk=self.object.pk)[:5]
+        visible = Document.objects.filter(is_active=True, is_approved=True).accessible_to(self.request.user)
+        related = RelatedItems.related_to('document', self.object.pk, visible)
+        if related is None:
+            related = visible.filter(collection=self.object.collection).exclude(pk=self.object.pk)[:5]
+        context['related_documents'] = related
         return context
 
 
@@ -102,12 +81,12 @@ class CollectionDetailView(DetailView):
             collection=self.object,
             is_active=True,
             is_approved=True
-        ).order_by('-submission_date')
+        ).accessible_to(self.request.user).order_by('-submission_date')
         return context
 
 
-class DocumentSearchView(ListView):
-    model = Document
+class DocumentSearchMixin:
+    """Queries and search logging shared by DocumentSearchView and AsyncDocumentSearchView"""
     template_name = 'repository/document_search.html'
     context_object_name = 'documents'
     paginate_by = 20
@@ -121,10 +100,45 @@ class DocumentSearchView(ListView):
                 Q(abstract__icontains=query) |
                 Q(keywords__icontains=query) |
                 Q(subject__icontains=query)
-            ).filter(is_active=True, is_approved=True).distinct()
+            ).filter(is_active=True, is_approved=True).accessible_to(self.request.user).distinct()
         return Document.objects.none()
     
+    def log_search(self, context):
+        log_search(self.request, 'repository', context['query'], context['paginator'].count)
+
+
+class DocumentSearchView(DocumentSearchMixin, ListView):
+    model = Document
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        self.log_search(context)
+        return context
+
+
+class AsyncDocumentSearchView(DocumentSearchMixin, AsyncListView):
+    """DocumentSearchView for ASGI deployments"""
+    
+    def get_context_data(self, **context):
         context['query'] = self.request.GET.get('q', '')
         return context
+    
+    def after_response(self, context):
+        self.log_search(context)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OAIView(View):
+    """OAI-PMH 2.0 endpoint; harvesters may use GET or POST"""
+    
+    def get(self, request):
+        return self.respond(request, request.GET)
+    
+    def post(self, request):
+        return self.respond(request, request.POST)
+    
+    def respond(self, request, params):
+        base_url = f'{request.scheme}://{request.get_host()}'
+        oai_request = oai.Request(params, base_url, request.build_absolute_uri(request.path))
+        return StreamingHttpResponse(oai_request.response(), content_type='text/xml; charset=utf-8')
@@ -0,0 +1,46 @@
+// Search Suggestions
+(function() {
+    'use strict';
+    
+    // Inputs opt in with data-suggest="all|catalog|repository" and
+    // data-suggest-url pointing at the analytics suggest endpoint.
+    document.querySelectorAll('input[data-suggest]').forEach(function(input, index) {
+        const list = document.createElement('datalist');
+        list.id = 'search-suggestions-' + index;
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        input.parentNode.appendChild(list);
+        
+        let timer = null;
+        let lastQuery = '';
+        
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(function() {
+                const query = input.value.trim();
+                if (!query || query === lastQuery) {
+                    return;
+                }
+                lastQuery = query;
+                const url = input.dataset.suggestUrl + '?' + new URLSearchParams({
+                    q: query,
+                    type: input.dataset.suggest
+                });
+                fetch(url)
+                    .then(function(response) { return response.json(); })
+                    .then(function(data) {
+                        if (data.query !== input.value.trim()) {
+                            return;
+                        }
+                        list.innerHTML = '';
+                        data.suggestions.forEach(function(suggestion) {
+                            const option = document.createElement('option');
+                            option.value = suggestion.label;
+                            list.appendChild(option);
+                        });
+                    })
+                    .catch(function() {});
+            }, 150);
+        });
+    });
+})();
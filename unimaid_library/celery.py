@@ -0,0 +1,15 @@
+"""
+Celery application for background jobs (report generation).
+
+Workers are only needed when CELERY_BROKER_URL is set; without a broker the
+run_reports command generates queued reports instead.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unimaid_library.settings')
+
+app = Celery('unimaid_library')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,172 @@
+"""
+Helpers for running independent database work concurrently.
+
+Used by the async (ASGI) views to evaluate the querysets of a page in
+parallel, and by any view that wants to push bookkeeping writes (activity
+logging, counters) off the request path.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import InvalidPage, Paginator
+from django.db import close_old_connections
+from django.db.models.query import QuerySet
+from django.http import Http404
+from django.views.generic import View
+from django.views.generic.base import TemplateResponseMixin
+
+from .middleware import count_queries
+
+logger = logging.getLogger(__name__)
+
+_background = ThreadPoolExecutor(max_workers=4, thread_name_prefix='background')
+
+
+def _evaluate(query):
+    try:
+        with count_queries():
+            if isinstance(query, QuerySet):
+                return list(query)
+            return query()
+    finally:
+        # Each worker thread holds its own connection; release it according
+        # to CONN_MAX_AGE just like the request cycle would.
+        close_old_connections()
+
+
+async def gather_queries(**queries):
+    """Evaluate independent queries concurrently and return them by name.
+
+    Values are querysets (evaluated to lists) or zero-argument callables.
+    Every query runs on its own worker thread and therefore its own database
+    connection, so they really overlap instead of queueing behind the single
+    thread Django's async ORM methods share per request.
+    """
+    names = list(queries)
+    results = await asyncio.gather(*(
+        sync_to_async(_evaluate, thread_sensitive=False)(queries[name])
+        for name in names
+    ))
+    return dict(zip(names, results))
+
+
+def _run_logged(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %r failed', func)
+    finally:
+        close_old_connections()
+
+
+def fire_and_forget(func, *args, **kwargs):
+    """Run ``func`` on a background thread without waiting for it.
+
+    Meant for writes the response does not depend on. A thread pool rather
+    than ``asyncio.create_task`` is used so the work also survives views
+    served through WSGI, where the event loop ends with the request.
+    """
+    _background.submit(_run_logged, func, args, kwargs)
+
+
+class AsyncListView(TemplateResponseMixin, View):
+    """Async counterpart of ListView.
+
+    The page rows, the total count and every queryset returned by
+    ``get_extra_queries()`` are evaluated concurrently. Template rendering
+    happens afterwards in a worker thread (Django renders TemplateResponses
+    returned from async views with ``sync_to_async``).
+    """
+    model = None
+    queryset = None
+    paginate_by = None
+    page_kwarg = 'page'
+    context_object_name = None
+
+    def get_queryset(self):
+        """Like MultipleObjectMixin.get_queryset: ``queryset`` or all of ``model``"""
+        if self.queryset is not None:
+            return self.queryset.all()
+        if self.model is not None:
+            return self.model._default_manager.all()
+        raise ImproperlyConfigured(
+            f'{self.__class__.__name__} is missing a QuerySet. Define '
+            f'{self.__class__.__name__}.model, {self.__class__.__name__}.queryset, or override '
+            f'{self.__class__.__name__}.get_queryset().'
+        )
+
+    def get_extra_queries(self):
+        """Independent querysets for the rest of the page, keyed by context name"""
+        return {}
+
+    def get_context_data(self, **context):
+        return context
+
+    def after_response(self, context):
+        """Hook for fire-and-forget side effects once the page data is known"""
+
+    async def get(self, request, *args, **kwargs):
+        # Resolve the lazy user up front; touching it later from the event
+        # loop would hit the session/user tables synchronously.
+        request.user = await request.auser()
+        queryset = self.get_queryset()
+        queries = self.get_extra_queries()
+
+        if self.paginate_by:
+            paginator = Paginator(queryset, self.paginate_by)
+            page = request.GET.get(self.page_kwarg) or 1
+            try:
+                number = int(page)
+            except (TypeError, ValueError):
+                if page != 'last':
+                    raise Http404('Page is not “last”, nor can it be converted to an int.')
+                # The last page depends on the count, so it cannot overlap.
+                paginator.count = await queryset.acount()
+                number = paginator.num_pages
+            # Fetch the requested page and the count in parallel, then
+            # validate the page number against the count.
+            bottom = (max(number, 1) - 1) * self.paginate_by
+            queries['_count'] = queryset.count
+            queries['_rows'] = queryset[bottom:bottom + self.paginate_by]
+            results = await gather_queries(**queries)
+            paginator.count = results.pop('_count')
+            try:
+                page_obj = paginator.page(number)
+            except InvalidPage as e:
+                raise Http404(f'Invalid page ({number}): {e}')
+            page_obj.object_list = results.pop('_rows')
+            object_list = page_obj.object_list
+            context = {
+                'paginator': paginator,
+                'page_obj': page_obj,
+                'is_paginated': page_obj.has_other_pages(),
+            }
+        else:
+            queries['_rows'] = queryset
+            results = await gather_queries(**queries)
+            object_list = results.pop('_rows')
+            context = {'paginator': None, 'page_obj': None, 'is_paginated': False}
+
+        context['object_list'] = object_list
+        if self.context_object_name:
+            context[self.context_object_name] = object_list
+        context.update(results)
+        context = self.get_context_data(view=self, **context)
+        self.after_response(context)
+        return self.render_to_response(context)
+
+
+class AsyncTemplateView(TemplateResponseMixin, View):
+    """Async counterpart of TemplateView whose sections load concurrently"""
+
+    def get_queries(self):
+        return {}
+
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        context = await gather_queries(**self.get_queries())
+        context.update(kwargs, view=self)
+        return self.render_to_response(context)
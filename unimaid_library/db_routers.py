@@ -0,0 +1,50 @@
+"""
+Database routers for unimaid_library project.
+
+Only installed when a read replica is configured (DB_REPLICA_HOST).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Route reads of any model inside the block to the replica.
+
+    Used by reporting code that aggregates over catalog, circulation and
+    repository tables but never writes to them. Nothing else goes to the
+    replica, so code that reads back its own writes (report progress,
+    search logging, get_or_create) never sees replication lag.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send reads inside replica_reads() to the replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            return None
+        if _replica_reads.get():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases point at the same data set.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,165 @@
+"""
+Faceted navigation for list views.
+
+A ``Facet`` names a query parameter and the field (or expression) it
+filters on. ``FacetSet.apply()`` narrows a queryset by the selected values,
+and ``FacetSet.counts()`` returns, for every facet, its values with the
+number of matching rows. Each facet costs one grouped query, filtered by the
+search and by every *other* selected facet, so the counts show how many
+results picking a value would give. Counts for the unfiltered listing are
+the same for every visitor and are cached for ``FACET_CACHE_TIMEOUT``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+
+class Facet:
+    """One facet: ``param`` in the query string filters on ``field``.
+
+    ``expression`` is annotated as ``field`` when the value is computed
+    (e.g. a year or an availability bucket). Values that ``cast`` rejects are
+    ignored. Labels come from ``label_field``, ``choices`` or the value
+    itself. Options are ordered by count, or by value descending with
+    ``order='-value'``, and cut to ``limit``; a selected value outside the
+    top ``limit`` is still listed, last.
+    """
+
+    def __init__(self, param, title, field, expression=None, label_field=None,
+                 choices=None, cast=str, order='-count', limit=10):
+        self.param = param
+        self.title = title
+        self.field = field
+        self.expression = expression
+        self.label_field = label_field
+        self.choices = dict(choices or ())
+        self.cast = cast
+        self.order = order
+        self.limit = limit
+
+    def annotate(self, queryset, select=False):
+        if self.expression is None:
+            return queryset
+        if select:
+            return queryset.annotate(**{self.field: self.expression})
+        return queryset.alias(**{self.field: self.expression})
+
+    def is_valid(self, value):
+        if self.choices and value not in self.choices:
+            return False
+        try:
+            self.cast(value)
+        except ValueError:
+            return False
+        return True
+
+    def filter(self, queryset, value):
+        return self.annotate(queryset).filter(**{self.field: self.cast(value)})
+
+    def count(self, queryset, selected=None):
+        fields = [self.field] + ([self.label_field] if self.label_field else [])
+        rows = (
+            self.annotate(queryset, select=True).order_by().exclude(**{f'{self.field}__isnull': True})
+            .values(*fields).annotate(count=Count('pk', distinct=True))
+        )
+        if self.order == '-value':
+            rows = rows.order_by(F(self.field).desc())
+        else:
+            rows = rows.order_by('-count', self.field)
+        top = list(rows[:self.limit])
+        if selected is not None:
+            value = self.cast(selected)
+            if all(row[self.field] != value for row in top):
+                top += rows.filter(**{self.field: value})
+        options = []
+        for row in top:
+            value = row[self.field]
+            if value == '':
+                continue
+            if self.label_field:
+                label = row[self.label_field]
+            else:
+                label = self.choices.get(value, value)
+            options.append({'value': str(value), 'label': label, 'count': row['count']})
+        return options
+
+
+class FacetSet:
+    """The facets of one listing; ``variants`` name its per-audience caches"""
+
+    def __init__(self, name, facets, variants=()):
+        self.name = name
+        self.facets = facets
+        self.variants = variants
+
+    def _cache_key(self, variant=None):
+        return f'facets:{self.name}:{variant}' if variant else f'facets:{self.name}'
+
+    def invalidate(self):
+        """Drop the cached unfiltered counts"""
+        cache.delete_many([self._cache_key()] + [self._cache_key(variant) for variant in self.variants])
+
+    def selected(self, params):
+        """Selected value per facet parameter present in ``params``"""
+        return {
+            facet.param: params[facet.param] for facet in self.facets
+            if params.get(facet.param) and facet.is_valid(params[facet.param])
+        }
+
+    def apply(self, queryset, selected, exclude=None):
+        for facet in self.facets:
+            if facet.param in selected and facet.param != exclude:
+                queryset = facet.filter(queryset, selected[facet.param])
+        return queryset
+
+    def counts(self, queryset, params, unfiltered=False, variant=None):
+        """Options with counts and links for every facet.
+
+        ``queryset`` is the listing before facet filters and ``params`` the
+        request's query string. Pass ``unfiltered=True`` when no search is
+        applied either, so the counts can be served from the cache;
+        ``variant`` separates cached counts of listings that differ by user.
+        """
+        selected = self.selected(params)
+        if unfiltered and not selected:
+            key = self._cache_key(variant)
+            counts = cache.get(key)
+            if counts is None:
+                counts = self._counts(queryset, selected)
+                cache.set(key, counts, settings.FACET_CACHE_TIMEOUT)
+        else:
+            counts = self._counts(queryset, selected)
+        return [
+            {
+                'param': facet.param,
+                'title': facet.title,
+                'selected': selected.get(facet.param, ''),
+                'clear_url': _link(params, facet.param, None),
+                'options': [
+                    dict(
+                        option,
+                        selected=option['value'] == selected.get(facet.param),
+                        # Clicking the selected value again clears it.
+                        url=_link(params, facet.param, None if option['value'] == selected.get(facet.param) else option['value']),
+                    )
+                    for option in options
+                ],
+            }
+            for facet, options in zip(self.facets, counts)
+        ]
+
+    def _counts(self, queryset, selected):
+        return [
+            facet.count(self.apply(queryset, selected, exclude=facet.param), selected.get(facet.param))
+            for facet in self.facets
+        ]
+
+
+def _link(params, param, value):
+    query = params.copy()
+    query.pop('page', None)
+    if value is None:
+        query.pop(param, None)
+    else:
+        query[param] = value
+    return f'?{query.urlencode()}'
@@ -0,0 +1,31 @@
+"""
+Generic views shared by the apps.
+"""
+from django.views.generic import DetailView
+
+
+class ObjectDetailView(DetailView):
+    """DetailView that loads its object exactly once.
+
+    ``get()`` fetches the object, calls ``check_access()`` before anything is
+    rendered and, once the page has rendered successfully, calls
+    ``after_response()`` for side effects such as view counters and activity
+    logging. Subclasses read ``self.object`` instead of calling
+    ``get_object()`` again.
+    """
+
+    def check_access(self, obj):
+        """Return a response to send instead of the page, or None to allow it"""
+        return None
+
+    def after_response(self):
+        """Hook for side effects of a successful view; push writes to fire_and_forget"""
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        denied = self.check_access(self.object)
+        if denied is not None:
+            return denied
+        response = self.render_to_response(self.get_context_data(object=self.object))
+        response.add_post_render_callback(lambda rendered: self.after_response())
+        return response
@@ -0,0 +1,61 @@
+"""
+Middleware for unimaid_library project.
+"""
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+_query_counter = ContextVar('query_counter', default=None)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """Add the current thread's queries to the request's X-DB-Queries count.
+
+    Connections are per thread, so helpers that run queries on worker
+    threads (``gather_queries``) wrap their work in this. It does nothing
+    outside a request counted by QueryCountMiddleware.
+    """
+    counter = _query_counter.get()
+    with ExitStack() as stack:
+        if counter is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+        yield
+
+
+class QueryCountMiddleware:
+    """Report the number of SQL queries each request ran in an X-DB-Queries header.
+
+    Enabled with QUERY_COUNT_HEADER=True so the HTTP benchmark can track
+    queries per request against a running server. Works with DEBUG off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        token = _query_counter.set(counter)
+        try:
+            with count_queries():
+                # Template responses are already rendered by the time they
+                # come back through the middleware chain.
+                response = self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        response['X-DB-Queries'] = str(counter.count)
+        return response
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -65,6 +67,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Expose per-request query counts to the HTTP benchmark (benchmark_http).
+QUERY_COUNT_HEADER = config("QUERY_COUNT_HEADER", default=False, cast=bool)
+if QUERY_COUNT_HEADER:
+    MIDDLEWARE.insert(0, "unimaid_library.middleware.QueryCountMiddleware")
+
 ROOT_URLCONF = "unimaid_library.urls"
 
 TEMPLATES = [
@@ -86,17 +93,164 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "unimaid_library.wsgi.application"
 
+# Serve the read-heavy catalog/repository/home pages with their async views.
+# Only worthwhile when running under an ASGI server (unimaid_library.asgi).
+ASYNC_VIEWS = config("ASYNC_VIEWS", default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+# Every database setting can be overridden from the environment (or a .env
+# file). Without any DB_* variables the project runs on the bundled SQLite
+# database; set DB_ENGINE=postgresql for gunicorn/production deployments.
+
+DB_ENGINE = config("DB_ENGINE", default="sqlite3")
+
+# SQLite performance mode for small branch installs: BEGIN IMMEDIATE takes
+# the write lock up front so concurrent checkouts queue on the busy timeout
+# instead of failing with "database is locked" when a deferred transaction
+# tries to upgrade its lock. SQLITE_WAL=True also lets readers run alongside
+# a writer; WAL is stored in the database file itself and stays on after it
+# is unset, so it is opt-in rather than applied to the bundled db.sqlite3.
+SQLITE_TUNING = config("SQLITE_TUNING", default=True, cast=bool)
+SQLITE_WAL = config("SQLITE_WAL", default=False, cast=bool)
+SQLITE_PRAGMAS = {
+    **({"journal_mode": "WAL"} if SQLITE_WAL else {}),
+    "synchronous": "NORMAL",
+    "mmap_size": config("SQLITE_MMAP_SIZE", default=128 * 1024 * 1024, cast=int),
+    # Negative cache_size is in KiB rather than pages.
+    "cache_size": -config("SQLITE_CACHE_KB", default=32 * 1024, cast=int),
+    "temp_store": "MEMORY",
+    "busy_timeout": config("SQLITE_BUSY_TIMEOUT_MS", default=20000, cast=int),
 }
 
+if DB_ENGINE == "sqlite3":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": config("DB_NAME", default=str(BASE_DIR / "db.sqlite3")),
+        }
+    }
+    if SQLITE_TUNING:
+        DATABASES["default"]["OPTIONS"] = {
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
+            "transaction_mode": "IMMEDIATE",
+            "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": f"django.db.backends.{DB_ENGINE}",
+            "NAME": config("DB_NAME", default="unimaid_library"),
+            "USER": config("DB_USER", default=""),
+            "PASSWORD": config("DB_PASSWORD", default=""),
+            "HOST": config("DB_HOST", default="localhost"),
+            "PORT": config("DB_PORT", default="5432"),
+            # Keep connections open between requests instead of reconnecting
+            # on every request, and ping them before reuse.
+            "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=60, cast=int),
+            "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+            "OPTIONS": {
+                "connect_timeout": config("DB_CONNECT_TIMEOUT", default=5, cast=int),
+            },
+        }
+    }
+
+    # Transaction-pooling PgBouncer cannot hold named server-side cursors
+    # across statements, and it already pools connections itself.
+    if config("DB_PGBOUNCER", default=False, cast=bool):
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+    # Django's built-in connection pool (requires psycopg 3 with the "pool"
+    # extra). Pooled connections must not also be persistent.
+    if config("DB_POOL", default=False, cast=bool):
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+            "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+        }
+
+    # Optional streaming read replica used for analytics and reporting reads
+    # (see unimaid_library.db_routers).
+    DB_REPLICA_HOST = config("DB_REPLICA_HOST", default="")
+    if DB_REPLICA_HOST:
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "HOST": DB_REPLICA_HOST,
+            "PORT": config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+            "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+            "TEST": {"MIRROR": "default"},
+        }
+        DATABASE_ROUTERS = ["unimaid_library.db_routers.PrimaryReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Shared Redis cache when REDIS_URL is set (needed once more than one worker
+# process serves the site), otherwise a per-process memory cache.
+REDIS_URL = config("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "unimaid",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "unimaid",
+            "OPTIONS": {"MAX_ENTRIES": config("LOCMEM_CACHE_MAX_ENTRIES", default=10000, cast=int)},
+        }
+    }
+
+# Facet counts of the unfiltered book and document listings.
+FACET_CACHE_TIMEOUT = config("FACET_CACHE_TIMEOUT", default=300, cast=int)
+
+# Rendered VEVENT blocks are keyed on the event's updated_at, so they never
+# go stale and can be kept for a long time.
+ICAL_FRAGMENT_TIMEOUT = config("ICAL_FRAGMENT_TIMEOUT", default=7 * 24 * 3600, cast=int)
+ICAL_TOKEN_MAX_AGE = config("ICAL_TOKEN_MAX_AGE", default=365 * 24 * 3600, cast=int)
+
+# Rendered blog comment threads and the blog sidebar are dropped whenever
+# a comment or post changes, so they can be kept for a long time.
+BLOG_COMMENT_TREE_TIMEOUT = config("BLOG_COMMENT_TREE_TIMEOUT", default=24 * 3600, cast=int)
+BLOG_SIDEBAR_TIMEOUT = config("BLOG_SIDEBAR_TIMEOUT", default=3600, cast=int)
+
+# Memory-mapped "patrons also borrowed" index written by build_recommendations.
+RECOMMENDATIONS_DIR = config("RECOMMENDATIONS_DIR", default=str(BASE_DIR / "var" / "recommendations"))
+
+# Per-user "recently viewed" lists live in the cache. Document views are
+# buffered there too and written to UserActivity in bulk at most once every
+# RECENTLY_VIEWED_FLUSH_INTERVAL seconds (and by flush_recent_views).
+RECENTLY_VIEWED_LIMIT = config("RECENTLY_VIEWED_LIMIT", default=20, cast=int)
+RECENTLY_VIEWED_TIMEOUT = config("RECENTLY_VIEWED_TIMEOUT", default=30 * 24 * 3600, cast=int)
+RECENTLY_VIEWED_FLUSH_INTERVAL = config("RECENTLY_VIEWED_FLUSH_INTERVAL", default=60, cast=int)
+
+# In-process search suggestion index (analytics.suggestions): refreshed from
+# recent changes every SUGGESTIONS_REFRESH_SECONDS, rebuilt daily. Queries are
+# offered once they were searched SUGGESTIONS_MIN_SEARCHES times with results.
+SUGGESTIONS_REFRESH_SECONDS = config("SUGGESTIONS_REFRESH_SECONDS", default=60, cast=int)
+SUGGESTIONS_REBUILD_SECONDS = config("SUGGESTIONS_REBUILD_SECONDS", default=24 * 3600, cast=int)
+SUGGESTIONS_MIN_SEARCHES = config("SUGGESTIONS_MIN_SEARCHES", default=2, cast=int)
+SUGGESTIONS_QUERY_DAYS = config("SUGGESTIONS_QUERY_DAYS", default=90, cast=int)
+
+# OAI-PMH provider (repository.oai). Rendered records are keyed on the
+# document's updated_at, like the iCalendar fragments.
+OAI_REPOSITORY_NAME = config("OAI_REPOSITORY_NAME", default="Ramat Library Institutional Repository")
+OAI_REPOSITORY_IDENTIFIER = config("OAI_REPOSITORY_IDENTIFIER", default="library.unimaid.edu.ng")
+OAI_ADMIN_EMAIL = config("OAI_ADMIN_EMAIL", default="ramatlibrary@unimaid.edu.ng")
+OAI_PAGE_SIZE = config("OAI_PAGE_SIZE", default=100, cast=int)
+OAI_TOKEN_MAX_AGE = config("OAI_TOKEN_MAX_AGE", default=24 * 3600, cast=int)
+OAI_FRAGMENT_TIMEOUT = config("OAI_FRAGMENT_TIMEOUT", default=7 * 24 * 3600, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,6 +296,14 @@ STATICFILES_DIRS = [
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Resumable repository uploads (repository.uploads). Sessions idle for
+# UPLOAD_SESSION_TIMEOUT seconds are removed by cleanup_uploads, which also
+# fails assemblies still running after UPLOAD_ASSEMBLY_TIMEOUT seconds.
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int)
+UPLOAD_MAX_SIZE = config("UPLOAD_MAX_SIZE", default=50 * 1024 ** 3, cast=int)
+UPLOAD_SESSION_TIMEOUT = config("UPLOAD_SESSION_TIMEOUT", default=24 * 3600, cast=int)
+UPLOAD_ASSEMBLY_TIMEOUT = config("UPLOAD_ASSEMBLY_TIMEOUT", default=3600, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -167,6 +329,31 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Rows fetched per round trip by the streaming exports (api.exports).
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+# Change log (api.models.ChangeLog): how long new changes are held back from
+# sync clients so transactions that commit out of id order are not skipped,
+# and changes per delta sync page. Outbox consumers (api.outbox) wait up to
+# OUTBOX_GAP_TIMEOUT seconds for such transactions instead.
+CHANGE_LOG_SETTLE_SECONDS = config("CHANGE_LOG_SETTLE_SECONDS", default=5, cast=int)
+SYNC_PAGE_SIZE = config("SYNC_PAGE_SIZE", default=500, cast=int)
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=500, cast=int)
+OUTBOX_GAP_TIMEOUT = config("OUTBOX_GAP_TIMEOUT", default=3600, cast=int)
+
+# Background jobs (unimaid_library.celery). Without a broker, queued reports
+# are generated by the run_reports command.
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="")
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ACKS_LATE = True
+
+# Rows per progress update and cancel check of report generation. Reports
+# without a progress update for REPORT_STALE_SECONDS are re-queued by
+# run_reports, at most REPORT_MAX_ATTEMPTS times.
+REPORT_CHUNK_SIZE = config("REPORT_CHUNK_SIZE", default=2000, cast=int)
+REPORT_STALE_SECONDS = config("REPORT_STALE_SECONDS", default=15 * 60, cast=int)
+REPORT_MAX_ATTEMPTS = config("REPORT_MAX_ATTEMPTS", default=3, cast=int)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
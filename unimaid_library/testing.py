@@ -0,0 +1,17 @@
+"""
+Helpers shared by the apps' test suites.
+"""
+import tempfile
+
+from django.test import override_settings
+
+
+class TemporaryMediaMixin:
+    """Store uploads, QR codes and reports in a throwaway MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Before super(), so files written by setUpTestData() land there too.
+        media_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
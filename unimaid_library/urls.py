@@ -10,7 +10,7 @@ from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', views.HomeView.as_view(), name='home'),
+    path('', (views.AsyncHomeView if settings.ASYNC_VIEWS else views.HomeView).as_view(), name='home'),
     path('contact/', views.ContactView.as_view(), name='contact'),
     path('newsletter/subscribe/', views.NewsletterSubscribeView.as_view(), name='newsletter_subscribe'),
     
@@ -10,21 +10,36 @@ from events.models import Event
 from catalog.models import Book
 from repository.models import Document
 from accounts.models import StaffMember
+from .concurrency import AsyncTemplateView
 
 
-class HomeView(TemplateView):
+class HomeMixin:
+    """Sections shared by HomeView and AsyncHomeView"""
     template_name = 'home.html'
     
+    def get_queries(self):
+        return {
+            'latest_posts': Post.objects.listing()[:3],
+            'upcoming_events': Event.objects.filter(is_published=True, is_cancelled=False).order_by('start_date')[:3],
+            'featured_books': Book.objects.filter(is_featured=True, is_active=True)[:6],
+            'recent_documents': Document.objects.filter(
+                is_active=True, is_approved=True
+            ).accessible_to(self.request.user).order_by('-submission_date')[:6],
+            'staff_members': StaffMember.objects.filter(is_active=True)[:6],
+        }
+
+
+class HomeView(HomeMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['latest_posts'] = Post.objects.filter(is_published=True)[:3]
-        context['upcoming_events'] = Event.objects.filter(is_published=True, is_cancelled=False).order_by('start_date')[:3]
-        context['featured_books'] = Book.objects.filter(is_featured=True, is_active=True)[:6]
-        context['recent_documents'] = Document.objects.filter(is_active=True, is_approved=True).order_by('-submission_date')[:6]
-        context['staff_members'] = StaffMember.objects.filter(is_active=True)[:6]
+        context.update(self.get_queries())
         return context
 
 
+class AsyncHomeView(HomeMixin, AsyncTemplateView):
+    """HomeView for ASGI deployments; the five sections load concurrently"""
+
+
 class ContactView(FormView):
     template_name = 'contact.html'
     success_url = reverse_lazy('contact')